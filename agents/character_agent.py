@@ -1,29 +1,29 @@
-import os
+import asyncio
 import json
-import numpy as np
-import faiss
-from groq import Groq
-from sentence_transformers import SentenceTransformer
-from typing import Any, Dict
-
-# Initialize Groq client
-try:
-    client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-    GROQ_OK = True
-except Exception:
-    client = None
-    GROQ_OK = False
-
-# Initialize embedding model for FAISS retrieval
-try:
-    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-    EMB_OK = True
-except Exception:
-    embedding_model = None
-    EMB_OK = False
+from typing import Any, Dict, Optional, Tuple
 
-def character_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    print(f"Character Agent received: {{npc_id={state['event_params'].get('npc_id')}, text=\"{state['event_params'].get('text')}\"}}")
+from utils.embedding_service import get_embedding_service
+from utils.llm import get_client, get_async_client
+from agents.memory_queue import MEMORY_LOCK
+from memory.retrieval import recall
+from utils.log import get_logger
+from utils.llm_cache import get_llm_cache
+from agents.prompt_builder import get_prompt_builder, record_prompt_tokens
+from lod import rule_reply, tier_of
+from streaming import ResponseFieldStreamer, current_stream
+
+log = get_logger("character_agent")
+
+_EMOTIONS = {"neutral","happy","sad","angry","curious"}
+
+def _prepare_turn(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Steps 1-3 of a character turn: pull the NPC and player line out of the
+    state, recall memories and build the prompts. Returns None (after writing
+    the "…" fallback into state) when there is nothing to reply to.
+    """
+    log.info("character_agent_received", npc_id=state["event_params"].get("npc_id"),
+             text=state["event_params"].get("text"))
     # 1) Extract NPC and player input
     params      = state.get("event_params", {}) or {}
     npc_id      = params.get("npc_id", "unknown_npc")
@@ -33,112 +33,131 @@ def character_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
     if npc_id not in state["npc_states"] or not player_text:
         state["response"]    = "…"
         state["tool_action"] = None
-        return state
+        return None
 
-    npc = state["npc_states"][npc_id]
-    personality  = npc.get("personality", "an NPC")
-    emotion      = npc.get("emotion_state", "neutral")
-    inventory    = npc.get("inventory", [])
-    inv_desc     = ", ".join(inventory) if inventory else "nothing"
-    other_npc_entries = []
-    for other_id, other_sub in state["npc_states"].items():
-        if other_id == npc_id:
-            continue
-        # e.g. "helena_guard (steadfast town guard)"
-        other_npc_entries.append(f"{other_id} ({other_sub.get('personality','')})")
-    other_npcs_str = ", ".join(other_npc_entries) if other_npc_entries else "none"
-
-    # 2) FAISS-based memory recall
-    raw = npc["memory"]
-    if raw:
-        # show last 3 memories if nothing better
-        fallback = "\n".join(f" • {m}" for m in raw[-3:])
-    else:
-        fallback = "I have no specific memories to draw on."
+    npc     = state["npc_states"][npc_id]
+    emotion = npc.get("emotion_state", "neutral")
 
-    relevant_memories_str = fallback
+    # Only NPCs in the near LOD tier (lod.py) recall and call the LLM; the
+    # others answer from rules
+    tier = tier_of(state, npc_id)
+    if tier != "near":
+        return {"npc_id": npc_id, "emotion": emotion, "memories": [], "request": None,
+                "reply": (rule_reply(npc, player_text), emotion, None)}
+
+    # 2) FAISS-based memory recall (show the last 3 memories, newest first, if nothing better)
+    memories, recalled = npc["memory"][-3:][::-1], False
 
     faiss_index = npc.get("faiss_index")
-    id2txt      = npc.get("faiss_id_to_memory_text", {})
     now         = state.get("simulation_time", 0)
 
-    if EMB_OK and embedding_model and faiss_index is not None and faiss_index.ntotal > 0:
-        # encode & normalize
-        vec = embedding_model.encode(player_text, convert_to_numpy=True)
-        if vec.ndim == 1: vec = vec.reshape(1, -1)
-        vec = vec.astype("float32")
-        norms = np.linalg.norm(vec, axis=1, keepdims=True).clip(min=1e-12)
-        vec /= norms
-
-        # always retrieve top 5, no score cutoff
-        D, I = faiss_index.search(vec, k=5)
-        candidates = []
-        decay = 0.1
-        for score, idx in zip(D[0], I[0]):
-            if idx < 0: continue
-            entry = id2txt.get(int(idx))
-            if not entry or entry.get("npc_id") != npc_id: continue
-            age = now - entry.get("timestamp", 0)
-            weight = score * max(0.0, 1 - decay * age)
-            candidates.append((weight, entry["text"]))
-        candidates.sort(key=lambda x: x[0], reverse=True)
-        top_texts = [txt for w, txt in candidates[:3]]
-        if top_texts:
-            relevant_memories_str = "Past memories:\n" + "\n".join(f" • {t}" for t in top_texts)
-    
-    # 3) Build LLM prompt
-    system_prompt = (
-        f"You are '{npc_id}', {personality}. You feel '{emotion}'.\n"
-        f"Inventory: {inv_desc}.\n"
-        f"{relevant_memories_str}\n\n"
-        f"Other NPCs you could share gossip with: {other_npcs_str}.\n\n"
-        "When you reply, return ONLY valid JSON with these keys:\n"
-        "{\n"
-        '  "response": string,\n'
-        '  "emotion_state": one of [neutral,happy,sad,angry,curious],\n'
-        '  "tool_action": { "type": string, "params": {...} } or null\n'
-        "}\n\n"
-        "# GOSSIP INSTRUCTIONS\n"
-        "If you want to share private gossip with another NPC in the world, "
-        "set tool_action to:\n"
-        '  { "type": "gossip", "params": { '
-        '"target_npc": "<that_npc_id>", "message": "<your private message>" } }\n'
-        "Otherwise set tool_action to null.\n"
+    embedder = get_embedding_service()
+    if faiss_index is not None and faiss_index.ntotal > 0 and embedder.available:
+        # shared, cached encoder → already normalized float32 (1, dim)
+        vec = embedder.encode(player_text)
+
+        # similarity + recency + importance, re-ranked over an adaptive over-fetch
+        with MEMORY_LOCK:  # a deferred memory job may be adding to this index
+            hits = recall(npc, vec, now, k=3)
+        if hits:
+            memories, recalled = [h["text"] for h in hits], True
+
+    # 3) Build LLM prompt: cached per-NPC prefix, then memories and the NPCs
+    #    within reach, cut to NPC_PROMPT_TOKEN_BUDGET
+    system_prompt = get_prompt_builder().system_prompt(state, npc_id, memories, recalled)
+    # npc_chat: another NPC (params["speaker"]) is talking, not the player
+    speaker = params.get("speaker")
+    user_prompt = f"{speaker if speaker else 'Player'} says: \"{player_text}\""
+
+    request = dict(
+        messages=[
+            {"role":"system","content":system_prompt},
+            {"role":"user",  "content":user_prompt}
+        ],
+        model="llama-3.1-8b-instant",
+        temperature=0.7,
+        max_tokens=150,
     )
-    user_prompt = f"Player says: \"{player_text}\""
+    record_prompt_tokens("character_agent", request)
+    return {
+        "npc_id":   npc_id,
+        "emotion":  emotion,
+        "memories": memories,
+        "request":  request,
+    }
 
-    # 4) Call Groq and parse
-    response_text = ""
-    new_emotion   = emotion
-    tool_action   = None
+def _parse_reply(raw: str, emotion: str) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    """ Parse the LLM's JSON reply into (response, emotion, tool_action). """
+    data = json.loads(raw.strip())
+    response_text = data.get("response", "")
+    emo = data.get("emotion_state", emotion)
+    new_emotion = emo if emo in _EMOTIONS else emotion
+    return response_text, new_emotion, data.get("tool_action")
+
+def _finish_turn(state: Dict[str, Any], turn: Dict[str, Any], reply) -> Dict[str, Any]:
+    # 5) Write back into state
+    response_text, new_emotion, tool_action = reply
+    npc_id = turn["npc_id"]
+    state["response"]                         = response_text
+    state["npc_states"][npc_id]["emotion_state"] = new_emotion
+    state["tool_action"]                       = tool_action
+    log.debug("character_agent_recalled", npc_id=npc_id, memories=turn["memories"])
+    return state
+
+def character_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    turn = _prepare_turn(state)
+    if turn is None:
+        return state
 
-    if GROQ_OK:
+    # 4) Call Groq and parse
+    client = get_client()
+    if turn["request"] is None:
+        reply = turn["reply"]
+    elif client is not None:
         try:
-            comp = client.chat.completions.create(
-                messages=[
-                    {"role":"system","content":system_prompt},
-                    {"role":"user",  "content":user_prompt}
-                ],
-                model="llama-3.1-8b-instant",
-                temperature=0.7,
-                max_tokens=150,
-            )
-            raw = comp.choices[0].message.content.strip()
-            data = json.loads(raw)
-            response_text = data.get("response", "")
-            emo = data.get("emotion_state", emotion)
-            if emo in {"neutral","happy","sad","angry","curious"}:
-                new_emotion = emo
-            tool_action = data.get("tool_action")
+            comp  = get_llm_cache().complete(client, turn["request"], "character_agent")
+            reply = _parse_reply(comp.choices[0].message.content, turn["emotion"])
         except Exception:
-            response_text = "…"
+            reply = ("…", turn["emotion"], None)
     else:
         # simple fallback
-        response_text = "I'm not thinking clearly right now."
+        reply = ("I'm not thinking clearly right now.", turn["emotion"], None)
 
-    # 5) Write back into state
-    state["response"]                         = response_text
-    state["npc_states"][npc_id]["emotion_state"] = new_emotion
-    state["tool_action"]                       = tool_action
-    print(f"Character Agent ({npc_id}): recalled memories:\n{relevant_memories_str}")
+    return _finish_turn(state, turn, reply)
+
+async def acharacter_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Async variant used by graph.ainvoke: same steps, but recall (embedding +
+    FAISS) runs on a worker thread and the Groq round trip is awaited, so one
+    event loop can keep many ticks in flight. On /tick_stream the reply text
+    is streamed to the client as Groq writes it (streaming.py).
+    """
+    stream = current_stream()
+    turn = await asyncio.to_thread(_prepare_turn, state)
+    if turn is None:
+        if stream is not None:
+            stream.reply(state["response"], None, None)
+        return state
+
+    client = get_async_client()
+    if turn["request"] is None:
+        reply = turn["reply"]
+    elif client is not None:
+        try:
+            if stream is not None:
+                field = ResponseFieldStreamer()
+                raw = await get_llm_cache().astream(client, turn["request"], "character_agent",
+                                                    lambda piece: stream.token(field.feed(piece)))
+            else:
+                raw = (await get_llm_cache().acomplete(client, turn["request"], "character_agent")
+                       ).choices[0].message.content
+            reply = _parse_reply(raw, turn["emotion"])
+        except Exception:
+            reply = ("…", turn["emotion"], None)
+    else:
+        reply = ("I'm not thinking clearly right now.", turn["emotion"], None)
+
+    state = _finish_turn(state, turn, reply)
+    if stream is not None:
+        stream.reply(*reply)    # emotion + tool_action; the rest of the graph runs on
     return state
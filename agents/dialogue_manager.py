@@ -3,6 +3,9 @@ from typing import TypedDict, Annotated, Union, Dict, Any, TYPE_CHECKING
 from langgraph.graph.message import add_messages
 # from workflows.npc_simulation_graph import SimulationState # For type hinting
 from utils.print_utils import summarize_for_printing
+from utils.log import get_logger
+
+log = get_logger("dialogue_manager")
 
 if TYPE_CHECKING:
     from workflows.npc_simulation_graph import SimulationState # For type hinting
@@ -13,7 +16,9 @@ class DialogueManagerAgent:
         pass
 
     def run_dialogue_manager(self, input_data: 'SimulationState') -> dict:
-        print(f"Dialogue Manager received: {summarize_for_printing(input_data, keys_to_redact=['faiss_index'])}")
+        # the state summary is only built when debug logging is on
+        log.debug("dialogue_manager_received",
+                  state=lambda: summarize_for_printing(input_data, keys_to_redact=["faiss_index"]))
 
         # grab the latest player utterance from event_params
         player_input = input_data.get("event_params", {}).get("text")
@@ -26,7 +31,7 @@ class DialogueManagerAgent:
         if memory_update_content or \
            (player_input is None or (isinstance(player_input, str) and player_input.strip().lower() in ["quit", "exit"])):
             final_npc_response = npc_response_content if npc_response_content else "The librarian nods silently."
-            print(f"Dialogue Manager: Ending interaction. Final response: {final_npc_response}")
+            log.info("dialogue_ended", response=final_npc_response)
             return {
                 "dialogue_output": {
                     "final_response": final_npc_response,
@@ -36,12 +41,12 @@ class DialogueManagerAgent:
 
         if npc_response_content and not memory_update_content:
             next_node = "memory_synthesizer"
-            print("Dialogue Manager: Routing to Memory Synthesizer.")
+            log.info("dialogue_routed", next_node=next_node)
         elif player_input and not npc_response_content:
             next_node = "character_agent"
-            print("Dialogue Manager: Routing to Character Agent.")
+            log.info("dialogue_routed", next_node=next_node)
         else:
-            print("Dialogue Manager: Unexpected state, ending interaction.")
+            log.warning("dialogue_unexpected_state")
             return {
                 "dialogue_output": {
                     "final_response": npc_response_content if npc_response_content else "The librarian seems unsure how to proceed.",
@@ -59,7 +64,7 @@ class DialogueManagerAgent:
 # Node function for LangGraph
 def dialogue_manager_node(input_data: 'SimulationState') -> dict:
     if not isinstance(input_data, dict):
-        print(f"Error: dialogue_manager_node received input that is not a dict: {type(input_data)}")
+        log.error("dialogue_manager_bad_input", type=type(input_data).__name__)
         return {"dialogue_output": {"error": "Invalid input to dialogue manager", "original_input": input_data}}
     
     manager = DialogueManagerAgent()
@@ -2,26 +2,45 @@
 
 from typing import Dict, Any
 
+from spatial_index import move_npc, spatial_index_of
+from utils.log import get_logger
+
+log = get_logger("event_nodes")
+
 def gossip_node(state):
-    print(f"GOSSIP NODE TRIGGERED: {state.get('tool_action')}")
+    log.info("gossip_triggered", tool_action=state.get("tool_action"))
     ta     = state.get("tool_action") or {}
     params = ta.get("params", {})
     target = params.get("target_npc")
     message= params.get("message")
+    source = (state.get("event_params") or {}).get("npc_id")
 
-    if target and message and target in state["npc_states"]:
-        npc = state["npc_states"][target]
-        # 1) Append raw text to the NPC’s memory list
-        npc["memory"].append(message)
+    # Gossip only reaches NPCs in the speaker's chunk or a neighbouring one
+    if source in state["npc_states"] and target not in spatial_index_of(state).near_npc(source):
+        log.info("gossip_out_of_reach", source=source, target=target)
+        target = None
 
-        # 2) Tell the memory_synthesizer to embed this new chunk
+    if target and message and target in state["npc_states"]:
+        # Hand the message to memory_synthesizer, which appends it to the
+        # target's memory list and embeds it (once; inline or deferred)
         state["memory_update"] = message
         state["memory_owner"]  = target
 
-    # 3) Clear the action so we don’t re-run
+    # Clear the action so we don’t re-run
     state["tool_action"] = None
     return state
 
+def hand_over(state, npc_id, target_npc, item) -> bool:
+    """ Move `item` from one NPC's inventory to another's; False if either NPC or the item is missing. """
+    giver = state["npc_states"].get(npc_id) or {}
+    taker = state["npc_states"].get(target_npc)
+    if taker is None or item not in giver.get("inventory", ()):
+        return False
+    giver["inventory"].remove(item)
+    taker.setdefault("inventory", []).append(item)
+    log.info("npc_gave_item", npc_id=npc_id, target_npc=target_npc, item=item)
+    return True
+
 def player_state_node(state):
     evt    = state.get("last_event")
     params = state.get("event_params", {}) or {}
@@ -31,6 +50,17 @@ def player_state_node(state):
         dest = params.get("new_location")
         if dest in state["world_chunks"]:
             state["player_location"] = dest
+        # Consume the move, or quest_manager routes straight back here
+        state["last_event"] = None
+
+    if evt == "npc_moved":
+        if not move_npc(state, params.get("npc_id"), params.get("new_location")):
+            log.warning("npc_move_ignored", npc_id=params.get("npc_id"), new_location=params.get("new_location"))
+        state["last_event"] = None
+
+    if evt == "npc_gave_item":
+        hand_over(state, params.get("npc_id"), params.get("target_npc"), params.get("item"))
+        state["last_event"] = None
 
     if ta.get("type") == "give_item":
         item = ta["params"].get("item_id")
@@ -0,0 +1,124 @@
+# agents/memory_queue.py
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Iterable, Optional
+
+from utils import metrics
+from utils.log import get_logger
+
+log = get_logger("memory_queue")
+
+# "inline" (default): memory_synthesizer summarizes + indexes before the tick returns.
+# "deferred":         memory_synthesizer only enqueues; the work runs here, in the background.
+MEMORY_MODE    = os.environ.get("NPC_MEMORY_MODE", "inline")
+MEMORY_WORKERS = int(os.environ.get("NPC_MEMORY_WORKERS", "4"))
+
+# Guards NPC memory lists / id maps / FAISS indices while a background job is
+# writing to them. FAISS indices are not safe to search while another thread
+# adds to them, and save_state must not serialize a half-applied memory.
+MEMORY_LOCK = threading.RLock()
+
+
+class MemoryWorkQueue:
+    """
+    Background queue for memory summarization and indexing.
+
+    Jobs are grouped by key (one key per session + NPC). Jobs for the same key run one
+    at a time, in submission order, so an NPC's memories land in tick order.
+    Different keys drain in parallel on a small thread pool.
+    """
+
+    def __init__(self, deferred: bool = False, max_workers: int = MEMORY_WORKERS):
+        self.deferred    = deferred
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._cond    = threading.Condition()
+        self._queues: Dict[Hashable, deque] = {}
+        self._pending: Dict[Hashable, int] = {}   # queued + running, per key
+        self.completed = 0
+        self.failed    = 0
+
+    def submit(self, key: Hashable, fn: Callable[[], None]) -> None:
+        with self._cond:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="memory")
+            q = self._queues.get(key)
+            start = q is None
+            if start:
+                q = self._queues[key] = deque()
+            q.append(fn)
+            self._pending[key] = self._pending.get(key, 0) + 1
+        if start:
+            self._pool.submit(self._drain, key)
+
+    def _drain(self, key: Hashable) -> None:
+        while True:
+            with self._cond:
+                q = self._queues[key]
+                if not q:
+                    del self._queues[key]
+                    return
+                fn = q.popleft()
+            try:
+                fn()
+            except Exception as e:
+                session_id, npc_id = key if isinstance(key, tuple) and len(key) == 2 else (None, key)
+                log.error("memory_job_failed", exc_info=e, session_id=session_id, npc_id=npc_id)
+                with self._cond:
+                    self.failed += 1
+            finally:
+                with self._cond:
+                    self.completed += 1
+                    left = self._pending[key] - 1
+                    if left:
+                        self._pending[key] = left
+                    else:
+                        del self._pending[key]
+                    self._cond.notify_all()
+
+    def depth(self, key: Optional[Hashable] = None) -> int:
+        """ Jobs not yet finished (queued + running), for one key or overall. """
+        with self._cond:
+            if key is not None:
+                return self._pending.get(key, 0)
+            return sum(self._pending.values())
+
+    def flush(self, timeout: Optional[float] = None, keys: Optional[Iterable[Hashable]] = None) -> bool:
+        """
+        Block until every queued job (or every job for `keys`) has been applied.
+        Call before save_state so the snapshot includes deferred memories.
+        Returns False if the timeout expired first.
+        """
+        keys = None if keys is None else set(keys)
+
+        def drained():
+            if keys is None:
+                return not self._pending
+            return not any(k in self._pending for k in keys)
+
+        with self._cond:
+            return self._cond.wait_for(drained, timeout)
+
+
+_queue: Optional[MemoryWorkQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_memory_queue() -> MemoryWorkQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = MemoryWorkQueue(deferred=(MEMORY_MODE == "deferred"))
+    return _queue
+
+
+metrics.gauge("npc_memory_queue_depth", "Deferred memory jobs queued or running",
+              fn=lambda: get_memory_queue().depth())
+metrics.counter("npc_memory_jobs_completed_total", "Deferred memory jobs finished",
+                fn=lambda: get_memory_queue().completed)
+metrics.counter("npc_memory_jobs_failed_total", "Deferred memory jobs that raised",
+                fn=lambda: get_memory_queue().failed)
@@ -1,132 +1,174 @@
-import os
-from groq import Groq
-from sentence_transformers import SentenceTransformer
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from utils.print_utils import summarize_for_printing
+from utils.log import get_logger
+from utils.tracing import span
+from utils.llm_cache import get_llm_cache
+from utils.embedding_service import get_embedding_service
+from utils.llm import get_client, get_async_client
+from agents.memory_queue import get_memory_queue, MEMORY_LOCK
+from agents.quest_triggers import get_matcher
+from lod import tier_of
+from memory.tiering import maybe_upgrade
+from memory.consolidation import maybe_consolidate
 import numpy as np
-import faiss
-
-# Constants for FAISS
-EMBEDDING_DIMENSION = 384
-
-# Load embedding model
-try:
-    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-    SENTENCE_TRANSFORMER_AVAILABLE = True
-except Exception as e:
-    print(f"Warning: could not load SentenceTransformer: {e}")
-    embedding_model = None
-    SENTENCE_TRANSFORMER_AVAILABLE = False
-
-# Load Groq client
-try:
-    client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
-    GROQ_API_KEY_AVAILABLE = True
-except Exception as e:
-    print(f"Warning: Groq init failed: {e}")
-    client = None
-    GROQ_API_KEY_AVAILABLE = False
 
-def memory_synthesizer_node(input_data):
+log = get_logger("memory_synthesizer")
+
+# Importance stored with each new memory (recall ranking in memory/retrieval.py,
+# merge eligibility in memory/consolidation.py): a base by where it came from,
+# raised to QUEST_IMPORTANCE when the text trips a quest trigger
+IMPORTANCE       = {"npc_chat": 0.2, "player": 0.4, "gossip": 0.6}
+QUEST_IMPORTANCE = 0.9
+
+def importance_of(text, source):
+    """ Importance in [0, 1] of a new memory `text` from `source` (a key of IMPORTANCE). """
+    if get_matcher().scan([text]):
+        return QUEST_IMPORTANCE
+    return IMPORTANCE[source]
+
+# Set by collect_index_writes(): index writes are queued here instead of
+# being embedded one at a time (used by /tick_batch).
+_index_batch: ContextVar = ContextVar("memory_index_batch", default=None)
+
+def _add_to_index(npc, emb, entry):
+    with MEMORY_LOCK:
+        mid = npc["next_faiss_id"]
+        npc["faiss_id_to_memory_text"][mid] = entry     # first: a world index reads its timestamp
+        with span("faiss_add"):
+            npc["faiss_index"].add_with_ids(emb, np.array([mid], dtype="int64"))
+        npc["next_faiss_id"] = mid + 1
+        maybe_upgrade(npc)      # past a size threshold: rebuild as HNSW / IVF-PQ in the background
+        maybe_consolidate(npc, entry.get("timestamp", 0))   # over the cap / due: dedupe + merge
+
+def _index_memory(npc, text, entry):
     """
-    1) Handle direct memory_update from gossip_node.
-    2) Otherwise, summarize the last interaction via Groq & embed via FAISS.
+    Embed `text` with the shared embedding service and add it to the NPC's
+    FAISS index under the next free id, recording `entry` in the id→text map.
+    No-op if the NPC has no index or no embedding model is available.
     """
-    # 1) Direct memory updates (gossip) ────────────────────────────
-    #    We still want to handle the target NPC's new raw memory,
-    #    but do NOT return immediately—fall through so the LLM
-    #    summarization can also index *this* NPC's own turn.
-    current_time = input_data.get("simulation_time", 0)
-    if input_data.get("memory_update") and input_data.get("memory_owner"):
-        owner = input_data["memory_owner"]
-        text  = input_data["memory_update"]
-        npc   = input_data["npc_states"][owner]
+    embedder = get_embedding_service()
+    if npc["faiss_index"] is None or not embedder.available:
+        return
+    pending = _index_batch.get()
+    if pending is not None:
+        pending.append((npc, text, entry))
+        return
+    _add_to_index(npc, embedder.encode(text), entry)
 
-        # a) Append raw text to the target NPC's memory
-        npc["memory"].append(text)
+@contextmanager
+def collect_index_writes():
+    """
+    Queue every _index_memory call made in this context (including worker
+    threads started from it) instead of embedding each one on its own.
+    Pass the yielded list to apply_index_writes() afterwards.
+    """
+    pending = []
+    token = _index_batch.set(pending)
+    try:
+        yield pending
+    finally:
+        _index_batch.reset(token)
 
-        # b) Embed & index into that NPC's FAISS
-        if npc["faiss_index"] is not None and SENTENCE_TRANSFORMER_AVAILABLE and embedding_model:
-            vec = embedding_model.encode(text, convert_to_numpy=True)
-            if vec.ndim == 1: vec = vec.reshape(1, -1)
-            emb = vec.astype("float32")
-            norms = np.linalg.norm(emb, axis=1, keepdims=True).clip(min=1e-12)
-            emb /= norms
+def apply_index_writes(pending):
+    """ Embed all queued memories in one encode call and index them in order. """
+    if not pending:
+        return
+    embs = get_embedding_service().encode_many([text for _, text, _ in pending])
+    if embs is None:
+        return
+    for (npc, _, entry), emb in zip(pending, embs):
+        _add_to_index(npc, emb.reshape(1, -1), entry)
 
-            mid = npc["next_faiss_id"]
-            npc["faiss_index"].add_with_ids(emb, np.array([mid], dtype="int64"))
-            npc["faiss_id_to_memory_text"][mid] = {
-                "text":      text,
-                "npc_id":    owner,
-                "timestamp": current_time,
-            }
-            npc["next_faiss_id"] = mid + 1
+def _take_gossip(input_data):
+    """
+    1) Direct memory updates (gossip) ────────────────────────────
+       We still want to handle the target NPC's new raw memory,
+       but do NOT return immediately—fall through so the LLM
+       summarization can also index *this* NPC's own turn.
+
+    Returns a gossip job for the target NPC (or None) and clears the fields.
+    """
+    if not (input_data.get("memory_update") and input_data.get("memory_owner")):
+        return None
+    owner = input_data["memory_owner"]
+    job = {
+        "npc_id":    owner,
+        "npc":       input_data["npc_states"][owner],
+        "text":      input_data["memory_update"],
+        "timestamp": input_data.get("simulation_time", 0),
+    }
+    # clear so we don't accidentally re‐process it below
+    input_data["memory_update"] = None
+    input_data["memory_owner"]  = None
+    return job
+
+def _store_gossip(job):
+    npc, text = job["npc"], job["text"]
 
-        # clear so we don't accidentally re‐process it below
-        input_data["memory_update"] = None
-        input_data["memory_owner"]  = None
+    # a) Append raw text to the target NPC's memory
+    with MEMORY_LOCK:
+        npc["memory"].append(text)
+
+    # b) Embed & index into that NPC's FAISS
+    _index_memory(npc, text, {
+        "text":       text,
+        "npc_id":     job["npc_id"],
+        "timestamp":  job["timestamp"],
+        "importance": importance_of(text, "gossip"),
+    })
 
-    # 2) Fall back to LLM summarization for the speaking NPC ────────
-    #    This will create a concise "X remembers that…" sentence
-    #    and index it into *their* FAISS.  That's how Malrik gets
-    #    his own memory of the last turn.
+def remember(npc_id, npc, text, timestamp):
+    """ Store `text` as one of the NPC's memories as-is (no LLM) and index it. """
+    _store_gossip({"npc_id": npc_id, "npc": npc, "text": text, "timestamp": timestamp})
 
-    # Debug log
-    print("Memory Synthesizer received:", summarize_for_printing(input_data, keys_to_redact=["faiss_index"]))
+def _prepare_summary(input_data):
+    """
+    2) Fall back to LLM summarization for the speaking NPC ────────
+       This will create a concise "X remembers that…" sentence
+       and index it into *their* FAISS.  That's how Malrik gets
+       his own memory of the last turn.
 
+    Returns a summary job (NPC, fallback text, Groq request), or None if the
+    event doesn't name a known NPC. NPCs beyond the near LOD tier (lod.py)
+    get no request: their template summary is stored as it is.
+    """
     params       = input_data.get("event_params", {}) or {}
     npc_id       = params.get("npc_id", "unknown_npc")
     player_input = params.get("text", "(no player text)")
     npc_response = input_data.get("response", "(no NPC response)")
     current_time = input_data.get("simulation_time", 0)
+    # npc_chat turns (scheduler.py) are with another NPC rather than the player
+    speaker      = params.get("speaker")
 
-    # safety check
-    if npc_id not in input_data["npc_states"]:
-        return input_data
-    npc = input_data["npc_states"][npc_id]
-
-    # fallback summary
-    summary = (
-        f"{npc_id} remembers that the player said '{player_input}', "
-        f"and {npc_id} replied '{npc_response}'."
-    )
-
-    # if no Groq, index fallback and return
-    if not GROQ_API_KEY_AVAILABLE or client is None:
-        print(f"MemorySynthesizer ({npc_id}): Groq unavailable, using fallback.")
-        npc["memory"].append(summary)
-        if npc["faiss_index"] is not None and SENTENCE_TRANSFORMER_AVAILABLE:
-            vec = embedding_model.encode(summary, convert_to_numpy=True)
-            if vec.ndim == 1:
-                vec = vec.reshape(1, -1)
-            emb = vec.astype("float32")
-            norms = np.linalg.norm(emb, axis=1, keepdims=True)
-            norms[norms == 0] = 1e-12
-            emb /= norms
-
-            mid = npc["next_faiss_id"]
-            npc["faiss_index"].add_with_ids(emb, np.array([mid], dtype='int64'))
-            npc["faiss_id_to_memory_text"][mid] = summary
-            npc["next_faiss_id"] = mid + 1
-
-        # consume event
-        input_data["last_event"]   = None
-        input_data["event_params"] = {}
-        return input_data
+    # safety check; an NPC passing on gossip has no turn of its own to remember
+    if npc_id not in input_data["npc_states"] or input_data.get("last_event") == "npc_gossip":
+        return None
 
-    # build and send prompts
+    # build prompts
     system_prompt = (
         f"You are a memory module for NPC '{npc_id}'. "
         "Summarize this interaction into one concise sentence, "
         f"starting with '{npc_id} remembers that...'."
     )
     user_prompt = (
-        f"Player said: \"{player_input}\"\n"
+        f"{speaker or 'Player'} said: \"{player_input}\"\n"
         f"{npc_id} responded: \"{npc_response}\"\n\n"
         "Summarize as:"
     )
-
-    try:
-        chat = client.chat.completions.create(
+    return {
+        "npc_id":    npc_id,
+        "npc":       input_data["npc_states"][npc_id],
+        "timestamp": current_time,
+        "source":    "npc_chat" if speaker else "player",
+        # fallback summary
+        "fallback": (
+            f"{npc_id} remembers that {speaker or 'the player'} said '{player_input}', "
+            f"and {npc_id} replied '{npc_response}'."
+        ),
+        "request": None if tier_of(input_data, npc_id) != "near" else dict(
             messages=[
                 {"role":"system","content":system_prompt},
                 {"role":"user",  "content":user_prompt}
@@ -134,47 +176,132 @@ def memory_synthesizer_node(input_data):
             model="llama-3.1-8b-instant",
             temperature=0.5,
             max_tokens=60
-        )
-        llm_summary = chat.choices[0].message.content.strip()
-        if llm_summary:
-            summary = llm_summary
-        print(f"MemorySynthesizer ({npc_id}): LLM summary: {summary}")
+        ),
+    }
+
+def _summarize(job):
+    """ Ask Groq for the one-line summary; fall back to the template on any failure. """
+    npc_id = job["npc_id"]
+    if job["request"] is None:
+        return job["fallback"]
+    client = get_client()
+    if client is None:
+        log.warning("memory_summary_fallback", npc_id=npc_id, reason="llm_unavailable")
+        return job["fallback"]
+    try:
+        chat = get_llm_cache().complete(client, job["request"], "memory_synthesizer")
+        summary = chat.choices[0].message.content.strip() or job["fallback"]
+        log.info("memory_summarized", npc_id=npc_id, summary=summary)
+        return summary
+    except Exception as e:
+        log.warning("memory_summary_fallback", npc_id=npc_id, reason="llm_error", error=str(e))
+        return job["fallback"]
+
+async def _asummarize(job):
+    """ Async twin of _summarize using the AsyncGroq client. """
+    npc_id = job["npc_id"]
+    if job["request"] is None:
+        return job["fallback"]
+    client = get_async_client()
+    if client is None:
+        log.warning("memory_summary_fallback", npc_id=npc_id, reason="llm_unavailable")
+        return job["fallback"]
+    try:
+        chat = await get_llm_cache().acomplete(client, job["request"], "memory_synthesizer")
+        summary = chat.choices[0].message.content.strip() or job["fallback"]
+        log.info("memory_summarized", npc_id=npc_id, summary=summary)
+        return summary
     except Exception as e:
-        print(f"MemorySynthesizer ({npc_id}): LLM error {e}, using fallback.")
+        log.warning("memory_summary_fallback", npc_id=npc_id, reason="llm_error", error=str(e))
+        return job["fallback"]
+
+def _store_summary(job, summary):
+    """ Append the summary to the NPC's raw memory and index it. """
+    npc_id = job["npc_id"]
+    npc    = job["npc"]
 
     # append to raw memory
-    npc["memory"].append(summary)
+    with MEMORY_LOCK:
+        npc["memory"].append(summary)
 
     # embed + index the summary
-    if npc["faiss_index"] is not None and SENTENCE_TRANSFORMER_AVAILABLE:
-        try:
-            vec = embedding_model.encode(summary, convert_to_numpy=True)
-            if vec.ndim == 1:
-                vec = vec.reshape(1, -1)
-            emb = vec.astype("float32")
-            norms = np.linalg.norm(emb, axis=1, keepdims=True)
-            norms[norms == 0] = 1e-12
-            emb /= norms
-
-            mid = npc["next_faiss_id"]
-            npc["faiss_index"].add_with_ids(emb, np.array([mid], dtype='int64'))
-            npc["faiss_id_to_memory_text"][mid] = {
-                "text":      summary,
-                "timestamp": current_time
-            }
-            npc["faiss_id_to_memory_text"][mid] = {
-                    "text":      summary,
-                    "npc_id":    npc_id,
-                   "timestamp": current_time
-                }
-            npc["next_faiss_id"] = mid + 1
-        except Exception as e:
-            print(f"MemorySynthesizer ({npc_id}): Embedding error {e}")
+    try:
+        _index_memory(npc, summary, {
+            "text":       summary,
+            "npc_id":     npc_id,
+            "timestamp":  job["timestamp"],
+            "importance": importance_of(summary, job["source"]),
+        })
+    except Exception as e:
+        log.error("memory_embedding_failed", npc_id=npc_id, error=str(e))
 
+def _consume_event(input_data):
     # finally, consume the event so it doesn't re-fire
     input_data["last_event"]        = None
     input_data["event_params"]      = {}
     input_data["memory_update"]     = None
     input_data["memory_owner"]      = None
+    return input_data
 
+def _defer(input_data, gossip, job):
+    """
+    Deferred mode: hand the gossip write and the summarize→embed→index work
+    to the per-NPC background queue and let the tick return right away.
+    Jobs are keyed by (session, NPC) so each NPC's memories are applied in
+    tick order.
+    """
+    queue = get_memory_queue()
+    session_id = input_data.get("session_id")
+    if gossip is not None:
+        queue.submit((session_id, gossip["npc_id"]), lambda: _store_gossip(gossip))
+    if job is not None:
+        queue.submit((session_id, job["npc_id"]), lambda: _store_summary(job, _summarize(job)))
+        return _consume_event(input_data)
     return input_data
+
+def memory_synthesizer_node(input_data):
+    """
+    1) Handle direct memory_update from gossip_node.
+    2) Otherwise, summarize the last interaction via Groq & embed via FAISS.
+    """
+    gossip = _take_gossip(input_data)
+
+    # Debug log (the state summary is only built when debug logging is on)
+    log.debug("memory_synthesizer_received",
+              state=lambda: summarize_for_printing(input_data, keys_to_redact=["faiss_index"]))
+
+    job = _prepare_summary(input_data)
+    if get_memory_queue().deferred:
+        return _defer(input_data, gossip, job)
+
+    if gossip is not None:
+        _store_gossip(gossip)
+    if job is None:
+        return input_data
+
+    _store_summary(job, _summarize(job))
+    return _consume_event(input_data)
+
+async def amemory_synthesizer_node(input_data):
+    """
+    Async variant used by graph.ainvoke: the Groq call is awaited and the
+    embedding/FAISS work runs on a worker thread.
+    """
+    gossip = _take_gossip(input_data)
+
+    # Debug log (the state summary is only built when debug logging is on)
+    log.debug("memory_synthesizer_received",
+              state=lambda: summarize_for_printing(input_data, keys_to_redact=["faiss_index"]))
+
+    job = _prepare_summary(input_data)
+    if get_memory_queue().deferred:
+        return _defer(input_data, gossip, job)
+
+    if gossip is not None:
+        await asyncio.to_thread(_store_gossip, gossip)
+    if job is None:
+        return input_data
+
+    summary = await _asummarize(job)
+    await asyncio.to_thread(_store_summary, job, summary)
+    return _consume_event(input_data)
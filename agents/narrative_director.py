@@ -1,7 +1,9 @@
 # agents/narrative_director.py
 
-from narrative_rules import NARRATIVE_RULES
-from utils.print_utils import summarize_for_printing
+from narrative_engine import get_engine
+from utils.log import get_logger
+
+log = get_logger("narrative_director")
 
 def narrative_director_node(input_data):
     """
@@ -27,7 +29,8 @@ def narrative_director_node(input_data):
     new_quest_history = list(quest_history)
     new_cooldown = cooldown
     
-    print(f"NarrativeDirector received (time={sim_time}, tod={tod}, loc={location}, weather={weather}, cooldown={cooldown})")
+    log.info("narrative_director_received", time=sim_time, time_of_day=tod, location=location,
+             weather=weather, cooldown=cooldown)
     
     # 2) If cooldown > 0, just count down and do nothing else
     if new_cooldown > 0:
@@ -41,15 +44,8 @@ def narrative_director_node(input_data):
         }
     
     # 3) Otherwise, find the first rule whose condition matches
-    matched = None
-    for rule in NARRATIVE_RULES:
-        try:
-            if rule["when"](state):
-                matched = rule
-                break
-        except Exception:
-            # If a rule’s lambda crashes for missing keys, skip it
-            continue
+    #    (memoized on the fields each rule depends on; see narrative_engine)
+    matched = get_engine().first_match(state)
     
     if matched is None:
         # Shouldn't happen if you have a fallback rule (always_true)
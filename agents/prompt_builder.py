@@ -0,0 +1,149 @@
+# agents/prompt_builder.py
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from spatial_index import spatial_index_of
+from utils import metrics
+
+# Estimated tokens allowed in character_agent's system prompt. The NPC's
+# own prefix always goes in; memories, then gossip targets, fill the rest.
+PROMPT_TOKEN_BUDGET = int(os.environ.get("NPC_PROMPT_TOKEN_BUDGET", "600"))
+# NPC prefixes remembered (one per distinct personality / emotion / inventory)
+PREFIX_CACHE_SIZE = 4096
+
+NO_MEMORIES = "I have no specific memories to draw on."
+
+_INSTRUCTIONS = (
+    "When you reply, return ONLY valid JSON with these keys:\n"
+    "{\n"
+    '  "response": string,\n'
+    '  "emotion_state": one of [neutral,happy,sad,angry,curious],\n'
+    '  "tool_action": { "type": string, "params": {...} } or null\n'
+    "}\n\n"
+    "# GOSSIP INSTRUCTIONS\n"
+    "If you want to share private gossip with one of the NPCs listed below, "
+    "set tool_action to:\n"
+    '  { "type": "gossip", "params": { '
+    '"target_npc": "<that_npc_id>", "message": "<your private message>" } }\n'
+    "Otherwise set tool_action to null.\n"
+)
+
+_TARGETS = "\nOther NPCs you could share gossip with: {}.\n"
+
+_prefix_lookups = metrics.counter("npc_prompt_prefix_cache_total",
+                                  "character_agent prompt prefixes reused (hit) or rebuilt (miss)", ("result",))
+_prompt_tokens  = metrics.histogram("npc_prompt_tokens", "Estimated prompt tokens per LLM call", ("node",),
+                                    buckets=(64, 128, 256, 384, 512, 768, 1024, 1536, 2048, 4096, 8192))
+
+
+def estimate_tokens(text: str) -> int:
+    """ Rough token count (~4 characters per token for English text); no tokenizer needed. """
+    return (len(text) + 3) // 4
+
+
+def reachable_npcs(state: Dict[str, Any], npc_id: str) -> List[str]:
+    """ Other NPCs in `npc_id`'s chunk or a neighbouring one, own chunk first (see spatial_index). """
+    return spatial_index_of(state).near_npc(npc_id)
+
+
+class PromptBuilder:
+    """
+    Assembles character_agent's system prompt as
+        prefix    persona, emotion, inventory and the reply / gossip instructions
+        memories  recalled (or most recent) memories
+        targets   the NPCs within reach, as gossip targets
+    The prefix is cached per NPC and only rebuilt when its personality,
+    emotion or inventory changes. Memories, then targets, are added in
+    order while the prompt stays within `budget` estimated tokens.
+    """
+
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET):
+        self.budget = budget
+        self._lock  = threading.Lock()
+        self._prefixes: "OrderedDict[Tuple, Tuple[str, int]]" = OrderedDict()
+
+    def prefix(self, npc_id: str, npc: Dict[str, Any]) -> Tuple[str, int]:
+        """ (text, estimated tokens) of the NPC's prefix, rebuilt only when its key fields changed. """
+        key = (npc_id, npc.get("personality", "an NPC"), npc.get("emotion_state", "neutral"),
+               tuple(npc.get("inventory", ())))
+        with self._lock:
+            got = self._prefixes.get(key)
+            if got is not None:
+                self._prefixes.move_to_end(key)
+        if got is not None:
+            _prefix_lookups.inc(result="hit")
+            return got
+        _prefix_lookups.inc(result="miss")
+        _, personality, emotion, inventory = key
+        text = (f"You are '{npc_id}', {personality}. You feel '{emotion}'.\n"
+                f"Inventory: {', '.join(inventory) if inventory else 'nothing'}.\n\n"
+                + _INSTRUCTIONS + "\n")
+        got = (text, estimate_tokens(text))
+        with self._lock:
+            self._prefixes[key] = got
+            while len(self._prefixes) > PREFIX_CACHE_SIZE:
+                self._prefixes.popitem(last=False)
+        return got
+
+    def system_prompt(self, state: Dict[str, Any], npc_id: str,
+                      memories: Sequence[str], recalled: bool) -> str:
+        """ `memories` best first; `recalled` marks them as retrieval hits rather than the latest few. """
+        npcs = state["npc_states"]
+        prefix, used = self.prefix(npc_id, npcs[npc_id])
+        parts = [prefix]
+
+        # Room for the two sections even when nothing fits in them
+        used += estimate_tokens(_TARGETS.format("none"))
+
+        # 1) Memories, best first, while they fit
+        header = "Past memories:\n" if recalled else ""
+        lines  = []
+        used  += max(estimate_tokens(header), estimate_tokens(NO_MEMORIES + "\n"))
+        for m in memories:
+            line = f" • {m}\n"
+            cost = estimate_tokens(line)
+            if used + cost > self.budget:
+                break
+            lines.append(line)
+            used += cost
+        parts.append(header + "".join(lines) if lines else NO_MEMORIES + "\n")
+
+        # 2) Gossip targets within reach, while they fit
+        targets = []
+        for other_id in reachable_npcs(state, npc_id):
+            entry = f"{other_id} ({npcs[other_id].get('personality', '')})"
+            cost = estimate_tokens(entry) + 1
+            if used + cost > self.budget:
+                break
+            targets.append(entry)
+            used += cost
+        parts.append(_TARGETS.format(", ".join(targets) or "none"))
+        return "".join(parts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._prefixes.clear()
+
+
+def record_prompt_tokens(node: str, request: Dict[str, Any]) -> int:
+    """ Observe a request's estimated prompt size into npc_prompt_tokens{node}. """
+    tokens = sum(estimate_tokens(m.get("content", "")) for m in request.get("messages", []))
+    _prompt_tokens.observe(tokens, node=node)
+    return tokens
+
+
+_builder: Optional[PromptBuilder] = None
+_builder_lock = threading.Lock()
+
+
+def get_prompt_builder() -> PromptBuilder:
+    """ The process-wide PromptBuilder (created on first call). """
+    global _builder
+    if _builder is None:
+        with _builder_lock:
+            if _builder is None:
+                _builder = PromptBuilder()
+    return _builder
@@ -1,9 +1,11 @@
 # agents/quest_completion.py
-import re, json
 from typing import Dict, Any
 
-with open("quests.json") as f:
-    _QUEST_CONFIG = json.load(f)
+from agents.quest_registry import get_quests
+from agents.quest_triggers import get_matcher
+from utils.log import get_logger
+
+log = get_logger("quest_completion")
 
 def quest_completion_node(state: Dict[str, Any]) -> Dict[str, Any]:
     evt = state.get("last_event")
@@ -11,17 +13,15 @@ def quest_completion_node(state: Dict[str, Any]) -> Dict[str, Any]:
     if evt != "player_chat" or not text:
         return state
 
-    for quest_id in list(state["active_quests"]):
-        cfg = _QUEST_CONFIG.get(quest_id, {})
-        for pat in cfg.get("complete_triggers", []):
-            if re.search(pat, text, re.IGNORECASE):
-                # mark complete
-                state["active_quests"].remove(quest_id)
-                state["completed_quests"].append(quest_id)
-                state["response"] = cfg.get("complete_text", "Quest completed!")
-                # prevent double‐firing
-                state["last_event"]   = None
-                state["event_params"] = {}
-                print(f"Quest Completion: {quest_id} completed")
-                return state
+    quest_id = get_matcher().completed(text, state["active_quests"])
+    if quest_id is not None:
+        cfg = get_quests().get(quest_id, {})
+        # mark complete
+        state["active_quests"].remove(quest_id)
+        state["completed_quests"].append(quest_id)
+        state["response"] = cfg.get("complete_text", "Quest completed!")
+        # prevent double‐firing
+        state["last_event"]   = None
+        state["event_params"] = {}
+        log.info("quest_completed", quest_id=quest_id)
     return state 
\ No newline at end of file
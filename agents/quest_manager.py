@@ -1,31 +1,30 @@
 # agents/quest_manager.py
 
-import re, json
 from typing import Dict, Any
 
-with open("quests.json") as f:
-    _QUEST_CONFIG = json.load(f)
+from agents.quest_registry import get_quests
+from agents.quest_triggers import triggered_quest
+from spatial_index import npcs_near_player
+from utils.log import get_logger
+
+log = get_logger("quest_manager")
 
 def quest_manager_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    quests = get_quests()
     active = set(state["active_quests"])
     # if already offered or active, do nothing
-    if state.get("pending_quest") or any(q in active for q in _QUEST_CONFIG):
+    if state.get("pending_quest") or any(q in quests for q in active):
         return state
 
-    # scan for triggers
-    for quest_id, info in _QUEST_CONFIG.items():
-        if quest_id in active:
-            continue
-        patterns = [re.compile(p, re.IGNORECASE) for p in info["triggers"]]
-        for npc in state["npc_states"].values():
-            for mem in npc["memory"]:
-                if any(p.search(mem) for p in patterns):
-                    # Found a match → *offer* the quest
-                    state["tool_action"]   = {
-                        "type":   "offer_quest",
-                        "params": {"quest_id": quest_id}
-                    }
-                    state["pending_quest"] = quest_id
-                    print(f"Quest Manager: Offering quest {quest_id}")
-                    return state
+    # scan the memories of the NPCs around the player for triggers (only
+    # memories added since each NPC's last scan; see quest_triggers)
+    quest_id = triggered_quest(state, exclude=active, npc_ids=npcs_near_player(state))
+    if quest_id is not None:
+        # Found a match → *offer* the quest
+        state["tool_action"]   = {
+            "type":   "offer_quest",
+            "params": {"quest_id": quest_id}
+        }
+        state["pending_quest"] = quest_id
+        log.info("quest_offered", quest_id=quest_id)
     return state
@@ -0,0 +1,214 @@
+# agents/quest_registry.py
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, FrozenSet, List, Optional
+
+try:
+    import re._parser as _re_parser         # Python 3.11+
+except ImportError:                          # pragma: no cover
+    import sre_parse as _re_parser
+
+# quests.json lives next to the repo root, not wherever the process was started
+QUESTS_PATH = os.environ.get(
+    "QUESTS_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "quests.json"),
+)
+# Seconds between checks of quests.json's mtime; a changed file is re-read in
+# the background and swapped in once it validates (0 disables hot reload)
+RELOAD_INTERVAL = float(os.environ.get("QUESTS_RELOAD_INTERVAL", "2"))
+# Shortest literal a trigger must contain to be looked up by term (see QuestRegistry.by_term)
+MIN_TERM = 3
+
+_TEXT_FIELDS = ("title", "offer_text", "accept_text", "decline_text", "complete_text")
+
+
+class QuestConfigError(ValueError):
+    """ quests.json is malformed; the message lists every problem found. """
+
+
+def _required_literal(pattern: str) -> Optional[str]:
+    """
+    The longest run of plain characters every match of `pattern` contains
+    (lower-cased), or None if it has none of at least MIN_TERM characters,
+    e.g. "gate[s]? closing" → " closing", "thief|steal" → None.
+    """
+    best, run = "", []
+    for op, av in list(_re_parser.parse(pattern)) + [(None, None)]:
+        if op is _re_parser.LITERAL:
+            run.append(chr(av))
+            continue
+        if len(run) > len(best):
+            best = "".join(run)
+        run = []
+    best = best.lower()
+    return best if len(best) >= MIN_TERM and best.isascii() else None
+
+
+def validate(quests: Any) -> List[str]:
+    """ Problems with a parsed quests.json, one message each (empty if it's fine). """
+    if not isinstance(quests, dict):
+        return ["top level must be an object of quest_id → quest"]
+    errors = []
+    for quest_id, cfg in quests.items():
+        if not isinstance(cfg, dict):
+            errors.append(f"{quest_id}: must be an object")
+            continue
+        if not isinstance(cfg.get("offer_text"), str):
+            errors.append(f"{quest_id}: offer_text is required")
+        for field in _TEXT_FIELDS:
+            if field in cfg and not isinstance(cfg[field], str):
+                errors.append(f"{quest_id}: {field} must be a string")
+        for field in ("triggers", "complete_triggers", "npcs"):
+            value = cfg.get(field, [])
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                errors.append(f"{quest_id}: {field} must be a list of strings")
+                continue
+            if field == "npcs":
+                continue
+            for n, pattern in enumerate(value):
+                try:
+                    re.compile(pattern, re.IGNORECASE)
+                except re.error as e:
+                    errors.append(f"{quest_id}: {field}[{n}] {pattern!r}: {e}")
+    return errors
+
+
+class QuestRegistry:
+    """
+    One validated, precompiled load of quests.json:
+      quests       the config as parsed (what get_quests() returns)
+      rank         quest_id → position in quests.json (offers go in file order)
+      triggers     quest_id → compiled "triggers" (case-insensitive)
+      complete     quest_id → compiled "complete_triggers"
+      by_term      lower-cased literal → [(quest_id, pattern)] for trigger patterns
+                   that can only match text containing that literal
+      unindexed    [(quest_id, pattern)] for the others ("thief|steal", "a.b")
+      by_npc       npc_id → quests limited to that NPC's memories (optional "npcs")
+      open_quests  quests any NPC's memories can trigger
+    Raises QuestConfigError if the config doesn't validate.
+    """
+
+    def __init__(self, quests: Dict[str, Dict[str, Any]], mtime: Optional[int] = None):
+        errors = validate(quests)
+        if errors:
+            raise QuestConfigError("; ".join(errors))
+        self.quests = quests
+        self.mtime  = mtime
+        self.order  = list(quests)
+        self.rank   = {q: n for n, q in enumerate(self.order)}
+        self.triggers = {q: [re.compile(p, re.IGNORECASE) for p in cfg.get("triggers", [])]
+                         for q, cfg in quests.items()}
+        self.complete = {q: [re.compile(p, re.IGNORECASE) for p in cfg.get("complete_triggers", [])]
+                         for q, cfg in quests.items()}
+
+        self.by_term: Dict[str, List] = {}
+        self.unindexed: List = []
+        for quest_id, patterns in self.triggers.items():
+            for p in patterns:
+                term = _required_literal(p.pattern)
+                if term is None:
+                    self.unindexed.append((quest_id, p))
+                else:
+                    self.by_term.setdefault(term, []).append((quest_id, p))
+
+        self.by_npc: Dict[str, List[str]] = {}
+        for quest_id, cfg in quests.items():
+            for npc_id in cfg.get("npcs", []):
+                self.by_npc.setdefault(npc_id, []).append(quest_id)
+        self.open_quests = frozenset(q for q, cfg in quests.items() if not cfg.get("npcs"))
+        self._for_npc: Dict[str, FrozenSet[str]] = {}
+
+    def quests_for(self, npc_id: Optional[str]) -> FrozenSet[str]:
+        """ Quests whose triggers apply to `npc_id`'s memories. """
+        got = self._for_npc.get(npc_id)
+        if got is None:
+            got = self._for_npc[npc_id] = self.open_quests | frozenset(self.by_npc.get(npc_id, ()))
+        return got
+
+
+def _read(path: str) -> QuestRegistry:
+    mtime = os.stat(path).st_mtime_ns
+    with open(path) as f:
+        return QuestRegistry(json.load(f), mtime)
+
+
+_registry: Optional[QuestRegistry] = None
+_registry_lock = threading.Lock()
+_checked_at = 0.0
+_seen_mtime: Optional[int] = None
+_reloading = False
+
+
+def get_registry() -> QuestRegistry:
+    """
+    The current quest registry, read on first call. Every RELOAD_INTERVAL
+    seconds a call also compares quests.json's mtime; on a change the file
+    is re-read on a background thread and callers keep the previous
+    registry until the new one has loaded and validated.
+    """
+    global _registry, _checked_at, _seen_mtime
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = _read(QUESTS_PATH)
+                _seen_mtime = _registry.mtime
+                _checked_at = time.monotonic()
+    elif RELOAD_INTERVAL > 0 and time.monotonic() - _checked_at >= RELOAD_INTERVAL:
+        _check_for_changes()
+    return _registry
+
+
+def get_quests() -> Dict[str, Dict[str, Any]]:
+    """
+    Return the quest config (see get_registry()).
+    Shared by quest_manager, quest_offer, quest_response and quest_completion.
+    """
+    return get_registry().quests
+
+
+def _check_for_changes() -> None:
+    global _checked_at, _seen_mtime, _reloading
+    with _registry_lock:
+        if _reloading or time.monotonic() - _checked_at < RELOAD_INTERVAL:
+            return
+        _checked_at = time.monotonic()
+        try:
+            mtime = os.stat(QUESTS_PATH).st_mtime_ns
+        except OSError:
+            return
+        if mtime == _seen_mtime:
+            return
+        _seen_mtime = mtime         # a broken file is reported once, not every interval
+        _reloading = True
+    threading.Thread(target=_reload_in_background, name="quest-reload", daemon=True).start()
+
+
+def _reload_in_background() -> None:
+    global _reloading
+    try:
+        reload()
+    finally:
+        with _registry_lock:
+            _reloading = False
+
+
+def reload() -> bool:
+    """
+    Re-read quests.json now. On a parse or validation error the previous
+    registry stays in place and False is returned.
+    """
+    global _registry, _seen_mtime
+    try:
+        registry = _read(QUESTS_PATH)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  quests.json not reloaded, keeping the previous quests: {e}")
+        return False
+    with _registry_lock:
+        _registry = registry
+        _seen_mtime = registry.mtime
+    print(f"🔁 Reloaded {len(registry.quests)} quests from {QUESTS_PATH}")
+    return True
@@ -1,15 +1,13 @@
 # agents/quest_response.py
 
 from typing import Dict, Any
-import json
 
-with open("quests.json") as f:
-    _QUEST_CONFIG = json.load(f)
+from agents.quest_registry import get_quests
 
 def quest_response_node(state: Dict[str, Any]) -> Dict[str, Any]:
     reply    = state["event_params"]["text"].strip().lower()
     quest_id = state.get("pending_quest")
-    config   = _QUEST_CONFIG.get(quest_id, {})
+    config   = get_quests().get(quest_id, {})
     
     if reply in ("yes", "y"):
         state["active_quests"].append(quest_id)
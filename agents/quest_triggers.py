@@ -0,0 +1,177 @@
+# agents/quest_triggers.py
+
+import hashlib
+import json
+import re
+import threading
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Union
+
+from agents.quest_registry import MIN_TERM, QuestRegistry, get_registry
+from utils import metrics
+
+_scanned = metrics.counter("npc_quest_trigger_memories_scanned_total",
+                           "Memories checked against quest triggers")
+
+
+# Up to this many trigger patterns, one alternation of all of them is the
+# cheapest probe; past it the registry's term index is used instead (an
+# alternation costs time per pattern, a term lookup doesn't)
+ALTERNATION_MAX = 128
+_GRAMS = re.compile(r"(?=(.{%d}))" % MIN_TERM, re.DOTALL)
+
+
+class TriggerMatcher:
+    """
+    Finds which quests' "triggers" occur in a batch of memories, using the
+    patterns the registry compiled at load time.
+
+    The batch is joined into one string and read once by a probe, and only
+    memories the probe flags are checked against the quests' own patterns
+    (exactly as quest_manager always has), so the probe just has to never
+    miss:
+      few patterns   one alternation of all of them
+      many patterns  a MIN_TERM-gram lookup into QuestRegistry.by_term for
+                     patterns with a required literal, plus an alternation
+                     of the rest
+    ASCII text is probed lower-cased and case-sensitively, which Python's re
+    does ~10x faster than IGNORECASE; other text is probed as written.
+    """
+
+    def __init__(self, registry: Union[QuestRegistry, Dict[str, Dict[str, Any]]]):
+        if not isinstance(registry, QuestRegistry):
+            registry = QuestRegistry(registry)
+        self.registry = registry
+        # identifies the trigger set; scan watermarks are only valid for the same key
+        self.key = hashlib.sha1(json.dumps({q: [c.get("triggers", []), c.get("npcs", [])]
+                                            for q, c in registry.quests.items()},
+                                           sort_keys=True).encode()).hexdigest()[:16]
+
+        indexed = [pair for pairs in registry.by_term.values() for pair in pairs]
+        if len(indexed) + len(registry.unindexed) <= ALTERNATION_MAX:
+            self._probed = [(q, p) for q, ps in registry.triggers.items() for p in ps]
+            self._by_gram: Dict[str, List[str]] = {}
+        else:
+            self._probed = registry.unindexed
+            self._by_gram = {}
+            for term in registry.by_term:
+                self._by_gram.setdefault(term[:MIN_TERM], []).append(term)
+
+        patterns = [p.pattern for _, p in self._probed]
+        # patterns with groups stay on their own: joining them would renumber their backreferences
+        plain   = [p for p in patterns if re.compile(p).groups == 0]
+        grouped = [p for p in patterns if re.compile(p).groups > 0]
+        def probes(flags):
+            return (([re.compile("|".join(f"(?:{p})" for p in plain), flags)] if plain else [])
+                    + [re.compile(p, flags) for p in grouped])
+        self._probes       = probes(re.IGNORECASE)
+        self._lower_probes = probes(0) if all(p == p.lower() for p in patterns) else None
+
+    def quests_in(self, text: str, allowed: Optional[FrozenSet[str]] = None) -> List[str]:
+        """ Ids of the quests (of `allowed`, default all) whose triggers occur in `text`. """
+        return [q for q, ps in self.registry.triggers.items()
+                if (allowed is None or q in allowed) and any(p.search(text) for p in ps)]
+
+    def scan(self, texts: List[str], npc_id: Optional[str] = None) -> List[str]:
+        """
+        Ids of the quests triggered by any of `texts`, in quests.json order.
+        With `npc_id`, only quests open to that NPC's memories.
+        """
+        if not texts:
+            return []
+        allowed = self.registry.quests_for(npc_id) if npc_id is not None else None
+        hits: Set[str] = set()
+        joined = "\n".join(texts)
+        probes = self._probes
+        if joined.isascii() and self._lower_probes is not None:
+            joined, probes = joined.lower(), self._lower_probes
+        starts = list(accumulate((len(t) + 1 for t in texts[:-1]), initial=0))
+
+        checked = set()
+        for probe in probes:
+            for m in probe.finditer(joined):
+                # a match may run across the separator: check every memory it touches
+                first = bisect_right(starts, m.start()) - 1
+                last  = bisect_right(starts, max(m.start(), m.end() - 1)) - 1
+                for i in range(first, last + 1):
+                    if i not in checked:
+                        checked.add(i)
+                        hits.update(q for q, p in self._probed
+                                    if (allowed is None or q in allowed) and p.search(texts[i]))
+
+        if self._by_gram:
+            for text in texts:
+                if not text.isascii():
+                    hits.update(self.quests_in(text, allowed))     # lower() may not line up with IGNORECASE
+                    continue
+                low = text.lower()
+                for gram in self._by_gram.keys() & set(_GRAMS.findall(low)):
+                    for term in self._by_gram[gram]:
+                        if term in low:
+                            hits.update(q for q, p in self.registry.by_term[term]
+                                        if (allowed is None or q in allowed) and p.search(text))
+        return sorted(hits, key=self.registry.rank.__getitem__)
+
+    def completed(self, text: str, quest_ids: Iterable[str]) -> Optional[str]:
+        """ The first of `quest_ids` whose "complete_triggers" match `text`. """
+        for quest_id in quest_ids:
+            if any(p.search(text) for p in self.registry.complete.get(quest_id, ())):
+                return quest_id
+        return None
+
+
+_matcher: Optional[TriggerMatcher] = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher() -> TriggerMatcher:
+    """ The matcher for the current quest registry, rebuilt when it is reloaded. """
+    global _matcher
+    registry = get_registry()
+    if _matcher is None or _matcher.registry is not registry:
+        with _matcher_lock:
+            if _matcher is None or _matcher.registry is not registry:
+                _matcher = TriggerMatcher(registry)
+    return _matcher
+
+
+def scan_npc(npc: Dict[str, Any], matcher: Optional[TriggerMatcher] = None) -> List[str]:
+    """
+    Check the memories `npc` gained since its last scan and return the ids
+    of every quest triggered by any of its memories so far.
+
+    The watermark lives on the NPC (saved with it) as
+      npc["quest_scan"] = {"key": matcher key, "at": memories scanned, "hits": [quest ids]}
+    and is reset, so the whole list is read again, when the trigger set
+    changes or the memory list shrank under it. Consolidation, which rewrites
+    the list in place, drops it.
+    """
+    matcher = matcher or get_matcher()
+    memory  = npc["memory"]
+    scan    = npc.get("quest_scan")
+    if not scan or scan.get("key") != matcher.key or scan.get("at", 0) > len(memory):
+        scan = {"key": matcher.key, "at": 0, "hits": []}
+    end = len(memory)
+    if end > scan["at"]:
+        hits = set(scan["hits"]) | set(matcher.scan(memory[scan["at"]:end], npc.get("npc_id")))
+        _scanned.inc(end - scan["at"])
+        scan = {"key": matcher.key, "at": end, "hits": sorted(hits, key=matcher.registry.rank.__getitem__)}
+    npc["quest_scan"] = scan
+    return scan["hits"]
+
+
+def triggered_quest(state: Dict[str, Any], exclude: Iterable[str] = (),
+                    npc_ids: Optional[Iterable[str]] = None) -> Optional[str]:
+    """
+    The first quest (in quests.json order) not in `exclude` that a memory of
+    any NPC (or of the NPCs in `npc_ids`) triggers, scanning only memories
+    added since the NPC's last scan.
+    """
+    matcher = get_matcher()
+    exclude = set(exclude)
+    npcs = state["npc_states"]
+    hits = set()
+    for npc in (npcs.values() if npc_ids is None else (npcs[n] for n in npc_ids if n in npcs)):
+        hits.update(scan_npc(npc, matcher))
+    return min(hits - exclude, key=matcher.registry.rank.__getitem__, default=None)
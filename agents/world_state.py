@@ -2,6 +2,10 @@
 
 import random
 
+from utils.log import get_logger
+
+log = get_logger("world_state")
+
 class WorldState:
     def __init__(self, simulation_time: int = 0):
         # Base time counter (in “ticks”; you can treat each tick as one “turn”)
@@ -82,9 +86,8 @@ def world_state_node(input_data: dict) -> dict:
     # Advance one tick
     world.tick()
 
-    # Print for debugging
-    print(f"World State ticked → time={world.simulation_time}, "
-          f"time_of_day={world.time_of_day}, location={world.location}, weather={world.weather}")
+    log.info("world_ticked", time=world.simulation_time, time_of_day=world.time_of_day,
+             location=world.location, weather=world.weather)
 
     # The node should return all derived fields so they merge into the shared state
     return {
@@ -1,17 +1,32 @@
 # api.py
 
-from fastapi import FastAPI
+import time
+_IMPORT_T0 = time.perf_counter()
+
+import asyncio
+from contextlib import nullcontext
+
+from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import FileResponse, RedirectResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 import os
 
-import faiss
-from persistence import load_state, save_state
-from workflows.npc_simulation_graph import build_graph, SimulationState
-from agents.player_simulator import player_simulator_node
-from main import init_fresh_state, SAVE_DIR  # <-- pull in your init_fresh_state & SAVE_DIR
+from utils.warmup import Warmup
+from utils import metrics
+from utils.tracing import start_trace
+from lod import observe_turn, tier_of
+
+# "background" (default): start listening immediately and warm up on a thread;
+#                         /tick etc. wait for warm-up, /healthz reports progress.
+# "eager":                warm up inside the startup hook before serving.
+STARTUP_MODE    = os.environ.get("NPC_STARTUP_MODE", "background")
+WARMUP_TIMEOUT  = float(os.environ.get("NPC_WARMUP_TIMEOUT", "120"))
+# "journal" (default): each tick appends its delta to savegame/journal.log,
+#                      compacted into the snapshot in the background.
+# "snapshot":          each tick rewrites the full save (the old behaviour).
+SAVE_MODE       = os.environ.get("NPC_SAVE_MODE", "journal")
 
 app = FastAPI(
     title="NPC Simulation API",
@@ -20,21 +35,28 @@ app = FastAPI(
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Build your graph once
-graph = build_graph()
+# Built during warm-up (langgraph, faiss, the agents and the save are all
+# imported/loaded there rather than at module import)
+graph = None
+SAVE_DIR: Optional[str] = None
 
-# In-memory state
-sim_state: SimulationState
+# In-memory worlds, one per session_id (see sessions.py)
+sessions = None
+# /tick_stream ticks still finishing after their reply was sent
+_background = set()
+
+warmup = Warmup()
 
 # Keys to include in the JSON payload
 _TOP_FIELDS = [
+    "session_id",
     "player_location","player_inventory","player_stats",
     "world_chunks","active_quests","completed_quests","quest_history",
     "last_event","event_params","response","simulation_time",
-    "time_of_day","weather","pending_quest"
+    "time_of_day","weather","pending_quest","state_version"
 ]
 _NPC_FIELDS = [
-    "npc_id","personality","emotion_state","inventory",
+    "npc_id","personality","emotion_state","inventory","location",
     "memory","faiss_id_to_memory_text","next_faiss_id"
 ]
 
@@ -48,62 +70,238 @@ def _serialize_state(state: Dict[str, Any]) -> Dict[str, Any]:
         out["npc_states"][npc_id] = sub
     return out
 
+def _warm_graph():
+    global graph
+    from workflows.npc_simulation_graph import build_graph
+    graph = build_graph()
+
+def _warm_state():
+    global sessions, SAVE_DIR
+    from main import init_fresh_state, SAVE_DIR as _save_dir
+    from persistence import load_state, save_state, journal_state
+    from sessions import SessionManager, set_session_manager, DEFAULT_SESSION
+    SAVE_DIR = _save_dir
+    sessions = SessionManager(SAVE_DIR, init_fresh_state, load_state, save_state,
+                              journal_state if SAVE_MODE == "journal" else None)
+    set_session_manager(sessions)
+    # Pre-load the default world so the first request doesn't pay for it
+    sessions.preload(DEFAULT_SESSION)
+
+def _warm_llm():
+    from utils.llm import get_client
+    get_client()
+
+def _warm_embeddings():
+    from utils.embedding_service import get_embedding_service
+    get_embedding_service().available
+
+_WARMUP_STEPS = [
+    ("graph",           _warm_graph),
+    ("state",           _warm_state),
+    ("llm_client",      _warm_llm),
+    ("embedding_model", _warm_embeddings),
+]
+
 @app.on_event("startup")
 def _startup():
-    global sim_state
-    # Load if we have a save on disk, otherwise brand-new
-    save_json = os.path.join(SAVE_DIR, "state.json")
-    if os.path.exists(save_json):
-        sim_state = load_state(SAVE_DIR)
-        print(f"🗄  Loaded saved state from {SAVE_DIR}")
+    if STARTUP_MODE == "eager":
+        warmup.run(_WARMUP_STEPS)
     else:
-        sim_state = init_fresh_state()
-        print("✨ Starting fresh simulation state")
+        warmup.start_background(_WARMUP_STEPS)
+
+@app.on_event("startup")
+async def _start_autonomy():
+    """ NPC_AUTONOMY_RATE > 0: once warm, run autonomous NPC turns in the background (scheduler.py). """
+    from scheduler import AUTONOMY_RATE, AutonomyScheduler, set_scheduler
+    if AUTONOMY_RATE <= 0:
+        return
+
+    async def start():
+        await _arequire_ready()
+        scheduler = AutonomyScheduler(sessions, graph)
+        set_scheduler(scheduler)
+        scheduler.start()
+    app.state.autonomy_start = asyncio.create_task(start())
+
+@app.on_event("shutdown")
+async def _shutdown():
+    # let streamed ticks finish their graph run and save
+    if _background:
+        await asyncio.gather(*_background, return_exceptions=True)
+    from scheduler import get_scheduler
+    if get_scheduler() is not None:
+        await get_scheduler().stop()
+    # apply any deferred memories before the process goes away
+    if warmup.ready:
+        await sessions.save_all(flush=True)
+
+def _require_ready():
+    """ Block a request until warm-up is done (or fail fast if it failed). """
+    if not warmup.wait(timeout=WARMUP_TIMEOUT):
+        raise HTTPException(status_code=503, detail=warmup.report())
+
+async def _arequire_ready():
+    if not warmup.ready:
+        await asyncio.to_thread(_require_ready)
+
+def _check_session_id(session_id: str) -> str:
+    from sessions import valid_session_id
+    if not valid_session_id(session_id):
+        raise HTTPException(status_code=400, detail="session_id must be 1-64 chars of [A-Za-z0-9_-]")
+    return session_id
 
 class TickRequest(BaseModel):
     event: str
     params: Dict[str, Any] = {}
+    session_id: str = "default"
+    debug: bool = False     # attach this tick's trace (node / LLM / FAISS / save timings)
+
+class BatchEvent(BaseModel):
+    event: str
+    params: Dict[str, Any] = {}
+
+class TickBatchRequest(BaseModel):
+    events: List[BatchEvent]
+    session_id: str = "default"
+    include_state: bool = False
 
 @app.get("/")
 def root():
     return FileResponse("static/index.html")
 
+@app.get("/healthz")
+def healthz():
+    """ Liveness + warm-up progress: status is "warming", "ready" or "failed". """
+    from utils.embedding_service import get_embedding_service
+    from utils.llm_cache import get_llm_cache
+    return {**warmup.report(), "embeddings": get_embedding_service().stats(),
+            "llm_cache": get_llm_cache().stats()}
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """ Prometheus text exposition of the in-process metrics registry. """
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/load")
-def load_endpoint():
-    """ Return the current sim state (JSON-safe). """
-    return {"state": _serialize_state(sim_state)}
+async def load_endpoint(session_id: str = "default"):
+    """ Return the session's current sim state (JSON-safe). """
+    await _arequire_ready()
+    async with sessions.open(_check_session_id(session_id)) as sess:
+        return {"state": _serialize_state(sess.state)}
 
 @app.post("/tick")
-def tick(req: TickRequest):
-    """ Advance one tick with the given event/params. """
-    global sim_state
-    sim_state["last_event"]   = req.event
-    sim_state["event_params"] = req.params
-    sim_state = graph.invoke(sim_state)
-    save_state(sim_state, SAVE_DIR)
-    return {"state": _serialize_state(sim_state)}
+async def tick(req: TickRequest):
+    """
+    Advance one tick of the request's session with the given event/params.
+    Runs the graph with ainvoke so LLM round trips don't hold a threadpool
+    worker; the (blocking) save is pushed to a thread. Ticks for the same
+    session are serialized by its lock; other sessions tick in parallel.
+    With "debug": true the response also carries the tick's trace.
+    """
+    await _arequire_ready()
+    async with sessions.open(_check_session_id(req.session_id)) as sess:
+        with (start_trace() if req.debug else nullcontext()) as trace:
+            sess.state["last_event"]   = req.event
+            sess.state["event_params"] = req.params
+            tier = tier_of(sess.state, req.params.get("npc_id"))
+            t0 = time.perf_counter()
+            sess.state = await graph.ainvoke(sess.state)
+            observe_turn(tier, time.perf_counter() - t0)
+            sessions.bump_version(sess)
+            # In NPC_MEMORY_MODE=deferred the summary for this tick may still be in
+            # flight; it is picked up by the next save rather than waited for here.
+            await asyncio.to_thread(sessions.save, sess)
+        out = {"state": _serialize_state(sess.state)}
+        if trace is not None:
+            out["trace"] = trace.to_json()
+        return out
+
+@app.post("/tick_stream")
+async def tick_stream(req: TickRequest):
+    """
+    /tick with the NPC's reply streamed as server-sent events (see
+    streaming.ReplyStream): "token" events as the LLM writes the reply, then
+    "emotion", "tool_action" and "end" (with ttft_ms). The response ends as
+    soon as the reply is complete; the rest of the graph and the save finish
+    in the background, before the session's next tick.
+    """
+    from streaming import ReplyStream, run_streamed_tick
+    await _arequire_ready()
+    session_id = _check_session_id(req.session_id)
+    stream = ReplyStream()
+    task = asyncio.create_task(run_streamed_tick(graph, sessions, session_id, req.event, req.params, stream))
+    _background.add(task)                       # keep a reference until it is done
+    task.add_done_callback(_background.discard)
+    return StreamingResponse(stream.events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/tick_batch")
+async def tick_batch(req: TickBatchRequest):
+    """
+    Advance a session by many events in one request (see batching.run_batch):
+    different NPCs run concurrently, each NPC's events stay in order, and the
+    batch's embeddings are coalesced. Saves once and bumps the version once.
+    """
+    from batching import run_batch
+    await _arequire_ready()
+    async with sessions.open(_check_session_id(req.session_id)) as sess:
+        events  = [{"event": e.event, "params": e.params} for e in req.events]
+        results = await run_batch(graph, sess.state, events)
+        version = sessions.bump_version(sess)
+        await asyncio.to_thread(sessions.save, sess)
+        out = {"version": version, "results": results}
+        if req.include_state:
+            out["state"] = _serialize_state(sess.state)
+        return out
 
 @app.post("/save")
-def save_endpoint():
-    """ Force a save now. """
-    save_state(sim_state, SAVE_DIR)
+async def save_endpoint(flush: bool = True, session_id: str = "default"):
+    """
+    Force a full snapshot now (by default after draining deferred memory
+    jobs); the session's journal is folded in and cleared.
+    """
+    await _arequire_ready()
+    async with sessions.open(_check_session_id(session_id)) as sess:
+        await asyncio.to_thread(sessions.save, sess, flush, True)
     return {"status": "ok"}
 
+@app.get("/who_knows")
+async def who_knows_endpoint(q: str, k: int = 10, since: Optional[int] = None,
+                             session_id: str = "default"):
+    """
+    Cross-NPC memory search: which NPCs remember something like `q`
+    (optionally only memories from simulation time `since` on).
+    """
+    await _arequire_ready()
+    from memory.world_index import who_knows
+    async with sessions.open(_check_session_id(session_id)) as sess:
+        hits = await asyncio.to_thread(who_knows, sess.state, q, k, since)
+    return {"query": q, "results": hits}
+
 @app.post("/reset")
-def reset_endpoint():
+async def reset_endpoint(session_id: str = "default"):
     """
-    Wipe all state and start a brand-new simulation.
-    Deletes the savegame directory contents and re-initialises from scratch.
+    Wipe all state and start a brand-new simulation for one session.
+    Deletes that session's save files and re-initialises from scratch.
     Useful for Unreal integration testing or starting a fresh playthrough.
     """
-    global sim_state
-    # Remove persisted files so the next load sees a clean slate
-    for fname in os.listdir(SAVE_DIR):
-        fpath = os.path.join(SAVE_DIR, fname)
-        try:
-            os.remove(fpath)
-        except OSError:
-            pass
-    sim_state = init_fresh_state()
-    print("🔄 Simulation reset to fresh state")
-    return {"status": "reset", "state": _serialize_state(sim_state)}
+    await _arequire_ready()
+    from main import init_fresh_state
+    from agents.memory_queue import get_memory_queue
+    async with sessions.open(_check_session_id(session_id)) as sess:
+        # Let in-flight memory jobs land on the old world before dropping it
+        await asyncio.to_thread(get_memory_queue().flush, None, sess.memory_keys())
+        # Remove persisted files so the next load sees a clean slate
+        # (sub-directories, e.g. other sessions under the default save, are kept)
+        if os.path.isdir(sess.save_dir):
+            for fname in os.listdir(sess.save_dir):
+                fpath = os.path.join(sess.save_dir, fname)
+                try:
+                    os.remove(fpath)
+                except OSError:
+                    pass
+        sessions.replace_state(sess, init_fresh_state())
+        print(f"🔄 Session '{sess.session_id}' reset to fresh state")
+        return {"status": "reset", "state": _serialize_state(sess.state)}
+
+warmup.phases["import_api"] = round(time.perf_counter() - _IMPORT_T0, 4)
@@ -0,0 +1,170 @@
+# batching.py
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from lod import observe_turn, tier_of
+from utils import metrics
+from utils.log import get_logger
+
+log = get_logger("tick_batch")
+
+# Per-event routing fields: consumed by the graph, never merged back
+_TRANSIENT = {
+    "last_event", "event_params", "tool_action", "memory_update", "memory_owner",
+    "session_id", "state_version", "npc_states",
+}
+
+# Ints that count up per event: each event's increment is summed. Other ints
+# (narrative_cooldown, ...) are levels an event sets, so the last event wins.
+_COUNTERS = {"simulation_time"}
+
+_batch_events = metrics.histogram("npc_tick_batch_events", "Events per /tick_batch call",
+                                  buckets=(1, 2, 5, 10, 25, 50, 100, 250))
+
+
+def _lane_key(event: Dict[str, Any]) -> Optional[str]:
+    """ Events are serialized per NPC; events without an NPC share one lane. """
+    return (event.get("params") or {}).get("npc_id")
+
+
+def _snapshot(state: Dict[str, Any]) -> Dict[str, Any]:
+    """ The object each top-level field held before an event, plus list contents. """
+    return {k: (v, list(v) if isinstance(v, list) else None)
+            for k, v in state.items() if k not in _TRANSIENT}
+
+
+def _merge(main: Dict[str, Any], base: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """
+    Fold one event's top-level changes into the session state.
+      - fields mutated in place (player_stats, ...) are already shared
+      - lists: apply the event's additions / removals
+      - counters (simulation_time): apply the event's delta
+      - anything else, other ints included: last event (in request order) wins
+    """
+    for k, new in result.items():
+        if k in _TRANSIENT:
+            continue
+        old, old_items = base.get(k, (None, None))
+        cur = main.get(k)
+        if new is old or (isinstance(new, (list, dict)) and new is cur):
+            continue
+        if isinstance(new, list) and old_items is not None and isinstance(cur, list):
+            removed = [x for x in old_items if x not in new]
+            added   = [x for x in new if x not in old_items]
+            merged  = [x for x in cur if x not in removed]
+            merged += [x for x in added if x not in merged]
+            main[k] = merged
+        elif (k in _COUNTERS and isinstance(new, int)
+              and isinstance(old, int) and isinstance(cur, int)):
+            main[k] = cur + (new - old)
+        elif new != old:
+            main[k] = new
+
+
+async def _run_lane(graph, state, lane, results, outcomes, pending):
+    """
+    Run one NPC's events in order against a shallow view of the session.
+    Memories an event stores are indexed before the lane's next event, so
+    its recall sees them; the last event's are left in `pending`.
+    """
+    from agents.memory_synthesizer import collect_index_writes, apply_index_writes
+    with collect_index_writes() as written:
+        view = dict(state)
+        for idx, event in lane:
+            if written:
+                await asyncio.to_thread(apply_index_writes, list(written))
+                written.clear()
+            view = await _run_event(graph, view, idx, event, results, outcomes)
+    pending.extend(written)
+
+
+async def _run_event(graph, view, idx, event, results, outcomes):
+    """ One event of a lane; returns the view the lane's next event starts from. """
+    params = event.get("params") or {}
+    npc_id = params.get("npc_id")
+    base   = _snapshot(view)
+    view["last_event"]   = event["event"]
+    view["event_params"] = params
+    tier = tier_of(view, npc_id)
+    t0 = time.perf_counter()
+    try:
+        view = await graph.ainvoke(view)
+    except Exception as e:
+        log.error("tick_batch_event_failed", exc_info=e, session_id=view.get("session_id"),
+                  npc_id=npc_id, index=idx, last_event=event["event"])
+        results[idx] = {"index": idx, "event": event["event"], "npc_id": npc_id, "error": str(e)}
+        return view
+    observe_turn(tier, time.perf_counter() - t0)
+    npc = view["npc_states"].get(npc_id) or {}
+    results[idx] = {
+        "index":         idx,
+        "event":         event["event"],
+        "npc_id":        npc_id,
+        "response":      view.get("response"),
+        "emotion_state": npc.get("emotion_state"),
+    }
+    outcomes[idx] = (base, view)
+    return view
+
+
+async def run_batch(graph, state: Dict[str, Any], events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Advance `state` by a list of events ({"event", "params"}) in one go.
+
+    1) Every player text in the batch is embedded up front in one encode call,
+       so the recall in character_agent is served from the embedding cache.
+    2) Events are split into lanes by npc_id; lanes run concurrently, events
+       within a lane run in request order. Each lane works on a shallow view
+       of the state, so NPC dicts are shared but top-level fields are not.
+    3) Memory index writes are collected and embedded in as few encode calls
+       as possible (a summary only exists after its LLM reply, so it cannot
+       join the first call): a lane indexes its earlier events' memories
+       before its next event, so that event's recall sees them, and the
+       memories of every lane's last event share one final encode call.
+    4) Top-level changes are merged back into `state` in request order.
+
+    Returns one result dict per event, in request order.
+    """
+    from agents.memory_synthesizer import apply_index_writes
+    from agents.world_state import WorldState
+    from utils.embedding_service import get_embedding_service
+
+    _batch_events.observe(len(events))
+
+    # 1) Coalesced query embeddings
+    texts = [(e.get("params") or {}).get("text") for e in events]
+    texts = [t for t in texts if isinstance(t, str) and t]
+    embedder = get_embedding_service()
+    if texts and embedder.available:
+        await asyncio.to_thread(embedder.encode_many, texts)
+
+    # 2) One task per NPC lane
+    lanes: Dict[Optional[str], list] = {}
+    for idx, event in enumerate(events):
+        lanes.setdefault(_lane_key(event), []).append((idx, event))
+
+    results:  List[Optional[Dict[str, Any]]] = [None] * len(events)
+    outcomes: Dict[int, tuple] = {}
+    pending:  list = []
+    sim_time = state.get("simulation_time", 0)
+    await asyncio.gather(*(_run_lane(graph, state, lane, results, outcomes, pending)
+                           for lane in lanes.values()))
+
+    # 3) Coalesced memory embeddings
+    await asyncio.to_thread(apply_index_writes, pending)
+
+    # 4) Merge in request order
+    for idx in sorted(outcomes):
+        _merge(state, *outcomes[idx])
+    if state.get("simulation_time", 0) != sim_time:
+        world = WorldState(simulation_time=state["simulation_time"])
+        state["time_of_day"] = world.time_of_day
+        state["weather"]     = world.weather
+    state["last_event"]    = None
+    state["event_params"]  = {}
+    state["tool_action"]   = None
+    state["memory_update"] = None
+    state["memory_owner"]  = None
+    return results
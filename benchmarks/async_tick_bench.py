@@ -0,0 +1,94 @@
+# benchmarks/async_tick_bench.py
+"""
+Concurrent ticks per worker: sync graph.invoke on a threadpool vs graph.ainvoke
+on one event loop, both talking to a local stub LLM server.
+
+    python -m benchmarks.async_tick_bench --latency 0.2 --concurrency 10 40 100 200
+
+The sync side is capped at --threads workers (Starlette/AnyIO's default
+threadpool is 40), which is what a sync `def /tick` gets per worker process.
+Each in-flight tick runs against its own fresh world so nothing is shared.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stubs import HashEmbedder, StubLLMServer
+
+
+def _tick_state(init_fresh_state, i):
+    state = init_fresh_state()
+    state["last_event"]   = "player_chat"
+    state["event_params"] = {"npc_id": "malrik_merchant", "text": f"Hello #{i}, how's business?"}
+    return state
+
+
+def run_sync(graph, init_fresh_state, ticks, concurrency, threads):
+    states = [_tick_state(init_fresh_state, i) for i in range(ticks)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(concurrency, threads)) as pool:
+        list(pool.map(graph.invoke, states))
+    return ticks / (time.perf_counter() - t0)
+
+
+def run_async(graph, init_fresh_state, ticks, concurrency):
+    states = [_tick_state(init_fresh_state, i) for i in range(ticks)]
+
+    async def main():
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(state):
+            async with sem:
+                await graph.ainvoke(state)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(s) for s in states))
+        return ticks / (time.perf_counter() - t0)
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async /tick throughput against a stub LLM.")
+    parser.add_argument("--latency",     type=float, default=0.2, help="seconds per stub LLM call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 40, 100, 200])
+    parser.add_argument("--ticks",       type=int, default=400, help="ticks per measurement")
+    parser.add_argument("--threads",     type=int, default=40, help="sync threadpool size")
+    parser.add_argument("--json",        help="write results to this file")
+    args = parser.parse_args()
+
+    with StubLLMServer(latency=args.latency) as base_url:
+        os.environ["GROQ_BASE_URL"] = base_url
+        os.environ.setdefault("GROQ_API_KEY", "stub")
+
+        from utils.embedding_service import EmbeddingService, set_embedding_service
+        set_embedding_service(EmbeddingService(model=HashEmbedder()))
+        from main import init_fresh_state
+        from workflows.npc_simulation_graph import build_graph
+        graph = build_graph()
+
+        results = []
+        for c in args.concurrency:
+            with contextlib.redirect_stdout(io.StringIO()):
+                sync_tps  = run_sync(graph, init_fresh_state, args.ticks, c, args.threads)
+                async_tps = run_async(graph, init_fresh_state, args.ticks, c)
+            row = {"concurrency": c, "sync_ticks_per_s": round(sync_tps, 1),
+                   "async_ticks_per_s": round(async_tps, 1),
+                   "speedup": round(async_tps / sync_tps, 2)}
+            results.append(row)
+            print(f"concurrency={c:>4}  sync={row['sync_ticks_per_s']:>7} t/s  "
+                  f"async={row['async_ticks_per_s']:>7} t/s  x{row['speedup']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency": args.latency, "ticks": args.ticks, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# benchmarks/lod_bench.py
+"""
+Cost of autonomous NPC turns (scheduler.py) with and without level-of-detail
+tiers (lod.py), offline: stub Groq clients (--latency seconds per call), the
+HashEmbedder, --npcs NPCs spread over a row of --chunks world chunks and the
+player in the first chunk.
+
+  flat  every NPC is "near": every turn takes the full LLM path
+  lod   NPC_LOD_NEAR_HOPS / NPC_LOD_MID_HOPS tiers: LLM only near the
+        player, rules in the middle distance, batched updates far away
+
+For each it reports turns/s, LLM calls, and per tier the number of turns and
+their mean cost (npc_lod_turn_seconds; far turns are batched, so theirs is
+the batch cost divided by its size).
+
+    python -m benchmarks.lod_bench --npcs 300 3000 --chunks 30 --turns 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
+from benchmarks.stubs import AsyncStubGroq, HashEmbedder, StubGroq
+
+PERSONALITIES = ["sharp-eyed merchant", "steadfast town guard", "traveling bard", "gossiping innkeeper"]
+
+
+def _world(n, chunks):
+    import faiss
+    from utils.embedding_service import EMBEDDING_DIMENSION
+
+    names = [f"chunk_{c}" for c in range(chunks)]
+    npcs = {f"npc_{i}": {"npc_id": f"npc_{i}", "personality": PERSONALITIES[i % len(PERSONALITIES)],
+                         "emotion_state": "neutral", "inventory": ["lute", "scroll"], "memory": [],
+                         "location": names[i % chunks],
+                         "faiss_index": faiss.IndexIDMap(faiss.IndexFlatIP(EMBEDDING_DIMENSION)),
+                         "faiss_id_to_memory_text": {}, "next_faiss_id": 0}
+            for i in range(n)}
+    return {"player_location": names[0], "player_inventory": [], "player_stats": {"gold": 50, "gate_open": False},
+            "world_chunks": {name: {"neighbors": [names[j] for j in (c - 1, c + 1) if 0 <= j < chunks]}
+                             for c, name in enumerate(names)},
+            "npc_states": npcs, "active_quests": [], "completed_quests": [], "quest_history": [],
+            "last_event": None, "event_params": {}, "tool_action": None, "response": None,
+            "simulation_time": 0, "time_of_day": "morning", "weather": "clear",
+            "memory_update": None, "memory_owner": None, "pending_quest": None}
+
+
+async def bench(graph, n, chunks, turns, flat, seed, sync_client, async_client):
+    import lod
+    from scheduler import AutonomyScheduler
+    from sessions import SessionManager
+
+    before = {t: lod._turn_seconds.snapshot(tier=t) for t in lod.TIERS}
+    calls0 = sync_client.chat.completions.calls + async_client.chat.completions.calls
+    hops = dict(NEAR_HOPS=10 ** 9, MID_HOPS=10 ** 9) if flat else dict(NEAR_HOPS=lod.NEAR_HOPS, MID_HOPS=lod.MID_HOPS)
+    with tempfile.TemporaryDirectory() as tmp, mock.patch.multiple(lod, **hops):
+        sessions = SessionManager(tmp, lambda: _world(n, chunks), None, lambda state, path: None)
+        sessions.preload()
+        scheduler = AutonomyScheduler(sessions, graph, rate=1, workers=1, queue_size=1, seed=seed)
+        t0 = time.perf_counter()
+        for _ in range(turns):
+            scheduler.schedule_once()
+            await scheduler.run_turn(*scheduler.queue.get_nowait())
+        await scheduler.stop()      # applies the last partial far batch
+        elapsed = time.perf_counter() - t0
+
+    row = {"npcs": n, "mode": "flat" if flat else "lod", "turns_per_s": round(turns / elapsed, 1),
+           "llm_calls": sync_client.chat.completions.calls + async_client.chat.completions.calls - calls0, "tiers": {}}
+    for t in lod.TIERS:
+        (s1, c1), (s0, c0) = lod._turn_seconds.snapshot(tier=t), before[t]
+        if c1 > c0:
+            row["tiers"][t] = {"turns": c1 - c0, "mean_ms": round(1000 * (s1 - s0) / (c1 - c0), 3)}
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Autonomous NPC turn cost with and without LOD tiers.")
+    parser.add_argument("--npcs",    type=int, nargs="+", default=[300, 3000])
+    parser.add_argument("--chunks",  type=int, default=30)
+    parser.add_argument("--turns",   type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per stub LLM call")
+    parser.add_argument("--seed",    type=int, default=0)
+    parser.add_argument("--json",    help="write results to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("NPC_LOG_LEVEL", "WARNING")
+    from utils.embedding_service import EmbeddingService, set_embedding_service
+    from utils.llm import set_clients
+    from utils.llm_cache import LLMCache, set_llm_cache
+    from workflows.npc_simulation_graph import build_graph
+    set_embedding_service(EmbeddingService(model=HashEmbedder()))
+    sync_client, async_client = StubGroq(args.latency), AsyncStubGroq(args.latency)
+    set_clients(sync_client, async_client)
+    set_llm_cache(LLMCache(size=0, path=""))      # every LLM request reaches the stub
+    graph = build_graph()
+
+    results = []
+    for n in args.npcs:
+        for flat in (True, False):
+            row = asyncio.run(bench(graph, n, args.chunks, args.turns, flat, args.seed, sync_client, async_client))
+            results.append(row)
+            tiers = "  ".join(f"{t}: {v['turns']} × {v['mean_ms']} ms" for t, v in row["tiers"].items())
+            print(f"npcs={n:>6}  {row['mode']:<4}  {row['turns_per_s']:>8} turns/s  "
+                  f"llm_calls={row['llm_calls']:>6}  {tiers}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
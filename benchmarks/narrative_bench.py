@@ -0,0 +1,96 @@
+# benchmarks/narrative_bench.py
+"""
+narrative_director rule selection per tick with 10 .. 1000 synthetic rules
+over four state fields (each rule reads one or two of them; the last rule is
+the always-true fallback, so the linear walk reads every rule):
+
+  legacy     the old loop: call every "when" in order until one matches
+  unchanged  RuleEngine on a tick where no field changed (memo hits)
+  changed    RuleEngine on a tick where one field took a new value
+
+    python -m benchmarks.narrative_bench --rules 10 100 1000
+"""
+
+import argparse
+import json
+import random
+import time
+
+from narrative_engine import RuleEngine
+
+FIELDS = {
+    "time_of_day":     ["Morning", "Afternoon", "Evening", "Night"],
+    "player_location": ["Town Square", "Market Plaza", "Harbor", "Chapel", "Forest Road"],
+    "weather":         ["clear", "rain", "fog", "storm"],
+    "current_event":   [None, "harvest_festival", "market_day", "funeral"],
+}
+
+
+def _rules(n, rng):
+    rules = []
+    for i in range(n - 1):
+        depends = tuple(rng.sample(sorted(FIELDS), rng.choice((1, 2))))
+        # a combination no tick below produces, so the rule never matches
+        want = {f: f"never-{i}" for f in depends}
+        rules.append({"when": lambda s, want=want: all(s.get(f) == v for f, v in want.items()),
+                      "depends": depends, "beat": f"beat_{i}", "guidance": "", "quest_id": None})
+    rules.append({"when": lambda s: True, "depends": (), "beat": "nothing_special", "guidance": "", "quest_id": None})
+    return rules
+
+
+def _legacy(rules, state):
+    for rule in rules:
+        try:
+            if rule["when"](state):
+                return rule
+        except Exception:
+            continue
+    return None
+
+
+def _ms(fn, states):
+    t0 = time.perf_counter()
+    for s in states:
+        fn(s)
+    return round(1000 * (time.perf_counter() - t0) / len(states), 4)
+
+
+def bench(n, ticks, rng):
+    rules = _rules(n, rng)
+    engine = RuleEngine(rules)
+    state = {f: values[0] for f, values in FIELDS.items()}
+    engine.first_match(state)
+    same = [dict(state) for _ in range(ticks)]
+    # every tick a different field takes a value it hasn't had yet (memo misses)
+    changed = []
+    for t in range(ticks):
+        f = sorted(FIELDS)[t % len(FIELDS)]
+        changed.append({**state, f: f"{f}-{t}"})
+    return {"rules": n,
+            "legacy_ms":    _ms(lambda s: _legacy(rules, s), same),
+            "unchanged_ms": _ms(engine.first_match, same),
+            "changed_ms":   _ms(engine.first_match, changed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Linear narrative rule walk vs the memoized rule engine.")
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--ticks", type=int, default=500)
+    parser.add_argument("--json",  help="write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = []
+    for n in args.rules:
+        row = bench(n, args.ticks, rng)
+        results.append(row)
+        print(f"rules={n:>5}  legacy={row['legacy_ms']:8.4f} ms/tick  "
+              f"unchanged={row['unchanged_ms']:8.4f} ms/tick  changed={row['changed_ms']:8.4f} ms/tick")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
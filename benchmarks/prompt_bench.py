@@ -0,0 +1,112 @@
+# benchmarks/prompt_bench.py
+"""
+character_agent system prompt size and build time with 3 .. 1000 NPCs spread
+over a row of world chunks (each chunk's neighbours are the chunks either
+side of it), three recalled memories per call:
+
+  legacy   the old inline prompt: every other NPC listed as a gossip target
+  builder  agents.prompt_builder: cached prefix, only the NPCs within reach,
+           capped at --budget estimated tokens
+
+    python -m benchmarks.prompt_bench --npcs 3 100 1000 --chunks 20
+"""
+
+import argparse
+import json
+import random
+import time
+
+from agents.prompt_builder import PromptBuilder, estimate_tokens
+
+PERSONALITIES = ["sharp-eyed merchant", "steadfast town guard", "traveling bard",
+                 "gossiping innkeeper", "reclusive herbalist", "retired sailor"]
+MEMORIES = ["npc_0 remembers that the player asked about the missing spice shipment.",
+            "npc_0 remembers that a stranger was seen near the north gate after dark.",
+            "npc_0 remembers that the player bought a lute string for two silver coins."]
+
+
+def _world(n, chunks, rng):
+    names = [f"chunk_{c}" for c in range(chunks)]
+    world = {name: {"neighbors": [names[j] for j in (c - 1, c + 1) if 0 <= j < chunks]}
+             for c, name in enumerate(names)}
+    npcs = {f"npc_{i}": {"npc_id": f"npc_{i}", "personality": rng.choice(PERSONALITIES),
+                         "emotion_state": "neutral", "inventory": ["lute", "scroll"], "memory": [],
+                         "location": names[i % chunks]}
+            for i in range(n)}
+    return {"npc_states": npcs, "world_chunks": world, "player_location": names[0]}
+
+
+def _legacy(state, npc_id, memories):
+    npc = state["npc_states"][npc_id]
+    personality  = npc.get("personality", "an NPC")
+    emotion      = npc.get("emotion_state", "neutral")
+    inventory    = npc.get("inventory", [])
+    inv_desc     = ", ".join(inventory) if inventory else "nothing"
+    other_npc_entries = []
+    for other_id, other_sub in state["npc_states"].items():
+        if other_id == npc_id:
+            continue
+        other_npc_entries.append(f"{other_id} ({other_sub.get('personality','')})")
+    other_npcs_str = ", ".join(other_npc_entries) if other_npc_entries else "none"
+    relevant_memories_str = "Past memories:\n" + "\n".join(f" • {t}" for t in memories)
+    return (
+        f"You are '{npc_id}', {personality}. You feel '{emotion}'.\n"
+        f"Inventory: {inv_desc}.\n"
+        f"{relevant_memories_str}\n\n"
+        f"Other NPCs you could share gossip with: {other_npcs_str}.\n\n"
+        "When you reply, return ONLY valid JSON with these keys:\n"
+        "{\n"
+        '  "response": string,\n'
+        '  "emotion_state": one of [neutral,happy,sad,angry,curious],\n'
+        '  "tool_action": { "type": string, "params": {...} } or null\n'
+        "}\n\n"
+        "# GOSSIP INSTRUCTIONS\n"
+        "If you want to share private gossip with another NPC in the world, "
+        "set tool_action to:\n"
+        '  { "type": "gossip", "params": { '
+        '"target_npc": "<that_npc_id>", "message": "<your private message>" } }\n'
+        "Otherwise set tool_action to null.\n"
+    )
+
+
+def _measure(fn, speakers):
+    t0 = time.perf_counter()
+    tokens = [estimate_tokens(fn(npc_id)) for npc_id in speakers]
+    us = 1e6 * (time.perf_counter() - t0) / len(speakers)
+    return round(sum(tokens) / len(tokens), 1), round(us, 2)
+
+
+def bench(n, chunks, budget, calls, rng):
+    state = _world(n, chunks, rng)
+    speakers = [f"npc_{rng.randrange(n)}" for _ in range(calls)]
+    builder = PromptBuilder(budget=budget)
+    legacy_tokens, legacy_us = _measure(lambda npc_id: _legacy(state, npc_id, MEMORIES), speakers)
+    new_tokens, new_us = _measure(lambda npc_id: builder.system_prompt(state, npc_id, MEMORIES, True), speakers)
+    return {"npcs": n, "legacy_tokens": legacy_tokens, "legacy_us": legacy_us,
+            "builder_tokens": new_tokens, "builder_us": new_us}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens per character_agent call: inline prompt vs PromptBuilder.")
+    parser.add_argument("--npcs",   type=int, nargs="+", default=[3, 100, 1000])
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=600, help="PromptBuilder token budget")
+    parser.add_argument("--calls",  type=int, default=500)
+    parser.add_argument("--json",   help="write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = []
+    for n in args.npcs:
+        row = bench(n, args.chunks, args.budget, args.calls, rng)
+        results.append(row)
+        print(f"npcs={n:>5}  legacy={row['legacy_tokens']:>8} tokens {row['legacy_us']:>9} us/call  "
+              f"builder={row['builder_tokens']:>6} tokens {row['builder_us']:>7} us/call")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/quest_trigger_bench.py
+"""
+quest_manager_node cost per tick with N stored memories spread over a few
+NPCs, none of which mention a quest yet (the common case: the old node then
+reads everything):
+
+  legacy  the old node: recompile every trigger, rescan every memory
+  cold    the trigger engine's first scan (no watermark yet, e.g. old save)
+  tick    the trigger engine on a tick that added one memory per NPC
+
+--quests adds that many generated quests (two word triggers each, one of
+them a regex) to quests.json, to see what a large content pack costs;
+legacy is only run with the shipped quests.
+
+    python -m benchmarks.quest_trigger_bench --memories 1000 10000 100000 --quests 0 1000 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import time
+
+from agents import quest_registry
+from agents.quest_manager import quest_manager_node
+from agents.quest_registry import get_quests
+
+WORDS = ("market", "bread", "guard", "song", "rain", "coin", "road", "inn", "horse", "lantern")
+
+
+def _legacy(state):
+    quests = get_quests()
+    active = set(state["active_quests"])
+    if state.get("pending_quest") or any(q in active for q in quests):
+        return state
+    for quest_id, info in quests.items():
+        if quest_id in active:
+            continue
+        patterns = [re.compile(p, re.IGNORECASE) for p in info["triggers"]]
+        for npc in state["npc_states"].values():
+            for mem in npc["memory"]:
+                if any(p.search(mem) for p in patterns):
+                    state["pending_quest"] = quest_id
+                    return state
+    return state
+
+
+def _memory(i):
+    return f"Heard about the {WORDS[i % 10]} near the {WORDS[(i * 7) % 10]} on day {i}."
+
+
+def _state(n, npcs):
+    return {"active_quests": [], "pending_quest": None,
+            "npc_states": {f"npc{j}": {"npc_id": f"npc{j}", "memory": [_memory(i) for i in range(j, n, npcs)]}
+                           for j in range(npcs)}}
+
+
+def _ms(fn, state, ticks, grow):
+    total = 0.0
+    for t in range(ticks):
+        if grow:
+            for npc in state["npc_states"].values():
+                npc["memory"].append(_memory(t))
+        t0 = time.perf_counter()
+        fn(state)
+        total += time.perf_counter() - t0
+    return round(1000 * total / ticks, 3)
+
+
+def _use_pack(extra, shipped):
+    """ Point the quest registry at the shipped quests plus `extra` generated ones. """
+    rng = random.Random(extra)
+    pack = dict(shipped)
+    for q in range(extra):
+        word = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(5, 9)))
+        pack[f"generated_{q}"] = {"offer_text": "?", "triggers": [word, f"{word[:3]}[a-z]+ing"]}
+    path = os.path.join(tempfile.mkdtemp(), "quests.json")
+    with open(path, "w") as f:
+        json.dump(pack, f)
+    quest_registry.QUESTS_PATH = path
+    quest_registry.reload()
+
+
+def bench(n, npcs, ticks, extra):
+    row = {"memories": n, "quests": len(get_quests())}
+    if not extra:
+        row["legacy_ms"] = _ms(_legacy, _state(n, npcs), ticks, grow=True)
+    state = _state(n, npcs)
+    t0 = time.perf_counter()
+    quest_manager_node(state)
+    row["cold_ms"] = round(1000 * (time.perf_counter() - t0), 3)
+    row["tick_ms"] = _ms(quest_manager_node, state, ticks, grow=True)
+    assert state["pending_quest"] is None
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy quest trigger scan vs the incremental trigger engine.")
+    parser.add_argument("--memories", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--quests",   type=int, nargs="+", default=[0], help="generated quests to add")
+    parser.add_argument("--npcs",     type=int, default=3)
+    parser.add_argument("--ticks",    type=int, default=20)
+    parser.add_argument("--json",     help="write results to this file")
+    args = parser.parse_args()
+
+    shipped = dict(get_quests())
+    results = []
+    for extra in args.quests:
+        _use_pack(extra, shipped)
+        for n in args.memories:
+            row = bench(n, args.npcs, args.ticks, extra)
+            results.append(row)
+            legacy = f"{row['legacy_ms']:9.3f} ms/tick" if "legacy_ms" in row else f"{'-':>9}"
+            print(f"quests={row['quests']:>6}  memories={n:>7}  legacy={legacy}  "
+                  f"cold={row['cold_ms']:9.3f} ms  incremental={row['tick_ms']:7.3f} ms/tick")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
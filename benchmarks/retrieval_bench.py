@@ -0,0 +1,96 @@
+# benchmarks/retrieval_bench.py
+"""
+Memory recall for one NPC with 10 .. 100k memories:
+
+  legacy   the old character_agent recall: FAISS top-5, then a Python loop
+           with linear decay score * max(0, 1 - 0.1 * age)
+  recall   memory.retrieval.recall with the default scorer and budget
+  exact    recall with an unlimited budget
+
+Reports ms per query and overlap@3 with an exhaustive ranking under the
+default scorer (all memories scored in NumPy).
+
+    python -m benchmarks.retrieval_bench --memories 10 100 1000 10000 100000
+"""
+
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from memory.retrieval import DEFAULT_SCORER, recall
+
+
+def _legacy(npc, q, now):
+    D, I = npc["faiss_index"].search(q, k=5)
+    candidates = []
+    for score, idx in zip(D[0], I[0]):
+        if idx < 0:
+            continue
+        entry = npc["faiss_id_to_memory_text"].get(int(idx))
+        if not entry or entry.get("npc_id") != npc["npc_id"]:
+            continue
+        weight = score * max(0.0, 1 - 0.1 * (now - entry.get("timestamp", 0)))
+        candidates.append((weight, int(idx)))
+    candidates.sort(key=lambda x: x[0], reverse=True)
+    return [i for _, i in candidates[:3]]
+
+
+def bench(n, dim, queries, rng):
+    now = n
+    vecs = rng.standard_normal((n, dim)).astype("float32")
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    ts = np.sort(rng.integers(0, now + 1, n))
+    idx = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+    idx.add_with_ids(vecs, np.arange(n, dtype="int64"))
+    npc = {"npc_id": "npc", "faiss_index": idx,
+           "faiss_id_to_memory_text": {i: {"text": f"m{i}", "npc_id": "npc", "timestamp": int(ts[i])}
+                                       for i in range(n)}}
+
+    # queries near a random memory, like a player bringing up a past topic
+    qs = vecs[rng.integers(0, n, queries)] + 0.5 * rng.standard_normal((queries, dim)).astype("float32") / np.sqrt(dim)
+    qs /= np.linalg.norm(qs, axis=1, keepdims=True)
+    ages = (now - ts).astype("float32")
+    importance = np.full(n, 0.5, dtype="float32")
+    exact = [set(np.argsort(-DEFAULT_SCORER.score(vecs @ q, ages, importance))[:3].tolist()) for q in qs]
+
+    row = {"memories": n}
+    runs = {
+        "legacy": lambda q: _legacy(npc, q, now),
+        "recall": lambda q: [h["memory_id"] for h in recall(npc, q, now, k=3)],
+        "exact":  lambda q: [h["memory_id"] for h in recall(npc, q, now, k=3, budget_ms=float("inf"))],
+    }
+    for name, fn in runs.items():
+        t0 = time.perf_counter()
+        got = [fn(q[None, :]) for q in qs]
+        row[f"{name}_ms"] = round(1000 * (time.perf_counter() - t0) / queries, 3)
+        row[f"{name}_overlap@3"] = round(float(np.mean([len(set(g) & e) / 3 for g, e in zip(got, exact)])), 3)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy top-5 recall vs memory.retrieval.recall.")
+    parser.add_argument("--memories", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--dim",      type=int, default=384)
+    parser.add_argument("--queries",  type=int, default=100)
+    parser.add_argument("--json",     help="write results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for n in args.memories:
+        row = bench(n, args.dim, args.queries, rng)
+        results.append(row)
+        print(f"memories={n:>7}  " + "  ".join(
+            f"{name}={row[f'{name}_ms']} ms (overlap@3 {row[f'{name}_overlap@3']})"
+            for name in ("legacy", "recall", "exact")))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
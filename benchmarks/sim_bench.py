@@ -0,0 +1,214 @@
+# benchmarks/sim_bench.py
+"""
+The full build_graph() workflow, offline and deterministic: in-process stub
+Groq clients (--latency seconds per call), the HashEmbedder, a seeded script
+of player events, and journal_state after every tick as /tick does.
+
+For each window ending at a --ticks checkpoint it reports ticks/s, p50/p95/p99
+per graph node and per span (llm, embed, faiss_search, faiss_add, save_state;
+see utils/tracing.py), RSS and its growth since the first tick, and the size
+of the save directory. One run goes through every checkpoint, so later
+windows show how the hot paths behave as the NPCs' memories grow.
+
+    python -m benchmarks.sim_bench --ticks 1000 10000 100000 --json base.json
+    python -m benchmarks.sim_bench --ticks 1000 10000 --compare base.json
+
+--compare exits with status 1 if ticks/s or any node's p95 is more than
+--tolerance worse than the same checkpoint in the given results file.
+--events replays a recorded trace instead of the script: JSON lines of
+{"event": ..., "params": {...}}, cycled if shorter than the run.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.stubs import AsyncStubGroq, HashEmbedder, StubGroq
+
+NPCS  = ("malrik_merchant", "helena_guard", "rowan_bard")
+LINES = ("Hello! How's business today?",
+         "Any news from the market?",
+         "Did you see a thief near the stalls?",
+         "I heard a rumor about the north gate.",
+         "Is there a curfew tonight?",
+         "What are you selling?",
+         "Tell me about this town.",
+         "I found the stolen purse",
+         "Goodbye for now.")
+# p95s below this (ms) are too noisy to call a regression on
+NOISE_FLOOR_MS = 0.05
+
+
+def scripted_events(seed):
+    """ Endless, seeded mix of chat (incl. quest triggers, gossip, "yes"), approach and move events. """
+    rng = random.Random(seed)
+    for n in itertools.count(1):
+        r, npc_id = rng.random(), rng.choice(NPCS)
+        if r < 0.05:
+            yield {"event": "player_moved", "params": {"new_location": "Market Plaza"}}
+        elif r < 0.15:
+            yield {"event": "player_near_npc", "params": {"npc_id": npc_id, "text": "*waves*"}}
+        elif r < 0.20:
+            yield {"event": "player_chat", "params": {"npc_id": npc_id, "text": "yes"}}
+        else:
+            # numbered so every line is a distinct memory / embedding
+            yield {"event": "player_chat", "params": {"npc_id": npc_id, "text": f"{rng.choice(LINES)} (#{n})"}}
+
+
+def recorded_events(path):
+    with open(path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return itertools.cycle(events)
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource         # no /proc: peak rather than current RSS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def _percentiles(samples):
+    out = {}
+    for name, ms in sorted(samples.items()):
+        p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+        out[name] = {"count": len(ms), "p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3)}
+    return out
+
+
+async def run(graph, state, events, checkpoints, save_dir, use_async):
+    from persistence import journal_state
+    from utils.llm_cache import get_llm_cache
+    from utils.tracing import start_trace
+
+    done = 0
+    rss0 = rss_mb()
+    for end in checkpoints:
+        nodes, spans = defaultdict(list), defaultdict(list)
+        t0 = time.perf_counter()
+        for event in itertools.islice(events, end - done):
+            state["last_event"]   = event["event"]
+            state["event_params"] = dict(event.get("params", {}))
+            with start_trace() as trace:
+                state = await graph.ainvoke(state) if use_async else graph.invoke(state)
+                journal_state(state, save_dir)
+            for s in trace.spans:
+                (nodes if s["kind"] == "node" else spans)[s["name"]].append(s["ms"])
+        elapsed = time.perf_counter() - t0
+        rss = rss_mb()
+        row = {"ticks":         end,
+               "ticks_per_s":   round((end - done) / elapsed, 1),
+               "rss_mb":        round(rss, 1),
+               "rss_growth_mb": round(rss - rss0, 1),
+               "save_bytes":    dir_bytes(save_dir),
+               "memories":      sum(len(n["memory"]) for n in state["npc_states"].values()),
+               "nodes":         _percentiles(nodes),
+               "spans":         _percentiles(spans),
+               "llm_cache":     get_llm_cache().stats()}
+        done = end
+        yield row
+
+
+def _print_row(row):
+    print(f"ticks={row['ticks']:>7}  {row['ticks_per_s']:>8} t/s  rss={row['rss_mb']} MB "
+          f"(+{row['rss_growth_mb']})  save={row['save_bytes'] / 2**20:.2f} MB  memories={row['memories']}")
+    c = row["llm_cache"]
+    print(f"    llm cache: hit rate {c['hit_rate']:.1%} ({c['hits'] + c['disk_hits']} hits, "
+          f"{c['misses']} misses, {c['bypassed']} bypassed), {c['saved_seconds']} s of LLM latency saved")
+    for kind in ("nodes", "spans"):
+        for name, p in row[kind].items():
+            print(f"    {name:<20} p50={p['p50']:>8.3f}  p95={p['p95']:>8.3f}  p99={p['p99']:>8.3f} ms  (n={p['count']})")
+
+
+def compare(rows, baseline_path, tolerance):
+    """ Regressions against an earlier --json file, as printable lines. """
+    with open(baseline_path) as f:
+        base = {r["ticks"]: r for r in json.load(f)["results"]}
+    problems = []
+    for row in rows:
+        old = base.get(row["ticks"])
+        if old is None:
+            continue
+        if row["ticks_per_s"] < old["ticks_per_s"] * (1 - tolerance):
+            problems.append(f"ticks={row['ticks']}: {old['ticks_per_s']} → {row['ticks_per_s']} t/s")
+        for name, p in row["nodes"].items():
+            was = old["nodes"].get(name)
+            if was and max(p["p95"], was["p95"]) >= NOISE_FLOOR_MS and p["p95"] > was["p95"] * (1 + tolerance):
+                problems.append(f"ticks={row['ticks']}: {name} p95 {was['p95']} → {p['p95']} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline full-workflow ticks: throughput, per-node latency, RSS, save size.")
+    parser.add_argument("--ticks",     type=int, nargs="+", default=[1000, 10000, 100000], help="checkpoints")
+    parser.add_argument("--latency",   type=float, default=0.0, help="seconds per stub LLM call")
+    parser.add_argument("--seed",      type=int, default=0)
+    parser.add_argument("--sync",      action="store_true", help="graph.invoke instead of graph.ainvoke")
+    parser.add_argument("--events",    help="JSON-lines event trace to replay instead of the script")
+    parser.add_argument("--no-llm-cache", action="store_true", help="call the stub LLM for every request")
+    parser.add_argument("--save-dir",  help="keep the save here (default: a temporary directory)")
+    parser.add_argument("--json",      help="write results to this file")
+    parser.add_argument("--compare",   help="earlier --json results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown for --compare")
+    args = parser.parse_args()
+
+    os.environ.setdefault("NPC_LOG_LEVEL", "WARNING")
+    random.seed(args.seed)      # world_state's weather
+
+    from main import init_fresh_state
+    from utils.embedding_service import EmbeddingService, set_embedding_service
+    from utils.llm import set_clients
+    from utils.llm_cache import LLMCache, set_llm_cache
+    from workflows.npc_simulation_graph import build_graph
+    set_embedding_service(EmbeddingService(model=HashEmbedder()))
+    set_clients(StubGroq(args.latency), AsyncStubGroq(args.latency))
+    set_llm_cache(LLMCache(size=0 if args.no_llm_cache else 1024, path=""))   # in memory: runs stay comparable
+    graph  = build_graph()
+    events = recorded_events(args.events) if args.events else scripted_events(args.seed)
+    checkpoints = sorted(set(args.ticks))
+
+    async def collect(save_dir):
+        rows = []
+        async for row in run(graph, init_fresh_state(), events, checkpoints, save_dir, not args.sync):
+            with contextlib.redirect_stdout(sys.__stdout__):
+                _print_row(row)
+            rows.append(row)
+        return rows
+
+    with contextlib.ExitStack() as stack:
+        save_dir = args.save_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(save_dir, exist_ok=True)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            rows = asyncio.run(collect(save_dir))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency": args.latency, "seed": args.seed, "mode": "sync" if args.sync else "async",
+                       "events": args.events or "scripted", "results": rows}, f, indent=2)
+    if args.compare:
+        problems = compare(rows, args.compare, args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/stream_bench.py
+"""
+What the player waits for on a chat tick, offline: stub Groq clients whose
+first chunk takes --latency seconds and every further chunk --token-latency,
+the HashEmbedder, and a journal save after every tick as the server does.
+
+  tick    /tick: the reply arrives with the response, after the memory
+          summary, quests and the save
+  stream  /tick_stream (streaming.run_streamed_tick): time to first token,
+          time to the whole reply ("end"), and when the tick really finished
+
+    python -m benchmarks.stream_bench --ticks 200 --latency 0.15 --token-latency 0.004
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.stubs import AsyncStubGroq, HashEmbedder, StubGroq
+
+LINES = ["Any spices today?", "What news from the harbor?", "Seen anything odd at night?",
+         "How's business?", "Where can I find the bard?"]
+
+
+def _pct(values):
+    p50, p95 = np.percentile(1000 * np.asarray(values), (50, 95))
+    return {"p50": round(p50, 1), "p95": round(p95, 1)}
+
+
+async def bench(graph, ticks, save_dir):
+    from main import init_fresh_state
+    from persistence import journal_state, load_state, save_state
+    from sessions import SessionManager
+    from streaming import ReplyStream, run_streamed_tick
+
+    sessions = SessionManager(save_dir, init_fresh_state, load_state, save_state, journal_state)
+    sessions.preload()
+    npcs = list(sessions.resident()[0].state["npc_states"])
+    tick, ttft, reply, done = [], [], [], []
+    for i in range(ticks):
+        params = {"npc_id": npcs[i % len(npcs)], "text": f"{LINES[i % len(LINES)]} ({i})"}
+        if i % 2 == 0:
+            t0 = time.perf_counter()
+            async with sessions.open() as sess:
+                sess.state["last_event"], sess.state["event_params"] = "player_chat", params
+                sess.state = await graph.ainvoke(sess.state)
+                sessions.bump_version(sess)
+                await asyncio.to_thread(sessions.save, sess)
+            tick.append(time.perf_counter() - t0)
+        else:
+            stream = ReplyStream()
+            task = asyncio.create_task(run_streamed_tick(graph, sessions, "default", "player_chat", params, stream))
+            async for chunk in stream.events():
+                if chunk.startswith("event: end"):
+                    end = json.loads(chunk.split("data: ", 1)[1])
+                    ttft.append(end["ttft_ms"] / 1000)
+                    reply.append(end["reply_ms"] / 1000)
+            await task
+            done.append(time.perf_counter() - stream.t0)
+    return {"ticks": ticks, "tick_ms": _pct(tick), "stream_ttft_ms": _pct(ttft),
+            "stream_reply_ms": _pct(reply), "stream_tick_ms": _pct(done)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat tick latency: /tick response vs /tick_stream first token.")
+    parser.add_argument("--ticks",         type=int, default=200, help="half plain, half streamed")
+    parser.add_argument("--latency",       type=float, default=0.15, help="seconds to the first stub LLM chunk")
+    parser.add_argument("--token-latency", type=float, default=0.004, help="seconds between further chunks")
+    parser.add_argument("--json",          help="write results to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("NPC_LOG_LEVEL", "WARNING")
+    from utils.embedding_service import EmbeddingService, set_embedding_service
+    from utils.llm import set_clients
+    from utils.llm_cache import LLMCache, set_llm_cache
+    from workflows.npc_simulation_graph import build_graph
+    set_embedding_service(EmbeddingService(model=HashEmbedder()))
+    set_clients(StubGroq(args.latency), AsyncStubGroq(args.latency, args.token_latency))
+    set_llm_cache(LLMCache(size=0, path=""))      # every reply is generated
+    with tempfile.TemporaryDirectory() as tmp:
+        row = asyncio.run(bench(build_graph(), args.ticks, tmp))
+
+    for name in ("tick_ms", "stream_ttft_ms", "stream_reply_ms", "stream_tick_ms"):
+        print(f"{name:<16} p50={row[name]['p50']:>8} ms  p95={row[name]['p95']:>8} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": [row]}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
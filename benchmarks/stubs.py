@@ -0,0 +1,220 @@
+# benchmarks/stubs.py
+"""
+Offline stand-ins for the two external dependencies of a tick:
+
+ - StubLLMServer: a local Groq/OpenAI-compatible chat-completions endpoint
+   (in its own process) that sleeps `latency` seconds per request, so the
+   real Groq SDK (sync and async) can be pointed at it with GROQ_BASE_URL.
+ - StubGroq / AsyncStubGroq: the same canned completions in-process (no
+   HTTP), installed with utils.llm.set_clients, for long deterministic runs.
+ - HashEmbedder: a deterministic SentenceTransformer replacement (vectors
+   derived from a hash of the text), so recall/indexing runs without the model.
+"""
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import numpy as np
+
+from utils.embedding_service import EMBEDDING_DIMENSION
+
+
+class HashEmbedder:
+    """ `encode(texts)` → one pseudo-random vector per text, stable across runs. """
+
+    def __init__(self, dim: int = EMBEDDING_DIMENSION):
+        self.dim = dim
+
+    def encode(self, texts, convert_to_numpy=True):
+        if isinstance(texts, str):
+            texts = [texts]
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        for i, t in enumerate(texts):
+            seed = int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little")
+            out[i] = np.random.default_rng(seed).standard_normal(self.dim)
+        return out
+
+
+def _reply_for(body):
+    """
+    Canned content: a memory summary for the synthesizer (quoting the
+    player), JSON dialogue otherwise; a player line mentioning a "rumor"
+    makes the NPC gossip to the first other NPC it was offered.
+    """
+    system = next((m.get("content", "") for m in body.get("messages", []) if m.get("role") == "system"), "")
+    user   = next((m.get("content", "") for m in body.get("messages", []) if m.get("role") == "user"), "")
+    if "memory module" in system:
+        said = user.split("\n", 1)[0].removeprefix("Player said: ") or "hello"
+        return f"The NPC remembers that the player said {said}."
+    tool_action = None
+    if "rumor" in user.lower():
+        target = system.partition("share gossip with: ")[2].split(" (", 1)[0]
+        if target and not target.startswith("none"):
+            tool_action = {"type": "gossip",
+                           "params": {"target_npc": target, "message": f"The player told me: {user}"}}
+    return json.dumps({
+        "response":      "Fine wares today, traveller. Care to look?",
+        "emotion_state": "happy",
+        "tool_action":   tool_action,
+    })
+
+
+def _usage_for(body, content):
+    return {"prompt_tokens":     sum(len(m.get("content", "")) // 4 for m in body.get("messages", [])),
+            "completion_tokens": len(content) // 4,
+            "total_tokens":      0}
+
+
+class _Completions:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls   = 0
+
+    def _completion(self, body):
+        self.calls += 1
+        content = _reply_for(body)
+        return SimpleNamespace(
+            id=f"stub-{self.calls}", model=body.get("model", "stub"),
+            choices=[SimpleNamespace(index=0, finish_reason="stop",
+                                     message=SimpleNamespace(role="assistant", content=content))],
+            usage=SimpleNamespace(**_usage_for(body, content)))
+
+    def create(self, **body):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._completion(body)
+
+
+class _AsyncCompletions(_Completions):
+    def __init__(self, latency: float, token_latency: float = 0.0):
+        super().__init__(latency)
+        self.token_latency = token_latency
+
+    async def create(self, stream=False, **body):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        comp = self._completion(body)
+        if stream:
+            return self._chunks(comp)
+        if self.token_latency:      # the whole reply is generated either way
+            await asyncio.sleep(self.token_latency * ((len(comp.choices[0].message.content) - 1) // 4))
+        return comp
+
+    async def _chunks(self, comp):
+        """ stream=True: the reply a few characters per chunk, `token_latency` apart, usage on the last. """
+        content = comp.choices[0].message.content
+        for i in range(0, len(content), 4):
+            if i and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=content[i:i + 4]))])
+        yield SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=comp.usage))
+
+
+class StubGroq:
+    """ `client.chat.completions.create(**request)` → canned completion after `latency` seconds. """
+
+    def __init__(self, latency: float = 0.0):
+        self.chat = SimpleNamespace(completions=_Completions(latency))
+
+
+class AsyncStubGroq:
+    """
+    Awaitable twin of StubGroq (what get_async_client() returns). With
+    stream=True the first chunk comes after `latency` seconds and each
+    further one `token_latency` seconds later; without it, the completion
+    comes once all of those chunks would have.
+    """
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0):
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(latency, token_latency))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024   # hundreds of ticks connect at once
+
+
+def _serve(latency, host, port, ready):
+    """ Child-process entry point: serve until killed, reporting the bound port. """
+    requests = 0
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True   # headers and body go out as separate writes
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            nonlocal requests
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            requests += 1
+            time.sleep(latency)
+            content = _reply_for(body)
+            payload = json.dumps({
+                "id":      f"stub-{requests}",
+                "object":  "chat.completion",
+                "created": int(time.time()),
+                "model":   body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": _usage_for(body, content),
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    httpd = _Server((host, port), Handler)
+    ready.send(httpd.server_address[1])
+    httpd.serve_forever()
+
+
+class StubLLMServer:
+    """
+    Runs in a separate process so its request handling doesn't compete with
+    the worker under test for the GIL.
+
+        with StubLLMServer(latency=0.2) as base_url:
+            os.environ["GROQ_BASE_URL"] = base_url
+    """
+
+    def __init__(self, latency: float = 0.2, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.host    = host
+        self.port    = port
+        self._proc   = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> str:
+        ctx = multiprocessing.get_context("spawn")
+        parent, child = ctx.Pipe()
+        self._proc = ctx.Process(target=_serve, args=(self.latency, self.host, self.port, child), daemon=True)
+        self._proc.start()
+        self.port = parent.recv()
+        return self.base_url
+
+    def stop(self) -> None:
+        if self._proc is not None:
+            self._proc.terminate()
+            self._proc.join()
+            self._proc = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
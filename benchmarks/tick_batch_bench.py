@@ -0,0 +1,101 @@
+# benchmarks/tick_batch_bench.py
+"""
+N player events as N /tick-style passes (ainvoke + save each, one after the
+other, as a client doing one round trip per event would) vs one
+batching.run_batch + one save, against a local stub LLM server.
+
+    python -m benchmarks.tick_batch_bench --latency 0.05 --events 12 48
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.stubs import HashEmbedder, StubLLMServer
+
+
+class _CountingEmbedder(HashEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls += 1
+        return super().encode(texts, convert_to_numpy)
+
+
+def _events(npc_ids, n):
+    return [{"event": "player_chat",
+             "params": {"npc_id": npc_ids[i % len(npc_ids)], "text": f"Any news today? (#{i})"}}
+            for i in range(n)]
+
+
+async def run_per_tick(graph, state, events, save):
+    t0 = time.perf_counter()
+    for e in events:
+        state["last_event"]   = e["event"]
+        state["event_params"] = e["params"]
+        state = await graph.ainvoke(state)
+        await asyncio.to_thread(save, state)
+    return time.perf_counter() - t0
+
+
+async def run_batched(graph, state, events, save):
+    from batching import run_batch
+    t0 = time.perf_counter()
+    await run_batch(graph, state, events)
+    await asyncio.to_thread(save, state)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="N x /tick vs one /tick_batch against a stub LLM.")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per stub LLM call")
+    parser.add_argument("--events",  type=int, nargs="+", default=[12, 48])
+    parser.add_argument("--json",    help="write results to this file")
+    args = parser.parse_args()
+
+    with StubLLMServer(latency=args.latency) as base_url:
+        os.environ["GROQ_BASE_URL"] = base_url
+        os.environ.setdefault("GROQ_API_KEY", "stub")
+
+        from utils.embedding_service import EmbeddingService, set_embedding_service
+        from main import init_fresh_state
+        from persistence import save_state
+        from workflows.npc_simulation_graph import build_graph
+        graph = build_graph()
+
+        results = []
+        with tempfile.TemporaryDirectory() as tmp:
+            save = lambda state: save_state(state, tmp)
+            for n in args.events:
+                row = {"events": n}
+                for mode, runner in (("per_tick", run_per_tick), ("batch", run_batched)):
+                    embedder = _CountingEmbedder()
+                    set_embedding_service(EmbeddingService(model=embedder))
+                    state  = init_fresh_state()
+                    events = _events(list(state["npc_states"]), n)
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        elapsed = asyncio.run(runner(graph, state, events, save))
+                    row[f"{mode}_s"]             = round(elapsed, 3)
+                    row[f"{mode}_ms_per_event"]  = round(1000 * elapsed / n, 1)
+                    row[f"{mode}_encode_calls"]  = embedder.calls
+                row["speedup"] = round(row["per_tick_s"] / row["batch_s"], 2)
+                results.append(row)
+                print(f"events={n:>4}  per_tick={row['per_tick_ms_per_event']:>7} ms/event "
+                      f"({row['per_tick_encode_calls']} encodes)  "
+                      f"batch={row['batch_ms_per_event']:>7} ms/event "
+                      f"({row['batch_encode_calls']} encodes)  x{row['speedup']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency": args.latency, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
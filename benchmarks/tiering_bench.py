@@ -0,0 +1,91 @@
+# benchmarks/tiering_bench.py
+"""
+Recall@3 vs query latency for the memory index tiers (memory/tiering.py)
+at growing per-NPC memory counts, to pick NPC_TIER_HNSW_AT /
+NPC_TIER_IVFPQ_AT. Recall is measured against the exact flat index.
+
+Memories are clustered (topics) rather than uniform noise, and queries are
+perturbed memories, which is closer to what NPCs store and recall.
+
+    python -m benchmarks.tiering_bench --memories 1000 10000 50000 100000 --target 0.95
+"""
+
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from memory import tiering
+
+
+def _data(n, dim, queries, rng):
+    topics = rng.standard_normal((max(8, n // 50), dim)).astype("float32")
+    vecs = topics[rng.integers(0, len(topics), n)] + 0.6 * rng.standard_normal((n, dim)).astype("float32")
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    qs = vecs[rng.integers(0, n, queries)] + 0.5 * rng.standard_normal((queries, dim)).astype("float32") / np.sqrt(dim)
+    qs /= np.linalg.norm(qs, axis=1, keepdims=True)
+    return vecs, qs
+
+
+def _size(idx):
+    return len(faiss.serialize_index(idx))
+
+
+def bench(n, dim, queries, k, tiers, rng):
+    vecs, qs = _data(n, dim, queries, rng)
+    ids = np.arange(n, dtype="int64")
+    rows = []
+    truth = None
+    for tier in tiers:
+        t0 = time.perf_counter()
+        idx = tiering.build_index(tier, ids, vecs)
+        build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        found = [idx.search(q[None, :], k)[1][0] for q in qs]
+        latency = 1000 * (time.perf_counter() - t0) / queries
+        if truth is None:
+            truth = found       # flat runs first
+        recall = float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+        rows.append({"memories": n, "tier": tier, "build_s": round(build, 3),
+                     "query_ms": round(latency, 3), f"recall@{k}": round(recall, 3),
+                     "index_mb": round(_size(idx) / 2**20, 1)})
+        print(f"memories={n:>7}  {tier:<5}  build={build:7.2f}s  query={latency:7.3f} ms  "
+              f"recall@{k}={recall:.3f}  size={rows[-1]['index_mb']} MB")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency of the NPC memory index tiers.")
+    parser.add_argument("--memories", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    parser.add_argument("--tiers",    nargs="+", default=list(tiering.TIERS), choices=tiering.TIERS)
+    parser.add_argument("--dim",      type=int, default=384)
+    parser.add_argument("--k",        type=int, default=3)
+    parser.add_argument("--queries",  type=int, default=200)
+    parser.add_argument("--target",   type=float, default=0.95, help="recall@k a tier must keep")
+    parser.add_argument("--json",     help="write results to this file")
+    args = parser.parse_args()
+    if args.tiers[0] != "flat":
+        args.tiers = ["flat"] + [t for t in args.tiers if t != "flat"]
+
+    rng = np.random.default_rng(0)
+    results = []
+    for n in args.memories:
+        results.extend(bench(n, args.dim, args.queries, args.k, args.tiers, rng))
+
+    # smallest size at which a tier is faster than flat while keeping the target recall
+    for tier in args.tiers[1:]:
+        ok = [r["memories"] for r in results if r["tier"] == tier and r[f"recall@{args.k}"] >= args.target
+              and r["query_ms"] < next(f["query_ms"] for f in results
+                                       if f["tier"] == "flat" and f["memories"] == r["memories"])]
+        print(f"{tier}: faster than flat with recall@{args.k} >= {args.target} from "
+              f"{min(ok) if ok else 'none of the tested sizes'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/world_index_bench.py
+"""
+Per-NPC memory recall and cross-NPC "who knows" search, three layouts:
+
+  per_npc      one IndexIDMap(IndexFlatIP) per NPC (the default)
+  world_ivf    memory.world_index.WorldMemoryIndex: one IVF index, one
+               inverted list per NPC, owner queries probe only that list
+  world_flat   one IndexIDMap(IndexFlatIP) for the world, owner queries
+               restricted with an IDSelectorRange (still scans every vector)
+
+Reports build time, owner top-k latency, how often an owner query came
+back with a full top-k of that NPC's own memories, and who-knows latency.
+
+    python -m benchmarks.world_index_bench --npcs 10 1000 10000 --memories 16
+"""
+
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from memory.world_index import OWNER_SHIFT, WorldMemoryIndex
+
+
+def _timed(fn, reps):
+    t0 = time.perf_counter()
+    for i in range(reps):
+        fn(i)
+    return 1000 * (time.perf_counter() - t0) / reps
+
+
+def bench(n_npcs, memories, dim, k, queries, rng):
+    vecs = rng.standard_normal((n_npcs, memories, dim)).astype("float32")
+    vecs /= np.linalg.norm(vecs, axis=2, keepdims=True)
+    q = rng.standard_normal((queries, dim)).astype("float32")
+    owners = rng.integers(0, n_npcs, queries)
+    mids = np.arange(memories, dtype="int64")
+    row = {"npcs": n_npcs, "memories": n_npcs * memories}
+
+    def full(I):
+        return bool((I >= 0).all())
+
+    # ── per NPC ──────────────────────────────────────────────
+    t0 = time.perf_counter()
+    per = []
+    for n in range(n_npcs):
+        idx = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+        idx.add_with_ids(vecs[n], mids)
+        per.append(idx)
+    row["per_npc_build_s"] = round(time.perf_counter() - t0, 3)
+    fulls = []
+    row["per_npc_owner_ms"] = round(_timed(lambda i: fulls.append(full(per[owners[i]].search(q[i:i + 1], k)[1])), queries), 3)
+    row["per_npc_full_topk"] = sum(fulls) / len(fulls)
+
+    def who_per(i):
+        hits = []
+        for idx in per:
+            D, I = idx.search(q[i:i + 1], k)
+            hits.extend(zip(D[0], I[0]))
+        hits.sort(key=lambda h: -h[0])
+    row["per_npc_who_knows_ms"] = round(_timed(who_per, max(1, queries // 10)), 3)
+    del per
+
+    # ── world, partitioned IVF ───────────────────────────────
+    t0 = time.perf_counter()
+    world = WorldMemoryIndex(dim, capacity=n_npcs)
+    for n in range(n_npcs):
+        world.add(f"npc{n}", vecs[n], mids, timestamps=mids)
+    row["world_ivf_build_s"] = round(time.perf_counter() - t0, 3)
+    fulls = []
+    row["world_ivf_owner_ms"] = round(_timed(lambda i: fulls.append(full(world.search_owner(f"npc{owners[i]}", q[i:i + 1], k)[1])), queries), 3)
+    row["world_ivf_full_topk"] = sum(fulls) / len(fulls)
+    row["world_ivf_who_knows_ms"] = round(_timed(lambda i: world.who_knows(q[i:i + 1], k), max(1, queries // 10)), 3)
+    del world
+
+    # ── world, flat + IDSelectorRange ────────────────────────
+    t0 = time.perf_counter()
+    flat = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+    gids = (np.arange(n_npcs, dtype="int64")[:, None] << OWNER_SHIFT) | mids[None, :]
+    flat.add_with_ids(vecs.reshape(-1, dim), gids.reshape(-1))
+    row["world_flat_build_s"] = round(time.perf_counter() - t0, 3)
+
+    def owner_flat(i):
+        lo = int(owners[i]) << OWNER_SHIFT
+        sel = faiss.IDSelectorRange(lo, lo + (1 << OWNER_SHIFT))
+        fulls.append(full(flat.search(q[i:i + 1], k, params=faiss.SearchParameters(sel=sel))[1]))
+    fulls = []
+    row["world_flat_owner_ms"] = round(_timed(owner_flat, queries), 3)
+    row["world_flat_full_topk"] = sum(fulls) / len(fulls)
+    row["world_flat_who_knows_ms"] = round(_timed(lambda i: flat.search(q[i:i + 1], k), max(1, queries // 10)), 3)
+    del flat
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-NPC vs world-level memory indexes.")
+    parser.add_argument("--npcs",     type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--memories", type=int, default=16, help="memories per NPC")
+    parser.add_argument("--dim",      type=int, default=384)
+    parser.add_argument("--k",        type=int, default=5)
+    parser.add_argument("--queries",  type=int, default=200)
+    parser.add_argument("--json",     help="write results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for n in args.npcs:
+        row = bench(n, args.memories, args.dim, args.k, args.queries, rng)
+        results.append(row)
+        print(f"npcs={n:>6}  owner top-{args.k}: per_npc={row['per_npc_owner_ms']} ms  "
+              f"world_ivf={row['world_ivf_owner_ms']} ms  world_flat={row['world_flat_owner_ms']} ms  | "
+              f"who_knows: per_npc={row['per_npc_who_knows_ms']} ms  world_ivf={row['world_ivf_who_knows_ms']} ms  "
+              f"world_flat={row['world_flat_who_knows_ms']} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
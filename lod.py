@@ -0,0 +1,158 @@
+# lod.py
+
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, Optional
+
+from spatial_index import spatial_index_of
+from utils import metrics
+
+# Level of detail by distance from the player, in world_chunks hops:
+#   near  (<= NEAR_HOPS)  LLM reply, LLM memory summary, recall
+#   mid   (<= MID_HOPS)   rule-based reply, template memory, no LLM at all
+#   far   (further)       no graph run; autonomous turns are batched (see apply_far_updates)
+NEAR_HOPS = int(os.environ.get("NPC_LOD_NEAR_HOPS", "1"))
+MID_HOPS  = int(os.environ.get("NPC_LOD_MID_HOPS", "3"))
+# Far NPCs' autonomous turns applied together, in one pass
+FAR_BATCH = int(os.environ.get("NPC_LOD_FAR_BATCH", "16"))
+
+TIERS = ("near", "mid", "far")
+
+# Mid-tier replies: the first rule with a keyword in the (lowercased) text wins,
+# otherwise the NPC answers in its current mood.
+RULE_REPLIES = [
+    (("hello", "greetings", "good day", "*waves*"), "Well met."),
+    (("thank",),                                    "Think nothing of it."),
+    (("bye", "farewell"),                           "Safe travels."),
+    (("?",),                                        "Can't say I know much about that."),
+]
+MOOD_REPLIES = {
+    "neutral": "Hm. I see.",
+    "happy":   "Ha! Good to hear.",
+    "sad":     "Mm. If you say so.",
+    "angry":   "Not now.",
+    "curious": "Is that so? Tell me more another time.",
+}
+
+_transitions  = metrics.counter("npc_lod_transitions_total",
+                                "NPCs moved to a nearer (promote) or further (demote) tier as the player moved",
+                                ("direction",))
+_turn_seconds = metrics.histogram("npc_lod_turn_seconds", "Cost of one NPC turn, by level-of-detail tier", ("tier",))
+
+
+def chunk_hops(world_chunks: Dict[str, Any], start: Optional[str], limit: int) -> Dict[Optional[str], int]:
+    """ Hops from `start` to every chunk at most `limit` hops away (breadth-first over "neighbors"). """
+    hops = {start: 0}
+    frontier = deque([start])
+    while frontier:
+        chunk = frontier.popleft()
+        if hops[chunk] >= limit:
+            continue
+        for n in (world_chunks.get(chunk) or {}).get("neighbors", ()):
+            if n not in hops:
+                hops[n] = hops[chunk] + 1
+                frontier.append(n)
+    return hops
+
+
+class LODMap:
+    """
+    The tier of every chunk around the player. Chunks further than MID_HOPS
+    are not stored (they are "far"), so a move costs O(chunks within
+    MID_HOPS), not O(world). NPC tiers follow their chunk, so NPCs are
+    promoted and demoted as soon as the player (or the NPC) moves.
+    """
+
+    def __init__(self, state: Dict[str, Any], near_hops: int = None, mid_hops: int = None):
+        self.near_hops = NEAR_HOPS if near_hops is None else near_hops
+        self.mid_hops  = MID_HOPS if mid_hops is None else mid_hops
+        self.player_chunk = state.get("player_location")
+        self.chunk_tier = self._tiers(state)
+
+    def _tiers(self, state: Dict[str, Any]) -> Dict[Optional[str], str]:
+        hops = chunk_hops(state.get("world_chunks", {}), self.player_chunk, max(self.near_hops, self.mid_hops))
+        return {c: "near" if h <= self.near_hops else "mid" for c, h in hops.items()}
+
+    def follow(self, state: Dict[str, Any]) -> None:
+        """ Re-centre on the player's current chunk, counting the NPCs that changed tier. """
+        old = self.chunk_tier
+        self.player_chunk = state.get("player_location")
+        self.chunk_tier = new = self._tiers(state)
+        index = spatial_index_of(state)
+        for chunk in set(old) | set(new):
+            before, after = old.get(chunk, "far"), new.get(chunk, "far")
+            moved = len(index.members.get(chunk, ())) if before != after else 0
+            if moved:
+                promoted = TIERS.index(after) < TIERS.index(before)
+                _transitions.inc(moved, direction="promote" if promoted else "demote")
+
+    def tier(self, chunk: Optional[str]) -> str:
+        return self.chunk_tier.get(chunk, "far")
+
+
+_lod_lock = threading.Lock()
+
+
+def lod_of(state: Dict[str, Any]) -> LODMap:
+    """ The state's LODMap (state["lod"]), built on first use and re-centred when the player moved. """
+    lod = state.get("lod")
+    if lod is None or lod.player_chunk != state.get("player_location"):
+        with _lod_lock:
+            lod = state.get("lod")
+            if lod is None:
+                lod = state["lod"] = LODMap(state)
+            elif lod.player_chunk != state.get("player_location"):
+                lod.follow(state)
+    return lod
+
+
+def tier_of(state: Dict[str, Any], npc_id: Optional[str]) -> Optional[str]:
+    """ "near", "mid" or "far" for an NPC of `state`; None if there is no such NPC. """
+    if npc_id not in state["npc_states"]:
+        return None
+    return lod_of(state).tier(spatial_index_of(state).chunk_of.get(npc_id))
+
+
+def observe_turn(tier: Optional[str], seconds: float, n: int = 1) -> None:
+    """ Record `n` turns that together took `seconds` into npc_lod_turn_seconds{tier}. """
+    if tier is None:
+        return
+    for _ in range(n):
+        _turn_seconds.observe(seconds / n, tier=tier)
+
+
+def rule_reply(npc: Dict[str, Any], text: str) -> str:
+    """ A mid-tier NPC's reply to `text`, without the LLM. """
+    lowered = text.lower()
+    for keywords, reply in RULE_REPLIES:
+        if any(k in lowered for k in keywords):
+            return reply
+    return MOOD_REPLIES.get(npc.get("emotion_state", "neutral"), MOOD_REPLIES["neutral"])
+
+
+def apply_far_updates(state: Dict[str, Any], turns: Iterable[Dict[str, Any]]) -> int:
+    """
+    Fold far NPCs' autonomous turns (scheduler.plan_turn) into the state in
+    one pass, without the graph: items change hands directly and passed-on
+    gossip is stored as-is, every new memory embedded in one encode call.
+    Returns how many turns changed something.
+    """
+    from agents.event_nodes import hand_over
+    from agents.memory_synthesizer import apply_index_writes, collect_index_writes, remember
+
+    applied = 0
+    now = state.get("simulation_time", 0)
+    with collect_index_writes() as pending:
+        for turn in turns:
+            params = turn["params"]
+            if turn["event"] == "npc_gave_item":
+                applied += hand_over(state, params.get("npc_id"), params.get("target_npc"), params.get("item"))
+            elif turn["event"] == "npc_gossip":
+                gossip = turn["tool_action"]["params"]
+                target = state["npc_states"].get(gossip["target_npc"])
+                if target is not None:
+                    remember(gossip["target_npc"], target, gossip["message"], now)
+                    applied += 1
+    apply_index_writes(pending)
+    return applied
@@ -1,20 +1,22 @@
 # main.py
 
 import argparse
-import os
-import faiss
 
-from persistence import load_state, save_state
+from persistence import load_state, save_state, has_save
 from workflows.npc_simulation_graph import build_graph, SimulationState
 from agents.player_simulator import player_simulator_node
+from agents.memory_queue import get_memory_queue
+from utils.embedding_service import EMBEDDING_DIMENSION
+from memory.world_index import attach_if_enabled
 
 SAVE_DIR = "savegame"
-EMBEDDING_DIMENSION = 384  # must match your memory_synthesizer
 
 def init_fresh_state() -> SimulationState:
     """
     Build a brand-new SimulationState with empty FAISS indices.
     """
+    import faiss  # deferred: only needed once a world is actually built
+
     def make_npc_sub(npc_id, personality, inventory):
         idx = faiss.IndexIDMap(faiss.IndexFlatIP(EMBEDDING_DIMENSION))
         return {
@@ -22,6 +24,7 @@ def init_fresh_state() -> SimulationState:
             "personality":             personality,
             "emotion_state":           "neutral",
             "inventory":               inventory,
+            "location":                "Market Plaza",
             "memory":                  [],
             "faiss_index":             idx,
             "faiss_id_to_memory_text": {},
@@ -53,6 +56,7 @@ def init_fresh_state() -> SimulationState:
         "memory_owner":     None,
         "pending_quest":    None,
     }
+    attach_if_enabled(state)    # NPC_MEMORY_INDEX=world: one shared index for all NPCs
     return SimulationState(state)  # type: ignore
 
 def main():
@@ -63,7 +67,7 @@ def main():
     args = parser.parse_args()
 
     # ── 1) Load or initialize ────────────────────────────────
-    if os.path.exists(os.path.join(SAVE_DIR, "state.json")):
+    if has_save(SAVE_DIR):
         state = load_state(SAVE_DIR)
         print(f"🗄 Loaded saved state from {SAVE_DIR}")
     else:
@@ -91,6 +95,7 @@ def main():
     print(f"\nNPC (malrik_merchant) replies: {final_state.get('response')}\n")
 
     # ── 6) Persist everything back ───────────────────────────
+    get_memory_queue().flush()  # no-op unless NPC_MEMORY_MODE=deferred
     save_state(final_state, SAVE_DIR)
     print(f"💾 Saved state to {SAVE_DIR}")
 
@@ -0,0 +1,4 @@
+"""
+Memory storage and retrieval building blocks shared by the agents
+(world-level vector index, ...).
+"""
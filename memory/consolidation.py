@@ -0,0 +1,292 @@
+# memory/consolidation.py
+
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from memory.retrieval import DEFAULT_IMPORTANCE
+from utils import metrics
+
+# When a pass runs (0 disables a trigger):
+#   NPC_MEMORY_CAP          an NPC's indexed memories reach this many
+#   NPC_CONSOLIDATE_EVERY   this many simulation ticks since the NPC's last pass
+MEMORY_CAP        = int(os.environ.get("NPC_MEMORY_CAP", "2000"))
+CONSOLIDATE_EVERY = int(os.environ.get("NPC_CONSOLIDATE_EVERY", "0"))
+# Over the cap, the next pass waits for this share of MEMORY_CAP in new memories
+# (a pass that found nothing to merge would otherwise rerun on every add)
+CAP_REGROWTH      = 0.1
+# What it does:
+#   memories at least DEDUPE_SIMILARITY alike are duplicates; the newest is kept
+#   memories older than MERGE_MIN_AGE ticks with importance below MERGE_MAX_IMPORTANCE
+#   (low salience: chats, not gossip or quest leads, see memory_synthesizer.importance_of;
+#   unrated memories count as DEFAULT_IMPORTANCE and are kept) and at least
+#   MERGE_SIMILARITY alike are merged, MERGE_MIN_CLUSTER to MERGE_MAX_CLUSTER at a
+#   time, into one summary memory
+DEDUPE_SIMILARITY    = float(os.environ.get("NPC_DEDUPE_SIMILARITY", "0.95"))
+MERGE_SIMILARITY     = float(os.environ.get("NPC_MERGE_SIMILARITY", "0.8"))
+MERGE_MIN_AGE        = int(os.environ.get("NPC_MERGE_MIN_AGE", "100"))
+MERGE_MAX_IMPORTANCE = 0.5
+MERGE_MIN_CLUSTER    = 3
+MERGE_MAX_CLUSTER    = 8
+NEIGHBOURS           = 8
+
+_passes  = metrics.counter("npc_consolidations_total", "Memory consolidation passes")
+_removed = metrics.counter("npc_memories_consolidated_total",
+                           "Memories removed by consolidation", ("reason",))
+
+_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="consolidate")
+_pending: Dict[int, Any] = {}           # id(npc) → future of its pass
+_pending_lock = threading.Lock()
+
+
+def template_summary(npc_id: str, texts: List[str]) -> str:
+    """ Summary used when no LLM is available: the distinct texts, oldest first. """
+    return f"{npc_id} remembers: " + "; ".join(dict.fromkeys(texts))
+
+
+def _summarize_cluster(npc_id: str, texts: List[str]) -> str:
+    from utils.llm import get_client
+    client = get_client()
+    if client is None:
+        return template_summary(npc_id, texts)
+    try:
+        from utils.llm_cache import get_llm_cache
+        chat = get_llm_cache().complete(client, dict(
+            messages=[
+                {"role": "system", "content": (
+                    f"You are a memory module for NPC '{npc_id}'. Merge these memories into one "
+                    f"concise sentence starting with '{npc_id} remembers that...'. Keep names, "
+                    "places and items.")},
+                {"role": "user", "content": "\n".join(f"- {t}" for t in texts)},
+            ],
+            model="llama-3.1-8b-instant",
+            temperature=0.3,
+            max_tokens=80,
+        ), "consolidation")
+        return chat.choices[0].message.content.strip() or template_summary(npc_id, texts)
+    except Exception as e:
+        print(f"Consolidation ({npc_id}): LLM error {e}, using template summary.")
+        return template_summary(npc_id, texts)
+
+
+def plan(ids: np.ndarray, vecs: np.ndarray, entries: List[Dict[str, Any]],
+         now: int) -> Tuple[Dict[int, int], List[List[int]]]:
+    """
+    Decide what a pass does to one NPC's memories, from its (ids, vectors)
+    and the matching id-map entries:
+      duplicates  {dropped id: id of the newer near-identical memory kept}
+      clusters    [[ids, oldest first], ...] of old low-salience memories to merge
+    Uses a k-nearest-neighbour graph (k=NEIGHBOURS), so the cost stays
+    O(n * n * d) BLAS work rather than O(n^2) Python.
+    """
+    import faiss
+    n = len(ids)
+    if n < 2:
+        return {}, []
+    flat = faiss.IndexFlatIP(vecs.shape[1])
+    flat.add(np.ascontiguousarray(vecs, dtype="float32"))
+    D, I = flat.search(np.ascontiguousarray(vecs, dtype="float32"), min(n, NEIGHBOURS + 1))
+
+    ts  = np.array([e.get("timestamp", 0) for e in entries], dtype="float64")
+    imp = np.array([e.get("importance", DEFAULT_IMPORTANCE) for e in entries], dtype="float64")
+    newest_first = sorted(range(n), key=lambda i: (ts[i], ids[i]), reverse=True)
+
+    # 1) Near-duplicates: each surviving memory absorbs its older look-alikes
+    duplicates: Dict[int, int] = {}
+    dropped: Set[int] = set()
+    for i in newest_first:
+        if i in dropped:
+            continue
+        for sim, j in zip(D[i], I[i]):
+            if j < 0 or j == i or j in dropped or sim < DEDUPE_SIMILARITY:
+                continue
+            if (ts[j], ids[j]) < (ts[i], ids[i]):
+                dropped.add(j)
+                duplicates[int(ids[j])] = int(ids[i])
+
+    # 2) Old, low-salience memories: greedy clusters around the oldest
+    eligible = {i for i in range(n)
+                if i not in dropped and now - ts[i] >= MERGE_MIN_AGE and imp[i] < MERGE_MAX_IMPORTANCE
+                and not entries[i].get("consolidated")}
+    clusters: List[List[int]] = []
+    assigned: Set[int] = set()
+    for i in sorted(eligible, key=lambda i: (ts[i], ids[i])):
+        if i in assigned:
+            continue
+        members = [i] + [int(j) for sim, j in zip(D[i], I[i])
+                         if j != i and j in eligible and j not in assigned and sim >= MERGE_SIMILARITY]
+        members = members[:MERGE_MAX_CLUSTER]
+        if len(members) >= MERGE_MIN_CLUSTER:
+            assigned.update(members)
+            clusters.append([int(ids[m]) for m in sorted(members, key=lambda m: (ts[m], ids[m]))])
+    return duplicates, clusters
+
+
+def consolidate(npc: Dict[str, Any], now: int,
+                summarize: Optional[Callable[[str, List[str]], str]] = None) -> Dict[str, int]:
+    """
+    One consolidation pass over an NPC's memories (see plan()). Duplicates
+    and merged originals leave the memory list, the id→text map and the
+    index. Each cluster becomes one summary memory whose vector is the
+    normalized mean of the originals. Survivors get contiguous ids again, in
+    timestamp order, in a rebuilt flat index (tiering re-upgrades it if it's
+    still large). The NPC is mark_dirty()'d.
+
+    Only taking the snapshot and applying hold MEMORY_LOCK; planning and
+    summarizing (an LLM call by default) don't. If the NPC is rewritten in
+    between, the pass is dropped.
+    Returns counts: {"deduped", "merged", "summaries", "memories"}.
+    """
+    from agents.memory_queue import MEMORY_LOCK
+    from memory.tiering import build_index, maybe_upgrade
+    from memory.world_index import OwnerIndexView
+    from persistence import _index_vectors, mark_dirty
+
+    summarize = summarize or _summarize_cluster
+    npc_id = npc.get("npc_id")
+    stats = {"deduped": 0, "merged": 0, "summaries": 0, "memories": len(npc.get("faiss_id_to_memory_text", {}))}
+
+    # 1) Snapshot under the lock, plan off it (an all-pairs kNN: seconds at 10k memories)
+    with MEMORY_LOCK:
+        idx = npc.get("faiss_index")
+        if idx is None or idx.ntotal < 2:
+            return stats
+        revision = npc.get("revision", 0)
+        arrays = _index_vectors(idx)
+        if arrays is None:
+            return stats
+        ids, vecs = arrays
+        id_map = npc["faiss_id_to_memory_text"]
+        known = np.array([int(i) in id_map for i in ids], dtype=bool)
+        ids, vecs = ids[known], vecs[known]
+        entries = [id_map[int(i)] for i in ids]
+    duplicates, clusters = plan(ids, vecs, entries, now)
+    if not duplicates and not clusters:
+        npc["consolidated_at"], npc["consolidated_size"] = now, len(ids)
+        return stats
+
+    # 2) Summaries (may call the LLM), also off-lock
+    row = {int(i): r for r, i in enumerate(ids)}
+    summaries = []
+    for members in clusters:
+        vec = vecs[[row[m] for m in members]].mean(axis=0)
+        vec /= max(float(np.linalg.norm(vec)), 1e-12)
+        texts = [entries[row[m]]["text"] for m in members]
+        summaries.append((members, summarize(npc_id, texts), vec.astype("float32")))
+
+    # 3) Apply
+    with MEMORY_LOCK:
+        if npc.get("revision", 0) != revision or npc.get("faiss_index") is not idx:
+            return stats
+        id_map = npc["faiss_id_to_memory_text"]
+        cur_ids, cur_vecs = _index_vectors(idx)       # includes memories added during step 2
+        removed = set(duplicates) | {m for members, _, _ in summaries for m in members}
+
+        # a) survivors (keeping the highest importance of what they absorbed) + summaries
+        absorbed: Dict[int, List[Dict[str, Any]]] = {}
+        for d, keep in duplicates.items():
+            if d in id_map:
+                absorbed.setdefault(keep, []).append(id_map[d])
+        items = []
+        for i, v in zip(cur_ids.tolist(), cur_vecs):
+            if i in removed or i not in id_map:
+                continue
+            entry = id_map[i]
+            rated = [e["importance"] for e in [entry] + absorbed.get(i, []) if "importance" in e]
+            if rated and max(rated) != entry.get("importance"):
+                entry = {**entry, "importance": max(rated)}
+            items.append((entry, v))
+        for members, text, vec in summaries:
+            src = [id_map[m] for m in members]
+            items.append(({"text":         text,
+                           "npc_id":       npc_id,
+                           "timestamp":    max(e.get("timestamp", 0) for e in src),
+                           "importance":   max(e.get("importance", DEFAULT_IMPORTANCE) for e in src),
+                           "consolidated": len(members)}, vec))
+        items.sort(key=lambda it: it[0].get("timestamp", 0))
+
+        # b) memory list: drop the originals; a summary takes its oldest member's place
+        replace: Dict[str, List[str]] = {}
+        for members, text, _ in summaries:
+            replace.setdefault(id_map[members[0]]["text"], []).append(text)
+        drop = Counter(id_map[m]["text"] for m in removed if m in id_map)
+        memory = []
+        for text in npc["memory"]:
+            if drop[text]:
+                drop[text] -= 1
+                if replace.get(text):
+                    memory.append(replace[text].pop(0))
+                continue
+            memory.append(text)
+        memory.extend(t for texts in replace.values() for t in texts)
+
+        # c) contiguous ids, new index
+        new_ids = np.arange(len(items), dtype="int64")
+        new_vecs = (np.stack([v for _, v in items]).astype("float32") if items
+                    else np.zeros((0, cur_vecs.shape[1]), dtype="float32"))
+        mark_dirty(npc)     # before the swap: the next save rewrites this NPC, never journals it
+        npc["faiss_id_to_memory_text"] = {int(i): e for i, (e, _) in zip(new_ids, items)}
+        npc["memory"] = memory
+        npc.pop("quest_scan", None)     # quest triggers re-read the rewritten list
+        npc["next_faiss_id"] = len(items)
+        if isinstance(idx, OwnerIndexView):
+            idx.remove_ids(cur_ids)
+            if len(items):
+                idx.add_with_ids(new_vecs, new_ids)
+        else:
+            npc["faiss_index"] = build_index("flat", new_ids, new_vecs)
+        npc["consolidated_at"], npc["consolidated_size"] = now, len(items)
+        maybe_upgrade(npc)
+
+    stats.update(deduped=len(duplicates), merged=sum(len(m) for m, _, _ in summaries),
+                 summaries=len(summaries), memories=len(items))
+    _passes.inc()
+    _removed.inc(stats["deduped"], reason="duplicate")
+    _removed.inc(stats["merged"], reason="merged")
+    print(f"🧹 {npc_id}: consolidated memories — {stats['deduped']} duplicates dropped, "
+          f"{stats['merged']} merged into {stats['summaries']} summaries, {stats['memories']} left")
+    return stats
+
+
+def due(npc: Dict[str, Any], now: int) -> bool:
+    n = len(npc.get("faiss_id_to_memory_text", {}))
+    regrown = n - npc.get("consolidated_size", 0) >= max(1, CAP_REGROWTH * MEMORY_CAP)
+    if MEMORY_CAP and n >= MEMORY_CAP and regrown:
+        return True
+    return bool(CONSOLIDATE_EVERY) and n > 1 and now - npc.get("consolidated_at", 0) >= CONSOLIDATE_EVERY
+
+
+def maybe_consolidate(npc: Dict[str, Any], now: int) -> bool:
+    """
+    Schedule a background pass if the NPC is over the size cap or its
+    periodic pass is due. Cheap enough to call after every add.
+    """
+    if not due(npc, now):
+        return False
+    with _pending_lock:
+        if id(npc) in _pending:
+            return False
+        _pending[id(npc)] = _pool.submit(_run, npc, now)
+    return True
+
+
+def _run(npc: Dict[str, Any], now: int) -> None:
+    try:
+        consolidate(npc, now)
+    except Exception as e:
+        print(f"⚠️  {npc.get('npc_id')}: memory consolidation failed: {e}")
+    finally:
+        with _pending_lock:
+            _pending.pop(id(npc), None)
+
+
+def wait_for_consolidation() -> None:
+    """ Block until scheduled passes have finished (tests, benchmarks). """
+    with _pending_lock:
+        futures = list(_pending.values())
+    for f in futures:
+        f.exception()
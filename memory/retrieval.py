@@ -0,0 +1,215 @@
+# memory/retrieval.py
+
+import math
+import os
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils import metrics
+from utils.tracing import span
+
+# Default scorer: score = similarity + RECENCY_WEIGHT * recency + IMPORTANCE_WEIGHT * importance,
+# recency = 0.5 ** (age / HALF_LIFE) with age in simulation ticks.
+HALF_LIFE         = float(os.environ.get("NPC_RECALL_HALF_LIFE", "24"))
+RECENCY_WEIGHT    = float(os.environ.get("NPC_RECALL_RECENCY_WEIGHT", "0.3"))
+IMPORTANCE_WEIGHT = float(os.environ.get("NPC_RECALL_IMPORTANCE_WEIGHT", "0.2"))
+# Importance of memories that don't carry one, i.e. saved before memories were
+# rated (agents/memory_synthesizer.importance_of; scores are in [0, 1])
+DEFAULT_IMPORTANCE = 0.5
+# Wall-clock budget per recall; past it the best candidates found so far are used
+RECALL_BUDGET_MS  = float(os.environ.get("NPC_RECALL_BUDGET_MS", "5"))
+# First round fetches OVERFETCH * k neighbours, each further round GROWTH times more
+OVERFETCH = 4
+GROWTH    = 4
+
+_recall_fetched = metrics.histogram("npc_recall_candidates", "Neighbours fetched per memory recall",
+                                    buckets=(5, 10, 25, 50, 100, 250, 1000, 10000, 100000))
+_recall_budget  = metrics.counter("npc_recall_budget_exceeded_total",
+                                  "Recalls cut short by their latency budget")
+
+
+class Scorer:
+    """
+    Ranks recalled memories by a weighted sum of
+      similarity  inner product of query and memory embeddings
+      recency     1.0 for a memory from this tick, decaying with age:
+                    "half_life":   0.5 ** (age / half_life)
+                    "exponential": exp(-rate * age)
+                    "linear":      max(0, 1 - rate * age)
+                    "none":        always 1
+      importance  the entry's "importance" in [0, 1] (DEFAULT_IMPORTANCE if unset)
+    """
+
+    DECAYS = ("half_life", "exponential", "linear", "none")
+
+    def __init__(self, similarity: float = 1.0, recency: float = RECENCY_WEIGHT,
+                 importance: float = IMPORTANCE_WEIGHT, decay: str = "half_life",
+                 half_life: float = HALF_LIFE, rate: Optional[float] = None):
+        if decay not in self.DECAYS:
+            raise ValueError(f"unknown decay {decay!r} (expected one of {self.DECAYS})")
+        self.similarity = similarity
+        self.recency    = recency
+        self.importance = importance
+        self.decay      = decay
+        self.rate       = rate if rate is not None else math.log(2) / half_life
+
+    def recency_of(self, ages: np.ndarray) -> np.ndarray:
+        ages = np.maximum(ages, 0.0)
+        if self.decay == "linear":
+            return np.maximum(0.0, 1.0 - self.rate * ages)
+        if self.decay == "none":
+            return np.ones_like(ages)
+        return np.exp(-self.rate * ages)
+
+    def score(self, sims: np.ndarray, ages: np.ndarray, importance: np.ndarray) -> np.ndarray:
+        return (self.similarity * sims
+                + self.recency * self.recency_of(ages)
+                + self.importance * importance)
+
+    def bound(self, sim: float, age: float, importance: float) -> float:
+        """ Highest score of a memory with similarity <= sim, age >= age and importance <= importance. """
+        return float(self.score(np.array([sim]), np.array([age]), np.array([importance]))[0])
+
+
+DEFAULT_SCORER = Scorer()
+
+
+class _Meta:
+    """
+    One NPC's id → timestamp / importance / owner map as arrays, in the id
+    map's (insertion) order. Cached per id map and extended in place when
+    memories are appended; rebuilt when the NPC is mark_dirty()'d.
+    """
+
+    def __init__(self, id2txt: Dict[int, Dict[str, Any]], owner: Optional[str], revision: int):
+        self.id2txt   = id2txt
+        self.owner    = owner
+        self.revision = revision
+        self.ids = np.zeros(0, dtype="int64")
+        self.ts  = np.zeros(0, dtype="float32")
+        self.imp = np.zeros(0, dtype="float32")
+        self.own = np.zeros(0, dtype=bool)
+        self._extend(list(id2txt.items()))
+
+    def _extend(self, items) -> None:
+        owner = self.owner
+        self.ids = np.concatenate([self.ids, np.array([i for i, _ in items], dtype="int64")])
+        self.ts  = np.concatenate([self.ts,  np.array([e.get("timestamp", 0) for _, e in items], dtype="float32")])
+        self.imp = np.concatenate([self.imp, np.array([e.get("importance", DEFAULT_IMPORTANCE) for _, e in items],
+                                                      dtype="float32")])
+        self.own = np.concatenate([self.own, np.array([e.get("npc_id", owner) == owner for _, e in items], dtype=bool)])
+        self._order  = np.argsort(self.ids, kind="stable")
+        self._sorted = self.ids[self._order]
+
+    def refresh(self) -> None:
+        grown = len(self.id2txt) - len(self.ids)
+        if grown > 0:
+            self._extend(list(islice(reversed(self.id2txt.items()), grown))[::-1])
+
+    def rows(self, ids: np.ndarray) -> np.ndarray:
+        """ Row of each id, -1 where the id map has no entry. """
+        if not len(self.ids):
+            return np.full(len(ids), -1, dtype="int64")
+        pos = np.minimum(np.searchsorted(self._sorted, ids), len(self._sorted) - 1)
+        return np.where(self._sorted[pos] == ids, self._order[pos], -1)
+
+
+_meta_cache: "OrderedDict[int, _Meta]" = OrderedDict()
+_META_CACHE_SIZE = 1024
+
+
+def _meta_for(npc: Dict[str, Any]) -> _Meta:
+    id2txt   = npc.get("faiss_id_to_memory_text", {})
+    revision = npc.get("revision", 0)
+    meta = _meta_cache.get(id(id2txt))
+    if (meta is None or meta.id2txt is not id2txt or meta.revision != revision
+            or len(id2txt) < len(meta.ids)):
+        meta = _Meta(id2txt, npc.get("npc_id"), revision)
+    else:
+        meta.refresh()
+    _meta_cache[id(id2txt)] = meta
+    _meta_cache.move_to_end(id(id2txt))
+    while len(_meta_cache) > _META_CACHE_SIZE:
+        _meta_cache.popitem(last=False)
+    return meta
+
+
+def recall(npc: Dict[str, Any], query: np.ndarray, now: int, k: int = 3,
+           scorer: Optional[Scorer] = None, budget_ms: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    The k memories of `npc` that score best against `query` (a normalized
+    (1, dim) embedding), best first:
+      [{"memory_id", "text", "score", "similarity", "recency", "importance"}]
+
+    Candidates come from two ends: the nearest neighbours by similarity
+    (FAISS) and the most recently added memories (the tail of the index,
+    scored in NumPy). Both pools widen each round until no unseen memory
+    could still make the top k (Scorer.bound on the last similarity fetched
+    plus the newest unseen timestamp and highest unseen importance), the
+    whole index has been seen, or `budget_ms` runs out.
+
+    Callers hold MEMORY_LOCK (a deferred memory job may be adding to the index).
+    """
+    from persistence import _index_vectors
+
+    scorer    = scorer or DEFAULT_SCORER
+    budget_ms = RECALL_BUDGET_MS if budget_ms is None else budget_ms
+    index     = npc.get("faiss_index")
+    if index is None or index.ntotal == 0 or k <= 0:
+        return []
+    meta   = _meta_for(npc)
+    query  = np.asarray(query, dtype="float32").reshape(1, -1)
+    ntotal = index.ntotal
+
+    t0 = time.perf_counter()
+    fetch = min(ntotal, OVERFETCH * k)
+    while True:
+        t_round = time.perf_counter()
+        with span("faiss_search", k=fetch):
+            D, I = index.search(query, fetch)
+        keep = I[0] >= 0
+        ids, sims = I[0][keep], D[0][keep]
+        tail = _index_vectors(index, ntotal - fetch)
+        if tail is not None and len(tail[0]):
+            ids  = np.concatenate([ids, tail[0]])
+            sims = np.concatenate([sims, (tail[1] @ query[0]).astype("float32")])
+        ids, first = np.unique(ids, return_index=True)
+        sims = sims[first]
+
+        rows = meta.rows(ids)
+        ok = rows >= 0
+        ok[ok] = meta.own[rows[ok]]
+        ids, sims, rows = ids[ok], sims[ok], rows[ok]
+        ages = now - meta.ts[rows]
+        importance = meta.imp[rows]
+        scores = scorer.score(sims, ages, importance)
+        top = np.argsort(-scores, kind="stable")[:k]
+
+        if fetch >= ntotal or len(I[0]) < fetch or keep.sum() < fetch:
+            break
+        unseen = meta.own.copy()
+        unseen[rows] = False
+        if not unseen.any():
+            break
+        bound = scorer.bound(float(D[0][-1]), now - meta.ts[unseen].max(), meta.imp[unseen].max())
+        if len(top) == k and scores[top[-1]] >= bound:
+            break       # nothing unseen can overtake the k-th
+        elapsed = time.perf_counter() - t0
+        if 1000 * (elapsed + GROWTH * (time.perf_counter() - t_round)) > budget_ms:
+            _recall_budget.inc()
+            break
+        fetch = min(ntotal, fetch * GROWTH)
+    _recall_fetched.observe(fetch)
+
+    recency = scorer.recency_of(ages)
+    return [{"memory_id":  int(ids[j]),
+             "text":       meta.id2txt[int(ids[j])]["text"],
+             "score":      float(scores[j]),
+             "similarity": float(sims[j]),
+             "recency":    float(recency[j]),
+             "importance": float(importance[j])}
+            for j in top]
@@ -0,0 +1,169 @@
+# memory/tiering.py
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from utils import metrics
+
+# An NPC's index is upgraded in the background once it holds this many vectors:
+#   flat  (IndexFlatIP, exact)                      below NPC_TIER_HNSW_AT
+#   hnsw  (IndexHNSWFlat, graph search on raw vectors)  from NPC_TIER_HNSW_AT
+#   ivfpq (IndexIVFPQ, re-ranked on 8-bit vectors)  from NPC_TIER_IVFPQ_AT
+# 0 disables a tier. Defaults from benchmarks/tiering_bench.py (dim 384, recall@3
+# >= 0.98 throughout): flat costs ~1 ms/query at 10k and ~21 ms at 100k, where
+# HNSW answers in <0.4 ms but takes ~170 MB and IVF-PQ ~45 MB.
+TIER_HNSW_AT  = int(os.environ.get("NPC_TIER_HNSW_AT", "10000"))
+TIER_IVFPQ_AT = int(os.environ.get("NPC_TIER_IVFPQ_AT", "100000"))
+TIERS = ("flat", "hnsw", "ivfpq")
+
+HNSW_M               = 32
+HNSW_EF_CONSTRUCTION = 40
+HNSW_EF_SEARCH       = int(os.environ.get("NPC_HNSW_EF_SEARCH", "64"))
+PQ_BYTES             = 48       # bytes per vector (8-bit sub-quantizers)
+IVF_NPROBE           = int(os.environ.get("NPC_IVF_NPROBE", "16"))
+# PQ scores alone lose near-ties (recall@3 ~0.5); the best k * REFINE_K_FACTOR
+# are re-scored on 8-bit scalar-quantized copies (still ~3x smaller than flat)
+REFINE_K_FACTOR      = 16
+
+_upgrades = metrics.counter("npc_index_upgrades_total", "Background NPC index tier upgrades", ("tier",))
+_upgrade_seconds = metrics.histogram("npc_index_upgrade_seconds", "Time to build an upgraded NPC index",
+                                     buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+
+_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-tier")
+_pending: Dict[int, Any] = {}           # id(npc) → future of its upgrade
+_pending_lock = threading.Lock()
+
+
+def tier_of(idx) -> Optional[str]:
+    """ "flat", "hnsw" or "ivfpq" for an NPC index (None if there is none). """
+    import faiss
+    if idx is None:
+        return None
+    if not isinstance(idx, faiss.Index):
+        return "flat"       # MappedIndex / OwnerIndexView: flat vectors
+    inner = faiss.downcast_index(idx.index) if isinstance(idx, faiss.IndexIDMap) else idx
+    if isinstance(inner, faiss.IndexRefine):
+        inner = faiss.downcast_index(inner.base_index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivfpq"
+    return "flat"
+
+
+def target_tier(n: int) -> str:
+    if TIER_IVFPQ_AT and n >= TIER_IVFPQ_AT:
+        return "ivfpq"
+    if TIER_HNSW_AT and n >= TIER_HNSW_AT:
+        return "hnsw"
+    return "flat"
+
+
+def configure(idx, tier: Optional[str]):
+    """ Apply search-time parameters to an index of `tier` (after a build or load). """
+    import faiss
+    if tier in (None, "flat") or not isinstance(idx, faiss.IndexIDMap):
+        return idx
+    inner = faiss.downcast_index(idx.index)
+    if tier == "hnsw" and isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = HNSW_EF_SEARCH
+    elif tier == "ivfpq" and isinstance(inner, faiss.IndexRefine):
+        inner.k_factor = REFINE_K_FACTOR
+        faiss.downcast_index(inner.base_index).nprobe = IVF_NPROBE
+    return idx
+
+
+def build_index(tier: str, ids: np.ndarray, vecs: np.ndarray):
+    """ A new IndexIDMap of `tier` holding (ids, vecs). """
+    import faiss
+    d = vecs.shape[1]
+    if tier == "hnsw":
+        inner = faiss.IndexHNSWFlat(d, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif tier == "ivfpq":
+        nlist = max(16, min(65536, 4 * int(np.sqrt(len(vecs)))))
+        m = max(b for b in range(1, PQ_BYTES + 1) if d % b == 0)
+        nbits = 8 if len(vecs) >= 256 else max(1, int(np.log2(len(vecs))))    # PQ needs 2**nbits points
+        ivf = faiss.IndexIVFPQ(faiss.IndexFlatIP(d), d, nlist, m, nbits, faiss.METRIC_INNER_PRODUCT)
+        # thresholds keep real training sets large; don't warn on small ones (tests)
+        ivf.cp.min_points_per_centroid = ivf.pq.cp.min_points_per_centroid = 1
+        inner = faiss.IndexRefine(ivf, faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit,
+                                                                  faiss.METRIC_INNER_PRODUCT))
+        train = vecs if len(vecs) <= 64 * nlist else vecs[np.random.default_rng(0).choice(len(vecs), 64 * nlist, replace=False)]
+        inner.train(np.ascontiguousarray(train, dtype="float32"))
+    else:
+        inner = faiss.IndexFlatIP(d)
+    idx = configure(faiss.IndexIDMap(inner), tier)
+    if len(ids):
+        idx.add_with_ids(np.ascontiguousarray(vecs, dtype="float32"), np.asarray(ids, dtype="int64"))
+    return idx
+
+
+def maybe_upgrade(npc: Dict[str, Any]) -> bool:
+    """
+    Schedule a background upgrade if the NPC's index has outgrown its tier.
+    Cheap enough to call after every add; returns True if one was scheduled.
+    """
+    from memory.world_index import OwnerIndexView
+    idx = npc.get("faiss_index")
+    if idx is None or isinstance(idx, OwnerIndexView):
+        return False        # a slice of the world index is never tiered
+    tier = target_tier(idx.ntotal)
+    current = tier_of(idx)
+    if TIERS.index(tier) <= TIERS.index(current):
+        return False
+    with _pending_lock:
+        if id(npc) in _pending:
+            return False
+        _pending[id(npc)] = _pool.submit(_upgrade, npc, tier)
+    return True
+
+
+def _upgrade(npc: Dict[str, Any], tier: str) -> None:
+    from agents.memory_queue import MEMORY_LOCK
+    from persistence import _index_vectors, mark_dirty
+
+    try:
+        # 1) Snapshot the vectors (adds aren't safe while another thread reads)
+        with MEMORY_LOCK:
+            old = npc["faiss_index"]
+            revision = npc.get("revision", 0)
+            arrays = _index_vectors(old)
+        if arrays is None:
+            return
+        n0 = len(arrays[0])
+
+        # 2) Build off-lock; ticks keep adding to the old index meanwhile
+        t0 = time.perf_counter()
+        new = build_index(tier, *arrays)
+
+        # 3) Catch up on what was added during the build, then swap
+        with MEMORY_LOCK:
+            if npc["faiss_index"] is not old or npc.get("revision", 0) != revision:
+                return      # rewritten meanwhile (consolidation, reset); the next add retries
+            ids, vecs = _index_vectors(old, n0)
+            if len(ids):
+                new.add_with_ids(vecs, ids)
+            mark_dirty(npc)     # before the swap: the save must rewrite this index file
+            npc["faiss_index"] = new
+        _upgrade_seconds.observe(time.perf_counter() - t0)
+        _upgrades.inc(tier=tier)
+        print(f"🗂  {npc.get('npc_id')}: memory index upgraded to {tier} ({new.ntotal} vectors)")
+    except Exception as e:
+        print(f"⚠️  {npc.get('npc_id')}: index upgrade to {tier} failed: {e}")
+    finally:
+        with _pending_lock:
+            _pending.pop(id(npc), None)
+
+
+def wait_for_upgrades() -> None:
+    """ Block until scheduled upgrades have finished (tests, benchmarks, shutdown). """
+    with _pending_lock:
+        futures = list(_pending.values())
+    for f in futures:
+        f.exception()
@@ -0,0 +1,341 @@
+# memory/world_index.py
+
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils import metrics
+from utils.tracing import span
+
+# "per_npc" (default): every NPC owns an IndexIDMap(IndexFlatIP) (main.init_fresh_state).
+# "world":             all NPCs of a world share one WorldMemoryIndex; each NPC's
+#                      "faiss_index" becomes an OwnerIndexView onto it.
+MEMORY_INDEX_MODE = os.environ.get("NPC_MEMORY_INDEX", "per_npc")
+
+# Global vector id = owner partition << OWNER_SHIFT | the NPC's own memory id
+OWNER_SHIFT = 40
+_LOCAL_MASK = (1 << OWNER_SHIFT) - 1
+
+_searches = metrics.counter("npc_world_index_searches_total", "World memory index searches", ("scope",))
+
+
+def global_id(owner: int, mid: int) -> int:
+    return (owner << OWNER_SHIFT) | mid
+
+
+def split_id(gid: int) -> Tuple[int, int]:
+    return gid >> OWNER_SHIFT, gid & _LOCAL_MASK
+
+
+class WorldMemoryIndex:
+    """
+    One vector index for every NPC memory in a world.
+
+    Layout: an IndexIVFFlat (inner product) whose inverted lists are used
+    as partitions, one per NPC, instead of k-means cells. Vectors are added
+    to their owner's list directly and an NPC's query probes only that list,
+    so it costs O(that NPC's memories) and always returns a full top-k of
+    the NPC's own memories. Cross-NPC queries probe every list.
+
+    Metadata: the owner is encoded in the vector id (see global_id) and the
+    memory's timestamp is kept alongside, for time-restricted queries.
+
+    The partition count grows by rebuilding into an index twice as large
+    (faiss can't resize ArrayInvertedLists in place).
+    """
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.d = dim
+        self._lock = threading.RLock()
+        self._owners: Dict[str, int] = {}       # npc_id → partition
+        self._names: List[str] = []             # partition → npc_id
+        self._timestamps: Dict[int, int] = {}   # global id → timestamp
+        self._index = self._new_index(capacity)
+
+    def _new_index(self, nlist: int):
+        import faiss
+        index = faiss.IndexIVFFlat(faiss.IndexFlatIP(self.d), self.d, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.is_trained = True     # partitions are assigned explicitly, never trained
+        return index
+
+    @property
+    def ntotal(self) -> int:
+        return self._index.ntotal
+
+    @property
+    def owners(self) -> List[str]:
+        return list(self._names)
+
+    # ── owners ───────────────────────────────────────────────
+    def owner_code(self, npc_id: str) -> int:
+        with self._lock:
+            code = self._owners.get(npc_id)
+            if code is None:
+                code = len(self._names)
+                if code >= self._index.nlist:
+                    self._grow(2 * self._index.nlist)
+                self._owners[npc_id] = code
+                self._names.append(npc_id)
+            return code
+
+    def _grow(self, nlist: int) -> None:
+        from faiss.contrib.ivf_tools import add_preassigned
+        bigger = self._new_index(nlist)
+        for code in range(len(self._names)):
+            ids, vecs = self._list_arrays(code)
+            if len(ids):
+                add_preassigned(bigger, vecs, np.full(len(ids), code, dtype="int64"), ids=ids)
+        self._index = bigger
+
+    def _list_arrays(self, code: int, start: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        import faiss
+        invlists = self._index.invlists
+        n = invlists.list_size(code)
+        if n <= start:
+            return np.zeros(0, dtype="int64"), np.zeros((0, self.d), dtype="float32")
+        ids   = faiss.rev_swig_ptr(invlists.get_ids(code), n)[start:].copy()
+        codes = faiss.rev_swig_ptr(invlists.get_codes(code), n * self.d * 4)[start * self.d * 4:]
+        vecs  = np.frombuffer(codes.tobytes(), dtype="float32").reshape(n - start, self.d)
+        return ids.astype("int64"), vecs
+
+    # ── per-owner operations ─────────────────────────────────
+    def add(self, npc_id: str, x: np.ndarray, mids: Iterable[int],
+            timestamps: Optional[Iterable[int]] = None) -> None:
+        from faiss.contrib.ivf_tools import add_preassigned
+        x = np.ascontiguousarray(x, dtype="float32").reshape(-1, self.d)
+        mids = [int(m) for m in mids]
+        with self._lock:
+            code = self.owner_code(npc_id)
+            gids = np.array([global_id(code, m) for m in mids], dtype="int64")
+            add_preassigned(self._index, x, np.full(len(gids), code, dtype="int64"), ids=gids)
+            if timestamps is not None:
+                for gid, ts in zip(gids.tolist(), timestamps):
+                    self._timestamps[gid] = int(ts)
+
+    def size(self, npc_id: str) -> int:
+        code = self._owners.get(npc_id)
+        return 0 if code is None else self._index.invlists.list_size(code)
+
+    def arrays(self, npc_id: str, start: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """ (local ids, vectors) of one NPC from list position `start` on, in insertion order. """
+        with self._lock:
+            code = self._owners.get(npc_id)
+            if code is None:
+                return np.zeros(0, dtype="int64"), np.zeros((0, self.d), dtype="float32")
+            ids, vecs = self._list_arrays(code, start)
+            return ids & _LOCAL_MASK, vecs
+
+    def _search_lists(self, x: np.ndarray, k: int, codes: List[int]):
+        """ Scan exactly the partitions `codes` (caller holds the lock: nprobe is index-wide). """
+        x  = np.ascontiguousarray(x, dtype="float32").reshape(-1, self.d)
+        Iq = np.tile(np.array(codes, dtype="int64"), (len(x), 1))
+        Dq = np.zeros(Iq.shape, dtype="float32")
+        self._index.nprobe = len(codes)
+        return self._index.search_preassigned(x, k, Iq, Dq)
+
+    def search_owner(self, npc_id: str, x: np.ndarray, k: int):
+        """ Top-k of one NPC's own memories; ids are that NPC's local memory ids. """
+        _searches.inc(scope="owner")
+        with self._lock:
+            code = self._owners.get(npc_id)
+            if code is None:
+                x = np.asarray(x).reshape(-1, self.d)
+                return (np.full((len(x), k), -np.finfo("float32").max, dtype="float32"),
+                        np.full((len(x), k), -1, dtype="int64"))
+            D, I = self._search_lists(x, k, [code])
+        return D, np.where(I >= 0, I & _LOCAL_MASK, -1)
+
+    def search_all(self, x: np.ndarray, k: int):
+        """ Top-k across every NPC; ids are global (see split_id). """
+        _searches.inc(scope="world")
+        with self._lock:
+            if not self._names:
+                x = np.asarray(x).reshape(-1, self.d)
+                return (np.full((len(x), k), -np.finfo("float32").max, dtype="float32"),
+                        np.full((len(x), k), -1, dtype="int64"))
+            return self._search_lists(x, k, list(range(len(self._names))))
+
+    def remove(self, npc_id: str, mids: Iterable[int]) -> int:
+        import faiss
+        with self._lock:
+            code = self._owners.get(npc_id)
+            if code is None:
+                return 0
+            gids = np.array([global_id(code, int(m)) for m in mids], dtype="int64")
+            for gid in gids.tolist():
+                self._timestamps.pop(gid, None)
+            return self._index.remove_ids(faiss.IDSelectorBatch(gids))
+
+    def who_knows(self, x: np.ndarray, k: int = 10, since: Optional[int] = None,
+                  exclude: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """
+        The memories across all NPCs most similar to query vector `x`, best
+        first: [{"npc_id", "memory_id", "score", "timestamp"}]. `since` keeps
+        only memories stamped at or after that time; `exclude` skips owners.
+        """
+        exclude = set(exclude)
+        fetch = k
+        while True:
+            D, I = self.search_all(x, fetch)
+            hits = []
+            for score, gid in zip(D[0], I[0]):
+                if gid < 0:
+                    continue
+                code, mid = split_id(int(gid))
+                npc_id = self._names[code]
+                ts = self._timestamps.get(int(gid))
+                if npc_id in exclude or (since is not None and (ts is None or ts < since)):
+                    continue
+                hits.append({"npc_id": npc_id, "memory_id": mid, "score": float(score), "timestamp": ts})
+            # filtered out too many → widen the search (bounded by the index size)
+            if len(hits) >= k or fetch >= self.ntotal:
+                return hits[:k]
+            fetch = min(self.ntotal, fetch * 4)
+
+    def __deepcopy__(self, memo):
+        # debug printing deep-copies the state; the shared index isn't copied
+        return self
+
+
+class OwnerIndexView:
+    """
+    One NPC's slice of a WorldMemoryIndex, shaped like the per-NPC faiss
+    index it replaces (ntotal, d, search, add_with_ids, remove_ids), so the
+    agents and persistence work unchanged in either mode.
+    """
+
+    def __init__(self, world: WorldMemoryIndex, npc: Dict[str, Any]):
+        self.world  = world
+        self.npc    = npc
+        self.npc_id = npc["npc_id"]
+        world.owner_code(self.npc_id)
+
+    @property
+    def ntotal(self) -> int:
+        return self.world.size(self.npc_id)
+
+    @property
+    def d(self) -> int:
+        return self.world.d
+
+    def search(self, x, k: int):
+        return self.world.search_owner(self.npc_id, x, k)
+
+    def add_with_ids(self, x, ids) -> None:
+        id_map = self.npc.get("faiss_id_to_memory_text", {})
+        ids = [int(i) for i in np.asarray(ids).reshape(-1)]
+        timestamps = [(id_map.get(i) or {}).get("timestamp", 0) for i in ids]
+        self.world.add(self.npc_id, x, ids, timestamps)
+
+    def remove_ids(self, ids) -> int:
+        return self.world.remove(self.npc_id, np.asarray(ids).reshape(-1).tolist())
+
+    def arrays(self, start: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        return self.world.arrays(self.npc_id, start)
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def world_index_of(state: Dict[str, Any]) -> Optional[WorldMemoryIndex]:
+    for npc in state.get("npc_states", {}).values():
+        idx = npc.get("faiss_index")
+        if isinstance(idx, OwnerIndexView):
+            return idx.world
+    return None
+
+
+def attach_world_index(state: Dict[str, Any]) -> WorldMemoryIndex:
+    """
+    Move every NPC's vectors into one WorldMemoryIndex and replace each
+    npc["faiss_index"] with a view onto it. Saves stay per-NPC, so a world
+    can be loaded in either mode.
+    """
+    from persistence import _index_arrays
+    from utils.embedding_service import EMBEDDING_DIMENSION
+
+    world = world_index_of(state)
+    if world is not None:
+        return world
+    dims = [npc["faiss_index"].d for npc in state["npc_states"].values() if npc.get("faiss_index") is not None]
+    world = WorldMemoryIndex(dims[0] if dims else EMBEDDING_DIMENSION,
+                             capacity=max(64, 2 * len(state["npc_states"])))
+    for npc_id, npc in state["npc_states"].items():
+        idx = npc.get("faiss_index")
+        if idx is None:
+            continue    # NPCs without memory search stay that way
+        arrays = _index_arrays(idx) if idx.ntotal else None
+        if idx.ntotal and arrays is None:
+            print(f"⚠️  {npc_id}: index isn't flat, kept out of the world index")
+            continue
+        view = OwnerIndexView(world, npc)
+        if arrays is not None:
+            ids, vecs = arrays
+            id_map = npc["faiss_id_to_memory_text"]
+            world.add(npc_id, vecs, ids.tolist(),
+                      [(id_map.get(int(i)) or {}).get("timestamp", 0) for i in ids])
+        npc["faiss_index"] = view
+    return world
+
+
+def attach_if_enabled(state: Dict[str, Any]) -> Dict[str, Any]:
+    if MEMORY_INDEX_MODE == "world":
+        attach_world_index(state)
+    return state
+
+
+def _npc_hits(npc_id: str, npc: Dict[str, Any], idx, x: np.ndarray, k: int,
+              since: Optional[int]) -> List[Dict[str, Any]]:
+    """ who_knows over one NPC's own index: its top-k at or after `since`, widening the search as needed. """
+    id_map = npc["faiss_id_to_memory_text"]
+    fetch = min(k, idx.ntotal)
+    while True:
+        D, I = idx.search(x, fetch)
+        hits = []
+        for score, mid in zip(D[0], I[0]):
+            if mid < 0:
+                continue
+            ts = (id_map.get(int(mid)) or {}).get("timestamp")
+            if since is not None and (ts is None or ts < since):
+                continue
+            hits.append({"npc_id": npc_id, "memory_id": int(mid), "score": float(score), "timestamp": ts})
+        # filtered out too many → widen the search (bounded by the index size)
+        if len(hits) >= k or fetch >= idx.ntotal:
+            return hits[:k]
+        fetch = min(idx.ntotal, fetch * 4)
+
+
+def who_knows(state: Dict[str, Any], text: str, k: int = 10, since: Optional[int] = None,
+              exclude: Iterable[str] = ()) -> List[Dict[str, Any]]:
+    """
+    Cross-NPC recall ("who knows about the theft?"): the k memories across
+    the world closest to `text`, each with its owner, text, score and time.
+    Uses the world index when attached, otherwise searches every NPC's index.
+    """
+    from agents.memory_queue import MEMORY_LOCK
+    from utils.embedding_service import get_embedding_service
+
+    embedder = get_embedding_service()
+    if not embedder.available:
+        return []
+    x = embedder.encode(text)
+
+    world = world_index_of(state)
+    exclude = set(exclude)
+    with MEMORY_LOCK, span("faiss_search", scope="who_knows"):
+        hits = world.who_knows(x, k, since=since, exclude=exclude) if world is not None else []
+        # NPCs with their own index (per_npc mode, or kept out of the world index)
+        for npc_id, npc in state["npc_states"].items():
+            idx = npc.get("faiss_index")
+            if npc_id in exclude or idx is None or isinstance(idx, OwnerIndexView) or idx.ntotal == 0:
+                continue
+            hits.extend(_npc_hits(npc_id, npc, idx, x, k, since))
+    hits.sort(key=lambda h: h["score"], reverse=True)
+    hits = hits[:k]
+
+    for h in hits:
+        entry = state["npc_states"][h["npc_id"]]["faiss_id_to_memory_text"].get(h["memory_id"]) or {}
+        h["text"] = entry.get("text")
+    return hits
@@ -0,0 +1,121 @@
+# narrative_engine.py
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from utils import metrics
+
+# Matches remembered per dependency group (distinct combinations of the fields it reads)
+MEMO_SIZE = 1024
+
+_evaluations = metrics.counter("npc_narrative_rule_evaluations_total",
+                               "Narrative rule conditions evaluated (memo misses)")
+
+
+def _freeze(value: Any) -> Hashable:
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return json.dumps(value, sort_keys=True, default=str)
+
+
+class _Group:
+    """ Rules that read the same state fields, with their matches memoized by those fields' values. """
+
+    def __init__(self, depends: Tuple[str, ...]):
+        self.depends = depends
+        self.rules: List[Tuple[int, Callable]] = []     # (position in the rule list, when)
+        self.memo: "OrderedDict[Tuple, Optional[int]]" = OrderedDict()
+
+    def first_match(self, state: Dict[str, Any]) -> Optional[int]:
+        key = tuple(_freeze(state.get(f)) for f in self.depends)
+        if key in self.memo:
+            self.memo.move_to_end(key)
+            return self.memo[key]
+        first, evaluated = None, 0
+        for pos, when in self.rules:
+            evaluated += 1
+            if _holds(when, state):
+                first = pos
+                break
+        _evaluations.inc(evaluated)
+        self.memo[key] = first
+        if len(self.memo) > MEMO_SIZE:
+            self.memo.popitem(last=False)
+        return first
+
+
+def _holds(when: Callable, state: Dict[str, Any]) -> bool:
+    try:
+        return bool(when(state))
+    except Exception:
+        # If a rule's condition crashes for missing keys, it doesn't match
+        return False
+
+
+class RuleEngine:
+    """
+    Picks the first matching narrative rule (in list order) without
+    evaluating every rule on every tick.
+
+    A rule declares the state fields its "when" reads:
+        {"when": ..., "depends": ("time_of_day", "location"), ...}
+    Rules with the same dependencies form a group, and each group memoizes
+    its first match per combination of those fields' values, so a
+    condition only runs again when a field it reads has a value it hasn't
+    seen. A tick then costs one lookup per group, not per rule: writers
+    can add hundreds of rules over a handful of fields.
+    depends=() marks a constant rule (evaluated once); a rule without
+    "depends" is evaluated every tick, as before.
+    """
+
+    def __init__(self, rules: Sequence[Dict[str, Any]]):
+        self.rules = list(rules)
+        groups: Dict[Tuple[str, ...], _Group] = {}
+        self.volatile: List[int] = []
+        for pos, rule in enumerate(self.rules):
+            if "depends" not in rule:
+                self.volatile.append(pos)
+                continue
+            depends = tuple(sorted(set(rule["depends"])))
+            groups.setdefault(depends, _Group(depends)).rules.append((pos, rule["when"]))
+        self.groups = list(groups.values())
+        self._lock = threading.Lock()
+
+    def first_match(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """ The first rule whose condition holds for `state`, or None. """
+        with self._lock:
+            best = min((p for p in (g.first_match(state) for g in self.groups) if p is not None),
+                       default=None)
+        for pos in self.volatile:
+            if best is not None and pos > best:
+                break
+            _evaluations.inc()
+            if _holds(self.rules[pos]["when"], state):
+                best = pos
+                break
+        return self.rules[best] if best is not None else None
+
+    def clear(self) -> None:
+        """ Forget memoized matches (after changing what a rule's condition returns). """
+        with self._lock:
+            for g in self.groups:
+                g.memo.clear()
+
+
+_engine: Optional[RuleEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> RuleEngine:
+    """ The engine for narrative_rules.NARRATIVE_RULES, built on first use. """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from narrative_rules import NARRATIVE_RULES
+                _engine = RuleEngine(NARRATIVE_RULES)
+    return _engine
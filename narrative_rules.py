@@ -10,21 +10,26 @@ def is_festival_day(state):
 def always_true(state):
     return True
 
+# "depends" lists the state fields a rule's condition reads; narrative_engine
+# only re-evaluates it when one of them changes (see RuleEngine)
 NARRATIVE_RULES = [
     {
         "when": is_night_and_town_square,
+        "depends": ("time_of_day", "location"),
         "beat": "curfew_warning",
         "guidance": "The town guard is about to lock the gates. NPCs are uneasy. Mention the nighttime curfew.",
         "quest_id": "warn_venue_before_curfew"
     },
     {
         "when": is_festival_day,
+        "depends": ("current_event",),
         "beat": "festival_celebration",
         "guidance": "The Harvest Festival is in full swing. NPCs are celebrating around the bonfire—ask them for rumors.",
         "quest_id": "gather_festival_supplies"
     },
     {
         "when": always_true,
+        "depends": (),
         "beat": "nothing_special",
         "guidance": "",  # no guidance this turn
         "quest_id": None
@@ -1,71 +1,436 @@
 import os
+import copy
 import json
-from typing import Dict, Any
-import faiss
+import base64
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 
-def save_state(state: Dict[str, Any], dir_path: str):
+import numpy as np
+
+from utils import metrics
+from utils.tracing import span
+from utils.mapped_index import MappedIndex, unwrap_index
+from memory.world_index import OwnerIndexView, attach_if_enabled
+from memory.tiering import configure, maybe_upgrade, tier_of
+
+# Top-level fields that are persisted (snapshot and journal)
+TOP_FIELDS = (
+    "player_location",
+    "player_inventory",
+    "player_stats",
+    "world_chunks",
+    "active_quests",
+    "completed_quests",
+    "quest_history",
+    "last_event",
+    "event_params",
+    "response",
+    "simulation_time",
+    "time_of_day",
+    "weather",
+    "pending_quest",
+    "state_version",
+)
+# Per-NPC fields that are replaced wholesale when they change; memory, the
+# id map and the FAISS index are journaled as appends instead. quest_scan is
+# the quest trigger watermark (agents/quest_triggers.py); location is the
+# NPC's world chunk (spatial_index.py).
+NPC_FIELDS = ("npc_id", "personality", "emotion_state", "inventory", "quest_scan", "location")
+
+JOURNAL_FILE = "journal.log"
+# A journal this large (bytes or records) is compacted into the snapshot in the background
+JOURNAL_COMPACT_BYTES   = int(os.environ.get("NPC_JOURNAL_COMPACT_BYTES", str(8 * 1024 * 1024)))
+JOURNAL_COMPACT_RECORDS = int(os.environ.get("NPC_JOURNAL_COMPACT_RECORDS", "500"))
+# fsync every journal record (survives power loss, not just a process crash)
+JOURNAL_FSYNC = os.environ.get("NPC_JOURNAL_FSYNC", "0") == "1"
+
+_journal_records     = metrics.counter("npc_journal_records_total", "Per-tick deltas appended to save journals")
+_journal_bytes       = metrics.counter("npc_journal_bytes_total", "Bytes appended to save journals")
+_journal_compactions = metrics.counter("npc_journal_compactions_total", "Journals folded into their snapshot")
+_snapshots           = metrics.counter("npc_snapshots_total", "Full state snapshots written")
+_files_skipped       = metrics.counter("npc_save_files_skipped_total", "Unchanged save files not rewritten")
+_bytes_written       = metrics.counter("npc_save_bytes_written_total", "Bytes written to save directories")
+_save_bytes          = metrics.histogram("npc_save_bytes", "Bytes written per save",
+                                         buckets=(256, 1024, 4096, 16384, 65536, 262144,
+                                                  1048576, 4194304, 16777216, 67108864))
+
+
+def mark_dirty(npc: Dict[str, Any]) -> None:
     """
-    Dump out:
-     - state.json (all primitive fields + NPCSubState without the faiss_index)
-     - one .index file per NPC for their FAISS index
+    Flag an NPC whose memory / index was changed in place (not just appended
+    to), so the next save rewrites its files and can't journal it as a delta.
     """
-    os.makedirs(dir_path, exist_ok=True)
+    npc["revision"] = npc.get("revision", 0) + 1
 
-    # 1) Build a JSON‐serializable copy of the state
-    serial = {}
-    # copy top‐level primitive fields
-    for k in (
-        "player_location",
-        "player_inventory",
-        "player_stats",
-        "world_chunks",
-        "active_quests",
-        "completed_quests",
-        "quest_history",
-        "last_event",
-        "event_params",
-        "response",
-        "simulation_time",
-        "time_of_day",
-        "weather",
-        "pending_quest",
-    ):
-        serial[k] = state.get(k)
-
-    # copy npc_states without the faiss_index object
-    serial["npc_states"] = {}
+
+def _npc_signature(npc: Dict[str, Any]) -> Tuple:
+    """ Cheap stand-in for "has this NPC's index changed": appends move ntotal / next id. """
+    idx = npc.get("faiss_index")
+    return (idx.ntotal if idx is not None else -1, npc["next_faiss_id"], npc.get("revision", 0))
+
+
+def _state_signature(state: Dict[str, Any], seq: int) -> Tuple:
+    top  = tuple(_dump(state.get(k)) for k in TOP_FIELDS)
+    npcs = tuple((npc_id, len(npc["memory"]), _npc_signature(npc),
+                  tuple(_dump(npc.get(f)) for f in NPC_FIELDS))
+                 for npc_id, npc in state["npc_states"].items())
+    return (seq, top, npcs)
+
+
+def _atomic_write(path: str, write) -> int:
+    """
+    write(tmp_path) then rename over `path`, so a crash leaves either the
+    old file or the new one, never a torn one. Returns the bytes written.
+    """
+    tmp = path + ".tmp"
+    write(tmp)
+    with open(tmp, "rb+") as f:
+        os.fsync(f.fileno())
+    size = os.path.getsize(tmp)
+    os.replace(tmp, path)
+    return size
+
+
+def _fsync_dir(dir_path: str) -> None:
+    """ Make the renames durable (no-op where directories can't be opened). """
+    try:
+        fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _index_arrays(idx, start: int = 0):
+    """
+    (ids, float32 vectors) stored in an IndexIDMap-over-flat index from
+    position `start` on, or None if the index isn't of that kind.
+    """
+    import faiss
+    if isinstance(idx, OwnerIndexView):
+        return idx.arrays(start)
+    if isinstance(idx, MappedIndex):
+        mapped = idx.arrays()
+        if mapped is not None:
+            ids, vecs = mapped
+            return np.asarray(ids[start:], dtype="int64"), np.asarray(vecs[start:], dtype="float32")
+        idx = idx.materialize()
+    if not isinstance(idx, faiss.IndexIDMap):
+        return None
+    inner = faiss.downcast_index(idx.index)
+    if not isinstance(inner, faiss.IndexFlat):
+        return None
+    n    = idx.ntotal - start
+    vecs = inner.reconstruct_n(start, n) if n else np.zeros((0, idx.d), dtype="float32")
+    ids  = np.array([idx.id_map.at(i) for i in range(start, idx.ntotal)], dtype="int64")
+    return ids, np.ascontiguousarray(vecs, dtype="float32")
+
+
+def _index_vectors(idx, start: int = 0):
+    """
+    Like _index_arrays, but also for tiered indexes that can reconstruct
+    their vectors by position (HNSW over raw vectors; IVF-PQ from its 8-bit
+    refine copies, approximately). None if the index can't.
+    """
+    import faiss
+    arrays = _index_arrays(idx, start)
+    if arrays is not None or not isinstance(idx, faiss.IndexIDMap):
+        return arrays
+    n = idx.ntotal - start
+    try:
+        vecs = idx.index.reconstruct_n(start, n) if n else np.zeros((0, idx.d), dtype="float32")
+    except RuntimeError:
+        return None
+    ids = faiss.vector_to_array(idx.id_map)[start:].astype("int64")
+    return ids, np.ascontiguousarray(vecs, dtype="float32")
+
+
+# ── snapshot formats ─────────────────────────────────────────
+#
+# "json":   state.json (pretty-printed) + <npc_id>.index per NPC (faiss.write_index)
+# "binary": state.bin (length-prefixed records, see below) + <npc_id>.vec.npy /
+#           <npc_id>.ids.npy per NPC, loaded with np.load(mmap_mode="r") into a
+#           MappedIndex so a large world opens in milliseconds and vectors
+#           page in on demand. NPCs whose index isn't flat fall back to .index.
+#
+# state.bin:  b"NPCSAVE\x01", then records of  u32 length + payload:
+#   1) header   JSON: persisted top-level fields, journal_seq, and per NPC
+#               its NPC_FIELDS, next_faiss_id and where its vectors live
+#   2) per NPC, in header order:
+#      a) memory   u32 count, count x u32 byte lengths, concatenated UTF-8 texts
+#      b) id map   u32 count, count x i64 ids, compact JSON array of the entries
+
+SAVE_FORMAT = os.environ.get("NPC_SAVE_FORMAT", "json")
+_MAGIC = b"NPCSAVE\x01"
+_U32 = struct.Struct("<I")
+_STATE_FILES = {"json": "state.json", "binary": "state.bin"}
+
+
+def has_save(dir_path: str) -> bool:
+    return _format_on_disk(dir_path) is not None
+
+
+def _format_on_disk(dir_path: str) -> Optional[str]:
+    for fmt, name in _STATE_FILES.items():
+        if os.path.exists(os.path.join(dir_path, name)):
+            return fmt
+    return None
+
+
+def _npc_files(dir_path: str, npc_id: str, fmt: str):
+    if fmt == "binary":
+        return (os.path.join(dir_path, f"{npc_id}.vec.npy"), os.path.join(dir_path, f"{npc_id}.ids.npy"))
+    return (os.path.join(dir_path, f"{npc_id}.index"),)
+
+
+def _pack_record(payload: bytes) -> bytes:
+    return _U32.pack(len(payload)) + payload
+
+
+def _pack_memory(memory) -> bytes:
+    encoded = [str(text).encode("utf-8") for text in memory]
+    lengths = np.array([len(b) for b in encoded], dtype="<u4")
+    return _U32.pack(len(encoded)) + lengths.tobytes() + b"".join(encoded)
+
+
+def _unpack_memory(r: "_Reader"):
+    n = r.u32()
+    lengths = np.frombuffer(r.raw(4 * n), dtype="<u4")
+    blob = r.raw(int(lengths.sum()))
+    ends = np.cumsum(lengths).tolist()
+    starts = [0] + ends[:-1]
+    return [blob[a:b].decode("utf-8") for a, b in zip(starts, ends)]
+
+
+def _pack_id_map(id_map) -> bytes:
+    ids = np.fromiter((int(k) for k in id_map), dtype="<i8", count=len(id_map))
+    entries = json.dumps(list(id_map.values()), separators=(",", ":"), default=str).encode("utf-8")
+    return _U32.pack(len(id_map)) + ids.tobytes() + entries
+
+
+def _unpack_id_map(r: "_Reader"):
+    n = r.u32()
+    ids = np.frombuffer(r.raw(8 * n), dtype="<i8").tolist()
+    entries = json.loads(r.raw(len(r.buf) - r.pos))
+    return dict(zip(ids, entries))
+
+
+class _Reader:
+    def __init__(self, buf: bytes, pos: int = 0):
+        self.buf = memoryview(buf)
+        self.pos = pos
+
+    def u32(self) -> int:
+        v = _U32.unpack_from(self.buf, self.pos)[0]
+        self.pos += 4
+        return v
+
+    def raw(self, n: int) -> bytes:
+        v = self.buf[self.pos:self.pos + n]
+        self.pos += n
+        return bytes(v)
+
+    def record(self) -> "_Reader":
+        n = self.u32()
+        r = _Reader(self.buf[self.pos:self.pos + n])
+        self.pos += n
+        return r
+
+
+def _serial_npc(npc: Dict[str, Any]) -> Dict[str, Any]:
+    sub = {f: npc.get(f) for f in NPC_FIELDS}
+    sub["next_faiss_id"] = npc["next_faiss_id"]
+    sub["tier"] = tier_of(npc.get("faiss_index"))
+    return sub
+
+
+def _npy_writer(arr: np.ndarray):
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+    return write
+
+
+def _index_writes(npc: Dict[str, Any], npc_id: str, dir_path: str, fmt: str) -> Tuple[List, Optional[str]]:
+    """
+    One NPC's vector files as [(path, write(tmp))] over copies taken now,
+    and how they're stored. Call with MEMORY_LOCK held for a live NPC.
+    """
+    import faiss
+    idx = npc.get("faiss_index")
+    if idx is None:
+        return [], None
+    if fmt == "binary":
+        arrays = _index_arrays(idx)
+        if arrays is not None:
+            ids, vecs = arrays
+            vec_path, ids_path = _npc_files(dir_path, npc_id, fmt)
+            return [(vec_path, _npy_writer(vecs)), (ids_path, _npy_writer(ids))], "npy"
+    path = os.path.join(dir_path, f"{npc_id}.index")
+    if isinstance(idx, OwnerIndexView):
+        # a slice of the world index: saved as a standalone per-NPC index
+        ids, vecs = idx.arrays()
+        real = _empty_index(idx.d)
+        if len(ids):
+            real.add_with_ids(vecs, ids)
+    else:
+        real = unwrap_index(idx)
+    data = faiss.serialize_index(real)
+
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            f.write(data.tobytes())
+    return [(path, write)], "index"
+
+
+def _capture_snapshot(state: Dict[str, Any], dir_path: str, seq: int = 0,
+                      written: Optional[Dict[str, Any]] = None, fmt: Optional[str] = None) -> Dict[str, Any]:
+    """
+    First half of _write_snapshot: decide which files changed and copy what
+    goes into them, without touching the disk. For a live state call it with
+    MEMORY_LOCK held (background memory jobs, consolidation and index
+    upgrades rewrite NPCs); _commit_snapshot then writes outside the lock.
+    """
+    fmt = fmt or _format_on_disk(dir_path) or SAVE_FORMAT
+    written = {} if written is None else written
+    same_fmt   = written.get("format") == fmt
+    npc_sigs   = written.get("npcs", {}) if same_fmt else {}
+    npc_stored = dict(written.get("stored", {})) if same_fmt else {}
+    plan = {"dir_path": dir_path, "fmt": fmt, "written": written, "npc_ids": list(state["npc_states"]),
+            "npcs": [], "skipped": 0, "state": None}
+
+    # 1) Each changed NPC's vectors
     for npc_id, npc in state["npc_states"].items():
-        serial["npc_states"][npc_id] = {
-            "npc_id":                  npc["npc_id"],
-            "personality":             npc["personality"],
-            "emotion_state":           npc["emotion_state"],
-            "inventory":               npc["inventory"],
-            "memory":                  npc["memory"],
-            "faiss_id_to_memory_text": npc["faiss_id_to_memory_text"],
-            "next_faiss_id":           npc["next_faiss_id"],
-        }
-
-    # 2) Write state.json
-    with open(os.path.join(dir_path, "state.json"), "w") as f:
-        json.dump(serial, f, indent=2)
-
-    # 3) Write each NPC's index
+        sig = _npc_signature(npc)
+        stored = npc_stored.get(npc_id)
+        if npc_sigs.get(npc_id) == sig and stored is not None and all(
+                os.path.exists(p) for p in _npc_files(dir_path, npc_id, "binary" if stored == "npy" else "json")):
+            plan["skipped"] += 1
+            continue
+        files, stored = _index_writes(npc, npc_id, dir_path, fmt)
+        plan["npcs"].append((npc_id, sig, stored, files))
+        npc_stored[npc_id] = stored
+
+    # 2) The state file (if anything in it changed)
+    path = os.path.join(dir_path, _STATE_FILES[fmt])
+    state_sig = _state_signature(state, seq)
+    if same_fmt and written.get("state") == state_sig and os.path.exists(path):
+        plan["skipped"] += 1
+        return plan
+
+    # A serializable copy of the state: top-level primitive fields, NPCs
+    # without the faiss_index object (memory lists and id maps copied, as
+    # they keep growing after the lock is released)
+    serial = copy.deepcopy({k: state.get(k) for k in TOP_FIELDS})
+    serial["journal_seq"] = seq
+    serial["npc_states"] = {}
+    lists = []
     for npc_id, npc in state["npc_states"].items():
-        idx = npc.get("faiss_index")
-        if idx is not None:
-            faiss.write_index(
-                idx,
-                os.path.join(dir_path, f"{npc_id}.index")
-            )
+        sub = copy.deepcopy(_serial_npc(npc))
+        memory, id_map = list(npc["memory"]), dict(npc["faiss_id_to_memory_text"])
+        if fmt == "binary":
+            sub["vectors"] = npc_stored.get(npc_id)
+            lists.append((memory, id_map))
+        else:
+            sub["memory"], sub["faiss_id_to_memory_text"] = memory, id_map
+        serial["npc_states"][npc_id] = sub
 
+    if fmt == "binary":
+        serial["format_version"] = 1
 
-def load_state(dir_path: str) -> Dict[str, Any]:
+        def dump(tmp):
+            header = json.dumps(serial, separators=(",", ":"), default=str).encode("utf-8")
+            with open(tmp, "wb") as f:
+                f.write(_MAGIC)
+                f.write(_pack_record(header))
+                for memory, id_map in lists:
+                    f.write(_pack_record(_pack_memory(memory)))
+                    f.write(_pack_record(_pack_id_map(id_map)))
+    else:
+        def dump(tmp):
+            with open(tmp, "w") as f:
+                json.dump(serial, f, indent=2)
+    plan["state"] = (path, state_sig, dump)
+    return plan
+
+
+def _commit_snapshot(plan: Dict[str, Any]) -> int:
+    """ Second half of _write_snapshot: write the captured files. Returns bytes written. """
+    dir_path, fmt, written = plan["dir_path"], plan["fmt"], plan["written"]
+    os.makedirs(dir_path, exist_ok=True)
+    if written.get("format") != fmt:
+        written.clear()
+        written["format"] = fmt
+    npc_sigs   = written.setdefault("npcs", {})
+    npc_stored = written.setdefault("stored", {})
+    bytes_out = 0
+    _files_skipped.inc(plan["skipped"])
+
+    for npc_id, sig, stored, files in plan["npcs"]:
+        for path, write in files:
+            bytes_out += _atomic_write(path, write)
+        npc_sigs[npc_id]   = sig
+        npc_stored[npc_id] = stored
+
+    if plan["state"] is not None:
+        path, state_sig, dump = plan["state"]
+        bytes_out += _atomic_write(path, dump)
+        written["state"] = state_sig
+        _remove_other_format(plan["npc_ids"], dir_path, fmt)
+
+    if bytes_out:
+        _fsync_dir(dir_path)
+    _snapshots.inc()
+    _bytes_written.inc(bytes_out)
+    return bytes_out
+
+
+def _write_snapshot(state: Dict[str, Any], dir_path: str, seq: int = 0,
+                    written: Optional[Dict[str, Any]] = None, fmt: Optional[str] = None) -> int:
     """
-    Reads state.json + each <npc_id>.index back into a SimulationState dict.
+    Dump out (see "snapshot formats" above):
+     - each NPC's FAISS vectors
+     - state.json / state.bin (all primitive fields + NPCSubState without the
+       faiss_index), written last and stamped with the last journal record it includes
+
+    `written` remembers the signature of what is already on disk; NPC vector
+    files (and the state file) whose signature hasn't changed are skipped.
+    Every file goes through a temp file + atomic rename. Switching format
+    removes the other format's files afterwards. Returns bytes written.
     """
+    return _commit_snapshot(_capture_snapshot(state, dir_path, seq, written, fmt))
+
+
+def _remove_other_format(npc_ids, dir_path: str, fmt: str) -> None:
+    for other, name in _STATE_FILES.items():
+        if other == fmt or not os.path.exists(os.path.join(dir_path, name)):
+            continue
+        for npc_id in npc_ids:
+            for p in _npc_files(dir_path, npc_id, other):
+                if p not in _npc_files(dir_path, npc_id, fmt) and os.path.exists(p):
+                    os.remove(p)
+        os.remove(os.path.join(dir_path, name))
+
+
+def _empty_index(dim: Optional[int] = None):
+    import faiss
+    from utils.embedding_service import EMBEDDING_DIMENSION
+    return faiss.IndexIDMap(faiss.IndexFlatIP(dim or EMBEDDING_DIMENSION))
+
+
+def _load_json(dir_path: str) -> Tuple[Dict[str, Any], int]:
+    import faiss
+
     # 1) Load JSON fields
     with open(os.path.join(dir_path, "state.json")) as f:
         serial = json.load(f)
+    seq = serial.pop("journal_seq", 0)
 
     # 2) Reconstruct SimulationState skeleton
     state: Dict[str, Any] = {
@@ -78,25 +443,452 @@ def load_state(dir_path: str) -> Dict[str, Any]:
         # load or init a FAISS index
         idx_file = os.path.join(dir_path, f"{npc_id}.index")
         if os.path.exists(idx_file):
-            idx = faiss.read_index(idx_file)
+            idx = configure(faiss.read_index(idx_file), npc_j.get("tier"))
         else:
             # fallback to an empty IP index
-            from workflows.npc_simulation_graph import EMBEDDING_DIMENSION
-            idx = faiss.IndexIDMap(faiss.IndexFlatIP(EMBEDDING_DIMENSION))
+            idx = _empty_index()
 
         # Force integer keys for faiss_id_to_memory_text
         mapping = npc_j["faiss_id_to_memory_text"]
         int_mapping = { int(k): v for k, v in mapping.items() }
 
-        state["npc_states"][npc_id] = {
-            "npc_id":                  npc_j["npc_id"],
-            "personality":             npc_j["personality"],
-            "emotion_state":           npc_j["emotion_state"],
-            "inventory":               npc_j["inventory"],
+        npc = {f: npc_j.get(f) for f in NPC_FIELDS}
+        npc.update({
             "memory":                  npc_j["memory"],
             "faiss_index":             idx,
             "faiss_id_to_memory_text": int_mapping,
             "next_faiss_id":           npc_j["next_faiss_id"],
-        }
+        })
+        state["npc_states"][npc_id] = npc
+
+    return state, seq
+
+
+def _load_binary(dir_path: str) -> Tuple[Dict[str, Any], int]:
+    import faiss
+
+    # 1) Header record
+    with open(os.path.join(dir_path, "state.bin"), "rb") as f:
+        buf = f.read()
+    if not buf.startswith(_MAGIC):
+        raise ValueError(f"{dir_path}/state.bin is not an NPC save")
+    reader = _Reader(buf, len(_MAGIC))
+    hdr = reader.record()
+    serial = json.loads(hdr.raw(len(hdr.buf)))
+    seq = serial.pop("journal_seq", 0)
+    serial.pop("format_version", None)
+
+    state: Dict[str, Any] = {k: serial[k] for k in serial if k != "npc_states"}
+    state["npc_states"] = {}
+
+    # 2) Per-NPC memory + id map records, vectors mapped from .npy
+    for npc_id, npc_j in serial["npc_states"].items():
+        memory = _unpack_memory(reader.record())
+        id_map = _unpack_id_map(reader.record())
+
+        stored = npc_j.get("vectors")
+        if stored == "npy" and all(os.path.exists(p) for p in _npc_files(dir_path, npc_id, "binary")):
+            vec_path, ids_path = _npc_files(dir_path, npc_id, "binary")
+            idx = MappedIndex(np.load(vec_path, mmap_mode="r"), np.load(ids_path, mmap_mode="r"))
+        elif stored == "index" and os.path.exists(os.path.join(dir_path, f"{npc_id}.index")):
+            idx = configure(faiss.read_index(os.path.join(dir_path, f"{npc_id}.index")), npc_j.get("tier"))
+        else:
+            idx = _empty_index()
+
+        npc = {f: npc_j.get(f) for f in NPC_FIELDS}
+        npc.update({
+            "memory":                  memory,
+            "faiss_index":             idx,
+            "faiss_id_to_memory_text": id_map,
+            "next_faiss_id":           npc_j["next_faiss_id"],
+        })
+        state["npc_states"][npc_id] = npc
+
+    return state, seq
+
+
+def _load_snapshot(dir_path: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Reads the snapshot (either format, auto-detected) back into a
+    SimulationState dict. Returns (state, seq of the last journal record
+    already in the snapshot).
+    """
+    if _format_on_disk(dir_path) == "binary":
+        return _load_binary(dir_path)
+    return _load_json(dir_path)
+
+
+# ── journal ──────────────────────────────────────────────────
+
+def _dump(value) -> str:
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def _apply_record(state: Dict[str, Any], rec: Dict[str, Any]) -> None:
+    """ Replay one journal record onto a loaded snapshot. """
+    state.update(rec.get("top", {}))
+    for npc_id, d in rec.get("npcs", {}).items():
+        npc = state["npc_states"][npc_id]
+        npc.update(d.get("fields", {}))
+        npc["memory"].extend(d.get("memory", []))
+        npc["faiss_id_to_memory_text"].update({int(k): v for k, v in d.get("ids", {}).items()})
+        if "next_faiss_id" in d:
+            npc["next_faiss_id"] = d["next_faiss_id"]
+        vec = d.get("vectors")
+        if vec:
+            data = np.frombuffer(base64.b64decode(vec["data"]), dtype="float32").reshape(-1, vec["dim"])
+            npc["faiss_index"].add_with_ids(data, np.array(vec["ids"], dtype="int64"))
+
+
+def _read_journal(path: str):
+    """ Yield records from a journal file; torn lines (crash mid-append) are skipped. """
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️  Skipping torn journal record in {path}")
+
+
+class Journal:
+    """
+    Write-ahead journal of per-tick state deltas for one save directory.
+
+    append(state) diffs the live state against what is already on disk
+    (snapshot + journal) and appends one JSON line: changed top-level
+    fields, changed NPC fields, appended memories / id-map entries and the
+    new FAISS vectors. load_state() replays the journal onto the snapshot.
+
+    Once the journal grows past JOURNAL_COMPACT_BYTES / _RECORDS it is
+    rotated to journal.log.1 and folded into a fresh snapshot on a
+    background thread; appends keep going to the new journal.log meanwhile.
+    """
+
+    def __init__(self, dir_path: str, seq: int = 0):
+        self.dir_path  = dir_path
+        self.path      = os.path.join(dir_path, JOURNAL_FILE)
+        self.seq       = seq
+        self.lock          = threading.Lock()   # journal.log, seq, baseline
+        self.snapshot_lock = threading.Lock()   # snapshot files + journal.log.1
+        self._file     = None
+        self._records  = 0
+        self._bytes    = 0
+        self._top: Dict[str, str] = {}
+        self._npcs: Dict[str, Dict[str, Any]] = {}
+        self._compacting = False
+        self._written: Dict[str, Any] = {}       # signatures of the files on disk
+
+    # ── baseline ─────────────────────────────────────────────
+    def reset_baseline(self, state: Dict[str, Any]) -> None:
+        """ Record `state` as what is on disk; the next append diffs against it. """
+        self._top = {k: _dump(state.get(k)) for k in TOP_FIELDS}
+        self._npcs = {}
+        for npc_id, npc in state["npc_states"].items():
+            idx = npc.get("faiss_index")
+            self._npcs[npc_id] = {
+                "fields":  {f: _dump(npc.get(f)) for f in NPC_FIELDS},
+                "memory":  len(npc["memory"]),
+                "ntotal":  idx.ntotal if idx is not None else 0,
+                "next_id": npc["next_faiss_id"],
+                "revision": npc.get("revision", 0),
+            }
+
+    def _delta(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        The record for everything changed since the baseline, or None if a
+        change can't be expressed as a delta (new NPC, shrunk memory, non-flat
+        index) and a full snapshot is needed instead.
+        """
+        top = {}
+        for k in TOP_FIELDS:
+            dumped = _dump(state.get(k))
+            if dumped != self._top.get(k):
+                top[k] = state.get(k)
+                self._top[k] = dumped
+
+        npcs = {}
+        if set(state["npc_states"]) != set(self._npcs):
+            return None
+        for npc_id, npc in state["npc_states"].items():
+            base = self._npcs[npc_id]
+            if npc.get("revision", 0) != base["revision"]:
+                return None     # changed in place (mark_dirty)
+            d: Dict[str, Any] = {}
+
+            fields = {}
+            for f in NPC_FIELDS:
+                dumped = _dump(npc.get(f))
+                if dumped != base["fields"][f]:
+                    fields[f] = npc.get(f)
+                    base["fields"][f] = dumped
+            if fields:
+                d["fields"] = fields
+
+            mem = npc["memory"]
+            if len(mem) < base["memory"]:
+                return None
+            if len(mem) > base["memory"]:
+                d["memory"] = mem[base["memory"]:]
+                base["memory"] = len(mem)
+
+            idx = npc.get("faiss_index")
+            ntotal = idx.ntotal if idx is not None else 0
+            if ntotal < base["ntotal"]:
+                return None
+            if ntotal > base["ntotal"]:
+                arrays = _index_vectors(idx, base["ntotal"])
+                if arrays is None:
+                    return None
+                ids, vecs = arrays
+                ids = ids.tolist()
+                id2txt = npc["faiss_id_to_memory_text"]
+                d["ids"] = {str(i): id2txt[i] for i in ids if i in id2txt}
+                d["vectors"] = {"ids": ids, "dim": vecs.shape[1],
+                                "data": base64.b64encode(vecs.tobytes()).decode("ascii")}
+                base["ntotal"] = ntotal
+            if npc["next_faiss_id"] != base["next_id"]:
+                d["next_faiss_id"] = npc["next_faiss_id"]
+                base["next_id"] = npc["next_faiss_id"]
+
+            if d:
+                npcs[npc_id] = d
+
+        if not top and not npcs:
+            return {}
+        return {"top": top, "npcs": npcs}
+
+    # ── writes ───────────────────────────────────────────────
+    def append(self, state: Dict[str, Any]) -> bool:
+        """
+        Journal what changed since the last save. Returns False when the
+        change needs a full snapshot instead (the caller checkpoints).
+        """
+        from agents.memory_queue import MEMORY_LOCK
+        with self.lock:
+            # only diffing reads the live NPCs; the line is written outside MEMORY_LOCK
+            with MEMORY_LOCK:
+                rec = self._delta(state)
+                if rec is None:
+                    return False
+                if not rec:
+                    return True
+                rec["seq"] = self.seq + 1
+                line = json.dumps(rec, separators=(",", ":"), default=str) + "\n"
+            self.seq += 1
+            if self._file is None:
+                self._file = self._open()
+            self._file.write(line)
+            self._file.flush()
+            if JOURNAL_FSYNC:
+                os.fsync(self._file.fileno())
+            self._records += 1
+            self._bytes   += len(line)
+            _journal_records.inc()
+            _journal_bytes.inc(len(line))
+            _bytes_written.inc(len(line))
+            _save_bytes.observe(len(line))
+            due = self._bytes >= JOURNAL_COMPACT_BYTES or self._records >= JOURNAL_COMPACT_RECORDS
+        if due:
+            self.compact_in_background()
+        return True
+
+    def _open(self):
+        f = open(self.path, "a+b")
+        # a crash mid-append leaves a torn line; start the next record on its own line
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        f.close()
+        return open(self.path, "a")
+
+    def checkpoint(self, state: Dict[str, Any], fmt: Optional[str] = None) -> None:
+        """
+        Full snapshot of the live state; the journal is emptied. The state is
+        copied under MEMORY_LOCK and written to disk after releasing it.
+        """
+        from agents.memory_queue import MEMORY_LOCK
+        with self.snapshot_lock, self.lock:
+            on_disk = self._top, self._npcs
+            with MEMORY_LOCK:
+                plan = _capture_snapshot(state, self.dir_path, self.seq, self._written, fmt)
+                self.reset_baseline(state)
+            try:
+                _save_bytes.observe(_commit_snapshot(plan))
+            except Exception:
+                self._top, self._npcs = on_disk     # the journal still holds what the snapshot lacks
+                raise
+            self._truncate()
+            rotated = self.path + ".1"
+            if os.path.exists(rotated):
+                os.remove(rotated)
+
+    def _truncate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._records = 0
+        self._bytes   = 0
+
+    # ── compaction ───────────────────────────────────────────
+    def compact_in_background(self) -> None:
+        with self.lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        _compaction_pool().submit(self.compact)
+
+    def compact(self) -> None:
+        """
+        Fold the journal into the snapshot without touching the live state:
+        rotate journal.log → journal.log.1, then load snapshot + replay .1 +
+        write a new snapshot. Appends continue into a fresh journal.log.
+        """
+        try:
+            with self.snapshot_lock:
+                rotated = self.path + ".1"
+                with self.lock:
+                    # a previous compaction that died mid-way is finished first
+                    if not os.path.exists(rotated):
+                        if self._file is not None:
+                            self._file.close()
+                            self._file = None
+                        if not os.path.exists(self.path):
+                            return
+                        os.replace(self.path, rotated)
+                        self._records = 0
+                        self._bytes   = 0
+                state, seq = _load_snapshot(self.dir_path)
+                for rec in _read_journal(rotated):
+                    if rec["seq"] > seq:
+                        _apply_record(state, rec)
+                        seq = rec["seq"]
+                _write_snapshot(state, self.dir_path, seq, self._written)
+                os.remove(rotated)
+                _journal_compactions.inc()
+                print(f"🗜  Compacted journal into snapshot in {self.dir_path} (seq {seq})")
+        except Exception as e:
+            print(f"⚠️  Journal compaction failed in {self.dir_path}: {e}")
+        finally:
+            with self.lock:
+                self._compacting = False
+
+    def close(self) -> None:
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_journals: Dict[str, Journal] = {}
+_journals_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _compaction_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _journals_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(1, thread_name_prefix="journal-compact")
+        return _pool
+
+
+def _journal_for(dir_path: str, seq: int = 0) -> Journal:
+    key = os.path.abspath(dir_path)
+    with _journals_lock:
+        j = _journals.get(key)
+        if j is None:
+            j = _journals[key] = Journal(dir_path, seq)
+        return j
+
+
+# ── public API ───────────────────────────────────────────────
+
+def save_state(state: Dict[str, Any], dir_path: str, fmt: Optional[str] = None):
+    """
+    Full save: write a snapshot of `state` into `dir_path` and clear its journal.
+    `fmt` ("json" / "binary") defaults to the directory's current format,
+    or NPC_SAVE_FORMAT for a new save.
+    """
+    with span("save_state", mode="snapshot"):
+        _journal_for(dir_path).checkpoint(state, fmt)
+
+
+def journal_state(state: Dict[str, Any], dir_path: str):
+    """
+    Cheap per-tick save: append only what changed since the last save to
+    `dir_path`'s journal. Falls back to a full snapshot the first time, or
+    when a change can't be journaled.
+    """
+    j = _journal_for(dir_path)
+    with span("save_state", mode="journal"):
+        if not has_save(dir_path) or not j.append(state):
+            j.checkpoint(state)
+
+
+def _seed_written(state: Dict[str, Any], dir_path: str, seq: int) -> Dict[str, Any]:
+    """ Signatures of a freshly loaded snapshot, so the next save skips untouched files. """
+    stored = {}
+    for npc_id, npc in state["npc_states"].items():
+        if isinstance(npc["faiss_index"], MappedIndex):
+            stored[npc_id] = "npy"
+        elif os.path.exists(os.path.join(dir_path, f"{npc_id}.index")):
+            stored[npc_id] = "index"
+    return {
+        "format": _format_on_disk(dir_path),
+        "npcs":   {npc_id: _npc_signature(npc) for npc_id, npc in state["npc_states"].items() if npc_id in stored},
+        "stored": stored,
+        "state":  _state_signature(state, seq),
+    }
+
+
+def load_state(dir_path: str) -> Dict[str, Any]:
+    """
+    Load the snapshot (JSON or binary, auto-detected), then replay
+    journal.log.1 (an interrupted compaction) and journal.log on top of it,
+    skipping records the snapshot already has.
+    """
+    state, seq = _load_snapshot(dir_path)
+    written = _seed_written(state, dir_path, seq)
+    path = os.path.join(dir_path, JOURNAL_FILE)
+    replayed = 0
+    for p in (path + ".1", path):
+        for rec in _read_journal(p):
+            if rec["seq"] > seq:
+                _apply_record(state, rec)
+                seq = rec["seq"]
+                replayed += 1
+    if replayed:
+        print(f"🗄  Replayed {replayed} journal record(s) from {dir_path}")
+
+    j = _journal_for(dir_path)
+    with j.snapshot_lock, j.lock:
+        j.seq = max(j.seq, seq)
+        j.reset_baseline(state)
+        j._written = written
+    attach_if_enabled(state)
+    for npc in state["npc_states"].values():
+        maybe_upgrade(npc)      # e.g. after lowering a tier threshold
+    return state
+
+
+def convert(dir_path: str, fmt: str) -> None:
+    """ Migrate a save directory (snapshot + journal) to `fmt` in place. """
+    state = load_state(dir_path)
+    save_state(state, dir_path, fmt=fmt)
+    print(f"✅ Converted {dir_path} to the {fmt} save format")
+
+
+if __name__ == "__main__":
+    import argparse
 
-    return state 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert NPC save directories between formats.")
+    parser.add_argument("dirs", nargs="+", help="save directories (e.g. savegame savegame/sessions/*)")
+    parser.add_argument("--to", choices=sorted(_STATE_FILES), default="binary", help="target format")
+    args = parser.parse_args()
+    for d in args.dirs:
+        convert(d, args.to)
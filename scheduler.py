@@ -0,0 +1,274 @@
+# scheduler.py
+
+import asyncio
+import heapq
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from lod import FAR_BATCH, apply_far_updates, observe_turn, tier_of
+from spatial_index import npcs_near_player, spatial_index_of
+from utils import metrics
+from utils.log import get_logger
+
+log = get_logger("autonomy")
+
+# Autonomous NPC turns started per second in every resident session (0 = off)
+AUTONOMY_RATE    = float(os.environ.get("NPC_AUTONOMY_RATE", "0"))
+# Turns executed concurrently (across sessions; one session runs one at a time)
+AUTONOMY_WORKERS = int(os.environ.get("NPC_AUTONOMY_WORKERS", "2"))
+# Turns waiting for a worker; scheduling more than this drops the turn
+AUTONOMY_QUEUE   = int(os.environ.get("NPC_AUTONOMY_QUEUE", "16"))
+# How many more turns an NPC near the player gets than one further away
+NEAR_WEIGHT      = float(os.environ.get("NPC_AUTONOMY_NEAR_WEIGHT", "4"))
+
+# Relative odds of each turn kind, when the NPC can take it
+TURN_KINDS = {"chat": 5, "gossip": 3, "give_item": 1}
+# Far NPCs (lod.py) only change state; nobody is around to hear them chat
+FAR_KINDS  = {"gossip": 3, "give_item": 1}
+
+# Longest memory an NPC repeats in one turn (passed-on gossip would otherwise nest forever)
+SNIPPET_CHARS = 160
+
+OPENERS = ["Good day to you. Anything new around here?",
+           "You look like you have something on your mind.",
+           "Quiet day, isn't it?"]
+
+_scheduled = metrics.counter("npc_autonomy_turns_scheduled_total", "Autonomous NPC turns queued for a worker")
+_executed  = metrics.counter("npc_autonomy_turns_executed_total", "Autonomous NPC turns run through the graph", ("kind",))
+_dropped   = metrics.counter("npc_autonomy_turns_dropped_total", "Autonomous NPC turns that never ran", ("reason",))
+_turn_secs = metrics.histogram("npc_autonomy_turn_seconds", "Queue wait + graph run of an autonomous NPC turn")
+
+
+def _snippet(text: str) -> str:
+    if len(text) <= SNIPPET_CHARS:
+        return text
+    return text[:SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+
+
+class FairQueue:
+    """
+    Which NPC of one world acts next, by stride scheduling: every NPC has a
+    pass value, the lowest pass goes next and then advances by 1 (or by
+    1 / NEAR_WEIGHT when it is near the player). Near NPCs act NEAR_WEIGHT
+    times as often, and since every pass only grows, an NPC far away still
+    comes up within about one turn of every other NPC: nobody starves.
+    """
+
+    def __init__(self, state: Dict[str, Any], near_weight: float = NEAR_WEIGHT):
+        self.npc_states  = state["npc_states"]
+        self.near_weight = near_weight
+        self._heap: List[Tuple[float, int, str]] = [(0.0, i, npc_id) for i, npc_id in enumerate(self.npc_states)]
+        self._seq = len(self._heap)
+
+    def covers(self, state: Dict[str, Any]) -> bool:
+        """ Still describes `state` (same NPC dict, same NPCs)? """
+        npcs = state["npc_states"]
+        return npcs is self.npc_states and len(npcs) == len(self._heap)
+
+    def next(self, state: Dict[str, Any]) -> Optional[str]:
+        if not self._heap:
+            return None
+        pass_, _, npc_id = heapq.heappop(self._heap)
+        near = npc_id in set(npcs_near_player(state))
+        self._seq += 1
+        heapq.heappush(self._heap, (pass_ + (1.0 / self.near_weight if near else 1.0), self._seq, npc_id))
+        return npc_id
+
+
+def plan_turn(state: Dict[str, Any], npc_id: str, rng: random.Random,
+              kinds: Dict[str, int] = TURN_KINDS) -> Optional[Dict[str, Any]]:
+    """
+    The event for one turn of `npc_id`, against an NPC within reach of it:
+      chat       npc_chat: the other NPC answers an opener (character_agent)
+      gossip     npc_gossip: passes on the NPC's newest memory (gossip_node)
+      give_item  npc_gave_item: hands over something it carries (player_state)
+    `kinds` weighs the kinds to pick from. None when nobody is within reach,
+    the NPC can take none of `kinds` (or the NPC is gone).
+    """
+    npc = state["npc_states"].get(npc_id)
+    others = spatial_index_of(state).near_npc(npc_id) if npc is not None else []
+    possible = [k for k in kinds
+                if k == "chat" or (k == "gossip" and npc["memory"]) or (k == "give_item" and npc.get("inventory"))]
+    if not others or not possible:
+        return None
+    target = rng.choice(others)
+    kind = rng.choices(possible, weights=[kinds[k] for k in possible])[0]
+
+    if kind == "gossip":
+        return {"kind": kind, "event": "npc_gossip", "params": {"npc_id": npc_id},
+                "tool_action": {"type": "gossip", "params": {
+                    "target_npc": target, "message": f"{target} heard from {npc_id}: {_snippet(npc['memory'][-1])}"}}}
+    if kind == "give_item":
+        return {"kind": kind, "event": "npc_gave_item",
+                "params": {"npc_id": npc_id, "target_npc": target, "item": rng.choice(npc["inventory"])}}
+    text = f"Have you heard? {_snippet(npc['memory'][-1])}" if npc["memory"] else rng.choice(OPENERS)
+    return {"kind": kind, "event": "npc_chat", "params": {"npc_id": target, "speaker": npc_id, "text": text}}
+
+
+class AutonomyScheduler:
+    """
+    Runs NPC-initiated turns in the background so the world moves between
+    player requests.
+
+    1) A ticker wakes `rate` times a second and, for every resident session,
+       picks the next NPC from that session's FairQueue and queues a turn.
+       A full queue drops the turn (npc_autonomy_turns_dropped_total) rather
+       than letting work pile up behind a slow LLM.
+    2) `workers` tasks take turns off the queue. Each one plans the turn
+       against the current state, runs it through the graph under the
+       session lock (so it serializes with /tick like any other event),
+       bumps the state version and journals the save.
+    3) Turns of NPCs in the far LOD tier (lod.py) skip the graph: they are
+       collected per session and applied FAR_BATCH at a time by
+       lod.apply_far_updates, with one version bump and one save.
+
+    LLM calls made by turns count against NPC_LLM_CONCURRENCY like every
+    other call (utils.llm), so autonomous chatter cannot starve the player.
+    """
+
+    def __init__(self, sessions, graph, rate: float = AUTONOMY_RATE, workers: int = AUTONOMY_WORKERS,
+                 queue_size: int = AUTONOMY_QUEUE, seed: Optional[int] = None):
+        self.sessions = sessions
+        self.graph    = graph
+        self.rate     = rate
+        self.workers  = workers
+        self.queue: "asyncio.Queue[Tuple[str, str, float]]" = asyncio.Queue(queue_size)
+        self.rng      = random.Random(seed)
+        self._fair: Dict[str, FairQueue] = {}
+        self._far:  Dict[str, List[Dict[str, Any]]] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    # ── scheduling ───────────────────────────────────────────
+    def schedule_once(self) -> int:
+        """ Queue one turn per resident session; returns how many were queued. """
+        queued = 0
+        resident = self.sessions.resident()
+        live = {s.session_id for s in resident}
+        for sid in set(self._fair) - live:
+            del self._fair[sid]
+        for sid in set(self._far) - live:
+            _dropped.inc(len(self._far.pop(sid)), reason="session_gone")
+        for sess in resident:
+            fair = self._fair.get(sess.session_id)
+            if fair is None or not fair.covers(sess.state):
+                fair = self._fair[sess.session_id] = FairQueue(sess.state)
+            npc_id = fair.next(sess.state)
+            if npc_id is None:
+                continue
+            try:
+                self.queue.put_nowait((sess.session_id, npc_id, time.perf_counter()))
+            except asyncio.QueueFull:
+                _dropped.inc(reason="queue_full")
+                continue
+            _scheduled.inc()
+            queued += 1
+        return queued
+
+    async def _ticker(self) -> None:
+        interval = 1.0 / self.rate
+        next_at = time.perf_counter()
+        while True:
+            self.schedule_once()
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay < -interval:
+                next_at = time.perf_counter()     # fell behind; don't burst to catch up
+            await asyncio.sleep(max(0.0, delay))
+
+    # ── execution ────────────────────────────────────────────
+    async def run_turn(self, session_id: str, npc_id: str, queued_at: float) -> Optional[str]:
+        """ Plan and run one queued turn; returns its kind, or None if it was dropped. """
+        if session_id not in {s.session_id for s in self.sessions.resident()}:
+            _dropped.inc(reason="session_gone")     # evicted or reset since it was queued
+            return None
+        async with self.sessions.open(session_id) as sess:
+            tier = tier_of(sess.state, npc_id)
+            turn = plan_turn(sess.state, npc_id, self.rng, FAR_KINDS if tier == "far" else TURN_KINDS)
+            if turn is None:
+                _dropped.inc(reason="alone")
+                return None
+            if tier == "far":
+                far = self._far.setdefault(session_id, [])
+                far.append(turn)
+                if len(far) >= FAR_BATCH:
+                    await self._apply_far(sess)
+                return turn["kind"]
+
+            sess.state["last_event"]   = turn["event"]
+            sess.state["event_params"] = turn["params"]
+            sess.state["tool_action"]  = turn.get("tool_action")
+            t0 = time.perf_counter()
+            try:
+                sess.state = await self.graph.ainvoke(sess.state)
+            except Exception as e:
+                log.error("autonomy_turn_failed", exc_info=e, session_id=session_id, npc_id=npc_id,
+                          last_event=turn["event"])
+                _dropped.inc(reason="error")
+                return None
+            observe_turn(tier, time.perf_counter() - t0)
+            self.sessions.bump_version(sess)
+            await asyncio.to_thread(self.sessions.save, sess)
+        _executed.inc(kind=turn["kind"])
+        _turn_secs.observe(time.perf_counter() - queued_at)
+        return turn["kind"]
+
+    async def _apply_far(self, sess) -> None:
+        """ Apply the session's collected far-tier turns (caller holds the session lock). """
+        turns = self._far.pop(sess.session_id, [])
+        if not turns:
+            return
+        t0 = time.perf_counter()
+        await asyncio.to_thread(apply_far_updates, sess.state, turns)
+        observe_turn("far", time.perf_counter() - t0, len(turns))
+        self.sessions.bump_version(sess)
+        await asyncio.to_thread(self.sessions.save, sess)
+        for turn in turns:
+            _executed.inc(kind=turn["kind"])
+
+    async def _worker(self) -> None:
+        while True:
+            session_id, npc_id, queued_at = await self.queue.get()
+            try:
+                await self.run_turn(session_id, npc_id, queued_at)
+            finally:
+                self.queue.task_done()
+
+    # ── lifecycle ────────────────────────────────────────────
+    def start(self) -> None:
+        if self._tasks or self.rate <= 0:
+            return
+        self._tasks = [asyncio.create_task(self._ticker())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"🕰  Autonomous NPC turns: {self.rate:g}/s per session on {self.workers} workers")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # far-tier turns still waiting for a full batch
+        for resident in self.sessions.resident():
+            if self._far.get(resident.session_id):
+                async with self.sessions.open(resident.session_id) as sess:
+                    await self._apply_far(sess)
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+
+_scheduler: Optional[AutonomyScheduler] = None
+
+
+def get_scheduler() -> Optional[AutonomyScheduler]:
+    return _scheduler
+
+
+def set_scheduler(scheduler: Optional[AutonomyScheduler]) -> None:
+    global _scheduler
+    _scheduler = scheduler
+
+
+metrics.gauge("npc_autonomy_queue_depth", "Autonomous NPC turns waiting for a worker",
+              fn=lambda: _scheduler.depth() if _scheduler else 0)
@@ -0,0 +1,238 @@
+# sessions.py
+
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+from utils import metrics
+
+DEFAULT_SESSION = "default"
+
+# Resident-memory budget for all in-memory worlds; least-recently-used idle
+# sessions are saved to disk and dropped once the estimate goes over it.
+SESSION_MEMORY_BUDGET_MB = float(os.environ.get("NPC_SESSION_MEMORY_MB", "512"))
+# Optional hard cap on resident sessions (0 = budget only)
+MAX_SESSIONS = int(os.environ.get("NPC_MAX_SESSIONS", "0"))
+
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Rough per-item costs for the memory estimate (Python object overhead included)
+_BYTES_PER_MEMORY = 512
+
+
+def valid_session_id(session_id: str) -> bool:
+    return bool(_SESSION_ID_RE.match(session_id or ""))
+
+
+def estimate_state_bytes(state: Dict[str, Any]) -> int:
+    """
+    Cheap O(#NPCs) estimate of a world's resident size: FAISS vectors plus
+    the memory texts / id map that mirror them.
+    """
+    total = 0
+    for npc in state.get("npc_states", {}).values():
+        idx = npc.get("faiss_index")
+        if idx is not None:
+            total += idx.ntotal * (idx.d * 4 + 8)
+        total += (len(npc.get("memory", ())) + len(npc.get("faiss_id_to_memory_text", ()))) * _BYTES_PER_MEMORY
+    return total
+
+
+class Session:
+    def __init__(self, session_id: str, save_dir: str):
+        self.session_id = session_id
+        self.save_dir   = save_dir
+        self.state: Optional[Dict[str, Any]] = None
+        self.lock       = asyncio.Lock()
+        self.last_used  = time.monotonic()
+        self.est_bytes  = 0
+        self.evicted    = False
+
+    def memory_keys(self):
+        """ Keys this session's NPCs use on the deferred memory queue. """
+        if self.state is None:
+            return []
+        return [(self.session_id, npc_id) for npc_id in self.state["npc_states"]]
+
+
+class SessionManager:
+    """
+    Session-keyed simulation states, one asyncio.Lock per session so
+    different sessions tick in parallel while ticks within a session are
+    serialized. Idle sessions are evicted to disk in LRU order when the
+    memory budget is exceeded, and rehydrated from their save on next use.
+
+    The "default" session lives directly in `root_dir` (the original single
+    world's save); every other session gets `root_dir/sessions/<id>/`.
+    """
+
+    def __init__(self, root_dir: str,
+                 init_fresh_state: Callable[[], Dict[str, Any]],
+                 load_state: Callable[[str], Dict[str, Any]],
+                 save_state: Callable[[Dict[str, Any], str], None],
+                 journal_state: Optional[Callable[[Dict[str, Any], str], None]] = None,
+                 budget_bytes: int = int(SESSION_MEMORY_BUDGET_MB * 1024 * 1024),
+                 max_sessions: int = MAX_SESSIONS):
+        self.root_dir         = root_dir
+        self.init_fresh_state = init_fresh_state
+        self.load_state       = load_state
+        self.save_state       = save_state
+        self.journal_state    = journal_state
+        self.budget_bytes     = budget_bytes
+        self.max_sessions     = max_sessions
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.loads     = 0
+        self.evictions = 0
+
+    def save_dir_for(self, session_id: str) -> str:
+        if session_id == DEFAULT_SESSION:
+            return self.root_dir
+        return os.path.join(self.root_dir, "sessions", session_id)
+
+    # ── load / save ──────────────────────────────────────────
+    def _load(self, session: Session) -> Dict[str, Any]:
+        from persistence import has_save
+        if has_save(session.save_dir):
+            state = self.load_state(session.save_dir)
+            print(f"🗄  Loaded session '{session.session_id}' from {session.save_dir}")
+        else:
+            state = self.init_fresh_state()
+            print(f"✨ Starting fresh session '{session.session_id}'")
+        state["session_id"] = session.session_id
+        self.loads += 1
+        return state
+
+    def save(self, session: Session, flush: bool = False, checkpoint: bool = False) -> None:
+        """
+        Blocking save of one session (call via asyncio.to_thread). With
+        flush=True, waits for that session's deferred memory jobs first.
+        Appends to the session's journal when one is configured, unless
+        checkpoint=True asks for a full snapshot.
+        """
+        from agents.memory_queue import get_memory_queue
+        queue = get_memory_queue()
+        if flush:
+            queue.flush(keys=session.memory_keys())
+        save = self.save_state if checkpoint or self.journal_state is None else self.journal_state
+        # Deferred memory jobs, consolidation and index upgrades (memory/) rewrite
+        # NPC memories outside the session lock: persistence copies them under
+        # MEMORY_LOCK and writes the files after releasing it
+        save(session.state, session.save_dir)
+
+    # ── access ───────────────────────────────────────────────
+    def _get_or_create(self, session_id: str) -> Session:
+        sess = self._sessions.get(session_id)
+        if sess is None:
+            sess = self._sessions[session_id] = Session(session_id, self.save_dir_for(session_id))
+        self._sessions.move_to_end(session_id)
+        return sess
+
+    def preload(self, session_id: str = DEFAULT_SESSION) -> Session:
+        """ Blocking load before serving starts (warm-up); no request holds a lock yet. """
+        sess = self._get_or_create(session_id)
+        if sess.state is None:
+            sess.state = self._load(sess)
+            sess.est_bytes = estimate_state_bytes(sess.state)
+        return sess
+
+    @asynccontextmanager
+    async def open(self, session_id: str = DEFAULT_SESSION):
+        """
+        async with sessions.open("alice") as sess:
+            sess.state = await graph.ainvoke(sess.state)
+
+        Holds the session's lock for the body; loads the state on first use.
+        """
+        while True:
+            sess = self._get_or_create(session_id)
+            await sess.lock.acquire()
+            if not sess.evicted:
+                break
+            # evicted while we were waiting for the lock → pick up the new one
+            sess.lock.release()
+        try:
+            if sess.state is None:
+                sess.state = await asyncio.to_thread(self._load, sess)
+            yield sess
+        finally:
+            sess.last_used = time.monotonic()
+            if sess.state is not None:
+                sess.est_bytes = estimate_state_bytes(sess.state)
+            sess.lock.release()
+        await self.enforce_budget()
+
+    @staticmethod
+    def bump_version(sess: Session) -> int:
+        """ One new state version per /tick, /tick_batch or autonomous NPC turn. """
+        sess.state["state_version"] = sess.state.get("state_version", 0) + 1
+        return sess.state["state_version"]
+
+    def replace_state(self, sess: Session, state: Dict[str, Any]) -> None:
+        state["session_id"] = sess.session_id
+        sess.state = state
+
+    def resident(self):
+        """ Sessions whose world is currently in memory (scheduler.py only drives these). """
+        return [s for s in self._sessions.values() if s.state is not None and not s.evicted]
+
+    # ── eviction ─────────────────────────────────────────────
+    def resident_bytes(self) -> int:
+        return sum(s.est_bytes for s in self._sessions.values())
+
+    def _over_budget(self) -> bool:
+        if self.max_sessions and len(self._sessions) > self.max_sessions:
+            return True
+        return self.resident_bytes() > self.budget_bytes
+
+    async def enforce_budget(self) -> None:
+        """ Evict idle sessions, least recently used first, until under budget. """
+        for sid in list(self._sessions):
+            if not self._over_budget():
+                return
+            sess = self._sessions.get(sid)
+            if sess is None or sess.lock.locked() or len(self._sessions) == 1:
+                continue
+            await self.evict(sess)
+
+    async def evict(self, sess: Session) -> None:
+        async with sess.lock:
+            if sess.evicted:
+                return
+            if sess.state is not None:
+                await asyncio.to_thread(self.save, sess, True, True)
+            sess.evicted = True
+            sess.state = None
+            self._sessions.pop(sess.session_id, None)
+            self.evictions += 1
+            print(f"💤 Evicted idle session '{sess.session_id}' to {sess.save_dir}")
+
+    async def save_all(self, flush: bool = True, checkpoint: bool = True) -> None:
+        for sess in list(self._sessions.values()):
+            async with sess.lock:
+                if sess.state is not None and not sess.evicted:
+                    await asyncio.to_thread(self.save, sess, flush, checkpoint)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+_manager: Optional[SessionManager] = None
+
+
+def set_session_manager(manager: SessionManager) -> None:
+    global _manager
+    _manager = manager
+
+
+metrics.gauge("npc_sessions_resident", "Simulation sessions currently held in memory",
+              fn=lambda: len(_manager) if _manager else 0)
+metrics.gauge("npc_sessions_resident_bytes", "Estimated resident size of in-memory sessions",
+              fn=lambda: _manager.resident_bytes() if _manager else 0)
+metrics.counter("npc_session_loads_total", "Sessions loaded or created from disk",
+                fn=lambda: _manager.loads if _manager else 0)
+metrics.counter("npc_session_evictions_total", "Idle sessions evicted to disk",
+                fn=lambda: _manager.evictions if _manager else 0)
@@ -0,0 +1,103 @@
+# spatial_index.py
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils import metrics
+
+_moves = metrics.counter("npc_spatial_moves_total", "NPC moves between world chunks")
+_builds = metrics.counter("npc_spatial_index_builds_total", "Chunk → NPC indexes built from a state")
+
+
+class SpatialIndex:
+    """
+    Where every NPC is, over state["world_chunks"]:
+      members   chunk → NPC ids in it (insertion ordered)
+      chunk_of  NPC id → chunk
+    "Who is in this chunk and its neighbours" reads only those chunks, so it
+    costs the same in a world of 3 NPCs or 30,000. Locations live on the
+    NPCs (npc["location"], saved with them); move_npc() updates both.
+    """
+
+    def __init__(self, state: Dict[str, Any]):
+        self.world_chunks = state.get("world_chunks", {})
+        self.npc_states   = state["npc_states"]
+        self.members:  Dict[Optional[str], Dict[str, None]] = {}
+        self.chunk_of: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        default = state.get("player_location")
+        for npc_id, npc in self.npc_states.items():
+            # NPCs from saves made before NPCs had a location start where the player is
+            chunk = npc["location"] = npc.get("location") or default
+            self.chunk_of[npc_id] = chunk
+            self.members.setdefault(chunk, {})[npc_id] = None
+        _builds.inc()
+
+    def covers(self, state: Dict[str, Any]) -> bool:
+        """ Still describes `state` (same NPC dict, same NPCs)? """
+        npcs = state["npc_states"]
+        return npcs is self.npc_states and len(npcs) == len(self.chunk_of)
+
+    def neighbourhood(self, chunk: Optional[str]) -> List[Optional[str]]:
+        """ `chunk` followed by its neighbours. """
+        near = [chunk]
+        for n in (self.world_chunks.get(chunk) or {}).get("neighbors", ()):
+            if n not in near:
+                near.append(n)
+        return near
+
+    def in_chunk(self, chunk: Optional[str]) -> List[str]:
+        return list(self.members.get(chunk, ()))
+
+    def near(self, chunk: Optional[str], exclude: Iterable[str] = ()) -> List[str]:
+        """ NPCs in `chunk` and its neighbours, own chunk first. """
+        exclude = set(exclude)
+        with self._lock:
+            return [npc_id for c in self.neighbourhood(chunk)
+                    for npc_id in self.members.get(c, ()) if npc_id not in exclude]
+
+    def near_npc(self, npc_id: str) -> List[str]:
+        """ The other NPCs within reach of `npc_id`. """
+        return self.near(self.chunk_of.get(npc_id), exclude=(npc_id,))
+
+    def move(self, npc_id: str, chunk: Optional[str]) -> None:
+        with self._lock:
+            old = self.chunk_of.get(npc_id)
+            if old == chunk and npc_id in self.chunk_of:
+                return
+            self.members.get(old, {}).pop(npc_id, None)
+            if old in self.members and not self.members[old]:
+                del self.members[old]
+            self.chunk_of[npc_id] = chunk
+            self.members.setdefault(chunk, {})[npc_id] = None
+        _moves.inc()
+
+
+_build_lock = threading.Lock()
+
+
+def spatial_index_of(state: Dict[str, Any]) -> SpatialIndex:
+    """ The state's SpatialIndex (state["spatial_index"]), built on first use or after NPCs were added. """
+    index = state.get("spatial_index")
+    if index is None or not index.covers(state):
+        with _build_lock:
+            index = state.get("spatial_index")
+            if index is None or not index.covers(state):
+                index = state["spatial_index"] = SpatialIndex(state)
+    return index
+
+
+def move_npc(state: Dict[str, Any], npc_id: str, chunk: str) -> bool:
+    """ Move an NPC to a chunk of world_chunks; False (and nothing changes) if either is unknown. """
+    npc = state["npc_states"].get(npc_id)
+    if npc is None or chunk not in state.get("world_chunks", {}):
+        return False
+    index = spatial_index_of(state)
+    npc["location"] = chunk
+    index.move(npc_id, chunk)
+    return True
+
+
+def npcs_near_player(state: Dict[str, Any]) -> List[str]:
+    """ NPCs in the player's chunk and its neighbours. """
+    return spatial_index_of(state).near(state.get("player_location"))
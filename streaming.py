@@ -0,0 +1,184 @@
+# streaming.py
+
+import asyncio
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Optional
+
+from utils import metrics
+from utils.log import get_logger
+
+log = get_logger("tick_stream")
+
+_ttft   = metrics.histogram("npc_stream_ttft_seconds",
+                            "Request received → first reply token sent on /tick_stream")
+_reply  = metrics.histogram("npc_stream_reply_seconds",
+                            "Request received → whole reply (emotion, tool_action) sent on /tick_stream")
+_ticks  = metrics.histogram("npc_stream_tick_seconds",
+                            "Request received → graph and save done for a /tick_stream tick",
+                            buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+
+# The ReplyStream of the tick being run, if it is a streamed one
+_current: ContextVar[Optional["ReplyStream"]] = ContextVar("reply_stream", default=None)
+
+
+def current_stream() -> Optional["ReplyStream"]:
+    """ The ReplyStream character_agent should write to, or None for a normal tick. """
+    return _current.get()
+
+
+class ResponseFieldStreamer:
+    """
+    Pulls the "response" string out of the reply JSON while it is still
+    arriving: feed() takes the next raw piece and returns the newly decoded
+    characters of that field (escapes included), so they can be sent before
+    the closing brace, emotion_state and tool_action have been generated.
+    """
+
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self, field: str = "response"):
+        self.raw    = ""
+        self.marker = f'"{field}"'
+        self.pos    = None     # index of the next undecoded character of the value
+        self.done   = False
+
+    def feed(self, piece: str) -> str:
+        self.raw += piece
+        if self.done:
+            return ""
+        if self.pos is None:
+            at = self.raw.find(self.marker)
+            colon = self.raw.find(":", at + len(self.marker)) if at >= 0 else -1
+            quote = self.raw.find('"', colon + 1) if colon >= 0 else -1
+            if quote < 0:
+                return ""
+            self.pos = quote + 1
+        out, raw, i = [], self.raw, self.pos
+        while i < len(raw):
+            c = raw[i]
+            if c == '"':
+                self.done = True
+                break
+            if c != "\\":
+                out.append(c)
+                i += 1
+                continue
+            if i + 1 >= len(raw):
+                break                          # wait for the rest of the escape
+            if raw[i + 1] == "u":
+                if i + 6 > len(raw):
+                    break
+                out.append(chr(int(raw[i + 2:i + 6], 16)))
+                i += 6
+            else:
+                out.append(self._ESCAPES.get(raw[i + 1], raw[i + 1]))
+                i += 2
+        self.pos = i
+        return "".join(out)
+
+
+class ReplyStream:
+    """
+    One /tick_stream response as server-sent events:
+      token        {"text"}                   reply text, as the LLM writes it
+      emotion      {"emotion_state"}          once the reply JSON is complete
+      tool_action  {"tool_action"}            likewise (null if none)
+      end          {"response", "ttft_ms", "reply_ms"}
+      error        {"detail"}
+    The HTTP response ends after "end"; memory summary, quests and the save
+    carry on in the background under the session lock.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.ttft: Optional[float] = None
+        self.sent = ""
+        self.ended = False
+        self._queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        self._queue.put_nowait(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n")
+
+    @contextmanager
+    def attached(self):
+        """ Make this the current_stream() for the graph run inside the block. """
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def token(self, text: str) -> None:
+        if self.ended or not text:
+            return
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.t0
+            _ttft.observe(self.ttft)
+        self.sent += text
+        self._emit("token", {"text": text})
+
+    def reply(self, response: Optional[str], emotion: Optional[str], tool_action: Any) -> None:
+        """ The parsed reply: any text not streamed yet, then the trailing events, then "end". """
+        if self.ended:
+            return
+        response = response or ""
+        if not self.sent:
+            self.token(response)
+        self._emit("emotion", {"emotion_state": emotion})
+        self._emit("tool_action", {"tool_action": tool_action})
+        self._end(response)
+
+    def finish(self, state: Dict[str, Any], npc_id: Optional[str]) -> None:
+        """ After the graph: close the stream if no character reply did (quest answers, moves, …). """
+        if not self.ended:
+            npc = state["npc_states"].get(npc_id) or {}
+            self.reply(state.get("response"), npc.get("emotion_state"), state.get("tool_action"))
+
+    def fail(self, detail: str) -> None:
+        if not self.ended:
+            self._emit("error", {"detail": detail})
+            self.ended = True
+            self._queue.put_nowait(None)
+
+    def _end(self, response: str) -> None:
+        reply_s = time.perf_counter() - self.t0
+        _reply.observe(reply_s)
+        self._emit("end", {"response": response,
+                           "ttft_ms": round(1000 * (self.ttft if self.ttft is not None else reply_s), 1),
+                           "reply_ms": round(1000 * reply_s, 1)})
+        self.ended = True
+        self._queue.put_nowait(None)
+
+    async def events(self) -> AsyncIterator[str]:
+        """ The SSE body (pass to StreamingResponse). """
+        while True:
+            chunk = await self._queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+
+async def run_streamed_tick(graph, sessions, session_id: str, event: str,
+                            params: Dict[str, Any], stream: ReplyStream) -> None:
+    """
+    One /tick, with the reply going out on `stream` while the graph runs.
+    Holds the session lock until the graph and the save are done, so the
+    session's next tick sees the whole result.
+    """
+    try:
+        async with sessions.open(session_id) as sess:
+            sess.state["last_event"]   = event
+            sess.state["event_params"] = params
+            with stream.attached():
+                sess.state = await graph.ainvoke(sess.state)
+            stream.finish(sess.state, params.get("npc_id"))
+            sessions.bump_version(sess)
+            await asyncio.to_thread(sessions.save, sess)
+        _ticks.observe(time.perf_counter() - stream.t0)
+    except Exception as e:
+        log.error("tick_stream_failed", exc_info=e, session_id=session_id, npc_id=params.get("npc_id"),
+                  last_event=event)
+        stream.fail(str(e))
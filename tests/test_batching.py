@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+
+import faiss
+import numpy as np
+
+from batching import run_batch
+from agents.memory_synthesizer import _index_memory
+from utils.embedding_service import EmbeddingService, set_embedding_service, get_embedding_service
+
+
+class _CountingModel:
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.calls = []
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls.append(list(texts))
+        return np.ones((len(texts), self.dim), dtype="float32")
+
+
+class _FakeGraph:
+    """ Stands in for the compiled graph: one tick per event, logs call order. """
+
+    def __init__(self):
+        self.log = []
+        self.recalled = {}
+
+    async def ainvoke(self, state):
+        state = dict(state)
+        params = state["event_params"]
+        npc = state["npc_states"][params["npc_id"]]
+        self.log.append((params["npc_id"], params["text"], "start"))
+        await asyncio.sleep(0.01)
+        get_embedding_service().encode(params["text"])      # recall query
+        self.recalled[params["text"]] = npc["faiss_index"].ntotal
+        _index_memory(npc, f"remembers {params['text']}", {"text": params["text"]})
+        state["simulation_time"] = state["simulation_time"] + 1
+        state["narrative_cooldown"] = max(state["narrative_cooldown"] - 1, 0)
+        state["active_quests"]   = state["active_quests"] + [params["text"]]
+        state["response"]        = f"{params['npc_id']}: {params['text']}"
+        self.log.append((params["npc_id"], params["text"], "end"))
+        return state
+
+
+def _npc(npc_id):
+    return {"npc_id": npc_id, "emotion_state": "neutral", "memory": [],
+            "faiss_index": faiss.IndexIDMap(faiss.IndexFlatIP(384)),
+            "faiss_id_to_memory_text": {}, "next_faiss_id": 0}
+
+
+class TestTickBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.model = _CountingModel()
+        self._prev = get_embedding_service()
+        set_embedding_service(EmbeddingService(model=self.model))
+        self.addCleanup(set_embedding_service, self._prev)
+
+    def test_lanes_merge_and_coalesce(self):
+        state = {"simulation_time": 0, "narrative_cooldown": 3, "active_quests": [], "response": None,
+                 "npc_states": {"a": _npc("a"), "b": _npc("b")}}
+        events = [{"event": "player_chat", "params": {"npc_id": n, "text": t}}
+                  for n, t in [("a", "a1"), ("b", "b1"), ("a", "a2")]]
+        graph = _FakeGraph()
+
+        results = asyncio.run(run_batch(graph, state, events))
+
+        self.assertEqual([r["response"] for r in results], ["a: a1", "b: b1", "a: a2"])
+        # same NPC in order, different NPCs overlapped
+        a_log = [(t, p) for n, t, p in graph.log if n == "a"]
+        self.assertEqual(a_log, [("a1", "start"), ("a1", "end"), ("a2", "start"), ("a2", "end")])
+        self.assertLess(graph.log.index(("b", "b1", "start")), graph.log.index(("a", "a1", "end")))
+        # every event's changes survive the merge
+        self.assertEqual(state["simulation_time"], 3)
+        self.assertEqual(state["narrative_cooldown"], 1)    # a level, not a delta: last event wins
+        self.assertEqual(sorted(state["active_quests"]), ["a1", "a2", "b1"])
+        self.assertEqual(state["response"], "a: a2")
+        # a2 recalls what a1 remembered
+        self.assertEqual(graph.recalled, {"a1": 0, "b1": 0, "a2": 1})
+        # one encode for the queries, one for a1's memory, one for the last events' memories
+        self.assertEqual(len(self.model.calls), 3)
+        self.assertEqual(self.model.calls[1], ["remembers a1"])
+        self.assertEqual(state["npc_states"]["a"]["faiss_index"].ntotal, 2)
+        self.assertEqual(state["npc_states"]["b"]["next_faiss_id"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
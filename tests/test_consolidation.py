@@ -0,0 +1,151 @@
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import faiss
+import numpy as np
+
+from agents.event_nodes import gossip_node
+from memory import consolidation
+from memory.consolidation import consolidate, due, template_summary
+from agents.memory_queue import MEMORY_LOCK
+from persistence import _index_vectors, journal_state, load_state, save_state
+from sessions import SessionManager
+
+
+def _npc(rows):
+    """ rows: (vector, text, timestamp[, importance]) """
+    npc = {"npc_id": "a", "personality": "test", "emotion_state": "neutral", "inventory": [],
+           "memory": [], "faiss_index": faiss.IndexIDMap(faiss.IndexFlatIP(4)),
+           "faiss_id_to_memory_text": {}, "next_faiss_id": 0}
+    for vec, text, t, *importance in rows:
+        mid = npc["next_faiss_id"]
+        v = np.asarray(vec, dtype="float32").reshape(1, 4)
+        npc["memory"].append(text)
+        npc["faiss_index"].add_with_ids(v / np.linalg.norm(v), np.array([mid], dtype="int64"))
+        npc["faiss_id_to_memory_text"][mid] = {"text": text, "npc_id": "a", "timestamp": t,
+                                               **({"importance": importance[0]} if importance else {})}
+        npc["next_faiss_id"] = mid + 1
+    return npc
+
+
+class TestConsolidation(unittest.TestCase):
+
+    def test_dedupe_and_merge(self):
+        npc = _npc([
+            ([1, 0, 0, 0],      "bought bread",        0, 0.2),   # ┐ old, alike, low importance: merged
+            ([1, 0.4, 0, 0],    "bought more bread",   1, 0.2),   # │
+            ([1, 0, 0.4, 0],    "bought bread again",  2, 0.4),   # ┘
+            ([0, 1, 0, 0],      "saw the guard",       150),   # ┐ duplicates: the newer stays
+            ([0, 1, 0.01, 0],   "saw the guard",       190),   # ┘
+            ([0, 0, 0, 1],      "heard a song",        195),
+        ])
+        stats = consolidate(npc, now=200, summarize=template_summary)
+        self.assertEqual((stats["deduped"], stats["merged"], stats["summaries"]), (1, 3, 1))
+
+        summary = "a remembers: bought bread; bought more bread; bought bread again"
+        self.assertEqual(npc["memory"], [summary, "saw the guard", "heard a song"])
+        id_map = npc["faiss_id_to_memory_text"]
+        self.assertEqual(sorted(id_map), [0, 1, 2])                      # ids remapped, contiguous
+        self.assertEqual(npc["next_faiss_id"], 3)
+        self.assertEqual([id_map[i]["text"] for i in range(3)], npc["memory"])
+        self.assertEqual(id_map[1]["timestamp"], 190)
+        self.assertEqual(npc["faiss_index"].ntotal, 3)
+        self.assertEqual(npc["revision"], 1)
+
+        D, I = npc["faiss_index"].search(np.array([[1, 0.1, 0.1, 0]], dtype="float32"), 1)
+        self.assertEqual(id_map[int(I[0][0])]["text"], summary)
+
+    def test_important_memories_are_not_merged(self):
+        npc = _npc([
+            ([1, 0, 0, 0],      "bought bread",        0, 0.2),
+            ([1, 0.4, 0, 0],    "bought more bread",   1, 0.2),
+            ([1, 0, 0.4, 0],    "saw the thief",       2, 0.9),   # quest lead: kept as it is
+            ([1, 0.4, 0.4, 0],  "bought bread again",  3, 0.4),
+            ([1, 0.4, 0, 0.4],  "heard of bread",      4),        # unrated: kept as it is
+        ])
+        stats = consolidate(npc, now=200, summarize=template_summary)
+        self.assertEqual((stats["merged"], stats["summaries"]), (3, 1))
+        self.assertEqual(npc["memory"], ["a remembers: bought bread; bought more bread; bought bread again",
+                                         "saw the thief", "heard of bread"])
+        rated = {e["text"]: e.get("importance") for e in npc["faiss_id_to_memory_text"].values()}
+        self.assertEqual(rated["saw the thief"], 0.9)
+        self.assertEqual(rated[npc["memory"][0]], 0.4)                     # a summary keeps its members' highest
+
+    def test_cap_pass_waits_for_new_memories(self):
+        npc = _npc([([1, 0, 0, 0], "saw the thief", 0, 0.9), ([0, 1, 0, 0], "heard of a curfew", 0, 0.9)])
+        with mock.patch.object(consolidation, "MEMORY_CAP", 2), \
+             mock.patch.object(consolidation, "CONSOLIDATE_EVERY", 0):
+            self.assertTrue(due(npc, 200))
+            consolidate(npc, now=200, summarize=template_summary)   # nothing to dedupe or merge
+            self.assertEqual(npc["consolidated_size"], 2)
+            self.assertFalse(due(npc, 201))                          # still at the cap, but nothing new
+            npc["faiss_id_to_memory_text"][2] = {"text": "new", "npc_id": "a", "timestamp": 201}
+            self.assertTrue(due(npc, 201))
+
+    def test_consolidated_world_round_trips(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            npc = _npc([([1, 0, 0, 0], "x", 0), ([1, 0, 0, 0], "x", 1), ([0, 1, 0, 0], "y", 2)])
+            state = {"player_location": "Market Plaza", "active_quests": [], "simulation_time": 2,
+                     "npc_states": {"a": npc}}
+            journal_state(state, tmp)
+            consolidate(npc, now=2, summarize=template_summary)
+            journal_state(state, tmp)                                      # mark_dirty → full snapshot
+            got = load_state(tmp)["npc_states"]["a"]
+            self.assertEqual(got["memory"], ["x", "y"])
+            self.assertEqual(got["faiss_index"].ntotal, 2)
+
+    def test_saves_during_consolidation_stay_consistent(self):
+        rng = np.random.default_rng(0)
+        npc = _npc([])
+        state = {"player_location": "Market Plaza", "active_quests": [], "simulation_time": 0,
+                 "npc_states": {"a": npc}}
+        errors = []
+
+        def churn():            # memory jobs adding look-alikes + background passes, as in inline mode
+            try:
+                for t in range(40):
+                    with MEMORY_LOCK:
+                        for v in rng.standard_normal((20, 4)).astype("float32"):
+                            for _ in range(2):
+                                mid = npc["next_faiss_id"]
+                                npc["memory"].append(f"m{mid}")
+                                npc["faiss_id_to_memory_text"][mid] = {"text": f"m{mid}", "npc_id": "a",
+                                                                       "timestamp": t}
+                                npc["faiss_index"].add_with_ids((v / np.linalg.norm(v)).reshape(1, 4),
+                                                                np.array([mid], dtype="int64"))
+                                npc["next_faiss_id"] = mid + 1
+                    consolidate(npc, now=t, summarize=template_summary)
+            except Exception as e:
+                errors.append(e)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sessions = SessionManager(tmp, lambda: state, load_state, save_state, journal_state)
+            sess = sessions.preload()
+            worker = threading.Thread(target=churn)
+            worker.start()
+            while worker.is_alive():
+                sessions.save(sess)                     # journal_state, like every /tick
+            worker.join()
+            sessions.save(sess)
+            self.assertEqual(errors, [])
+
+            got = load_state(tmp)["npc_states"]["a"]
+            self.assertEqual(got["memory"], npc["memory"])
+            self.assertEqual(got["faiss_id_to_memory_text"], npc["faiss_id_to_memory_text"])
+            (ids, vecs), (want_ids, want_vecs) = _index_vectors(got["faiss_index"]), _index_vectors(npc["faiss_index"])
+            order, want = np.argsort(ids), np.argsort(want_ids)
+            self.assertTrue(np.array_equal(ids[order], want_ids[want]))
+            self.assertTrue(np.allclose(vecs[order], want_vecs[want]))      # every vector under its own id
+
+    def test_gossip_is_remembered_once(self):
+        state = {"tool_action": {"type": "gossip", "params": {"target_npc": "a", "message": "psst"}},
+                 "npc_states": {"a": _npc([])}}
+        state = gossip_node(state)
+        self.assertEqual(state["npc_states"]["a"]["memory"], [])           # memory_synthesizer appends it
+        self.assertEqual((state["memory_update"], state["memory_owner"]), ("psst", "a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
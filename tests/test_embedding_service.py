@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from utils.embedding_service import EmbeddingService
+
+
+class _CountingModel:
+    """Stand-in for SentenceTransformer: deterministic, un-normalized vectors."""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls.append(list(texts))
+        out = np.zeros((len(texts), self.dim), dtype="float64")
+        for i, t in enumerate(texts):
+            out[i, len(t) % self.dim] = 3.0
+            out[i, (len(t) + 1) % self.dim] = 4.0
+        return out
+
+
+class TestEmbeddingService(unittest.TestCase):
+
+    def test_vectors_are_normalized_float32(self):
+        svc = EmbeddingService(model=_CountingModel())
+        vec = svc.encode("hello")
+        self.assertEqual(vec.shape, (1, 8))
+        self.assertEqual(vec.dtype, np.float32)
+        self.assertAlmostEqual(float(np.linalg.norm(vec[0])), 1.0, places=5)
+
+    def test_repeated_text_is_served_from_cache(self):
+        model = _CountingModel()
+        svc = EmbeddingService(model=model)
+        svc.encode("same line")
+        svc.encode("same line")
+        svc.encode_many(["same line", "other line", "other line"])
+        self.assertEqual(model.calls, [["same line"], ["other line"]])
+        self.assertEqual(svc.misses, 2)
+        self.assertEqual(svc.hits, 3)
+
+    def test_cache_is_bounded_lru(self):
+        model = _CountingModel()
+        svc = EmbeddingService(model=model, cache_size=2)
+        svc.encode("a")
+        svc.encode("bb")
+        svc.encode("a")        # refresh "a"
+        svc.encode("ccc")      # evicts "bb"
+        self.assertEqual(svc.stats()["cache_size"], 2)
+        svc.encode("a")
+        self.assertEqual(len(model.calls), 3)
+        svc.encode("bb")
+        self.assertEqual(len(model.calls), 4)
+
+    def test_missing_model_returns_none(self):
+        svc = EmbeddingService(model_name="definitely-not-a-real-model/xyz")
+        svc._load_failed = True
+        self.assertFalse(svc.available)
+        self.assertIsNone(svc.encode("anything"))
+
+
+if __name__ == '__main__':
+    unittest.main()
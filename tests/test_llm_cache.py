@@ -0,0 +1,102 @@
+import asyncio
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from utils.llm_cache import LLMCache
+
+
+class _Completions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **request):
+        self.calls += 1
+        content = f"reply {self.calls} to {request['messages'][-1]['content']}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                               usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5))
+
+
+class _AsyncCompletions(_Completions):
+    async def create(self, **request):
+        return super().create(**request)
+
+
+class FakeClient:
+    def __init__(self, completions=None):
+        self.chat = SimpleNamespace(completions=completions or _Completions())
+
+
+def _request(text, temperature=0.5, model="llama-3.1-8b-instant"):
+    return dict(messages=[{"role": "system", "content": "You are a memory module for NPC 'rowan_bard'."},
+                          {"role": "user", "content": f"Player said: \"{text}\"\n"}],
+                model=model, temperature=temperature, max_tokens=60)
+
+
+class TestLLMCache(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient()
+
+    def calls(self):
+        return self.client.chat.completions.calls
+
+    def test_identical_requests_are_served_from_memory(self):
+        cache = LLMCache(size=8, ttl=0, path="")
+        first = cache.complete(self.client, _request("hello"), "memory_synthesizer")
+        again = cache.complete(self.client, _request("hello"), "memory_synthesizer")
+        self.assertEqual(self.calls(), 1)
+        self.assertEqual(again.choices[0].message.content, first.choices[0].message.content)
+        self.assertIsNone(again.usage)
+
+        # any difference in prompt, model or parameters is a different entry
+        cache.complete(self.client, _request("hello!"), "memory_synthesizer")
+        cache.complete(self.client, _request("hello", model="other"), "memory_synthesizer")
+        cache.complete(self.client, _request("hello", temperature=0.4), "memory_synthesizer")
+        self.assertEqual(self.calls(), 4)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 4))
+
+    def test_ttl_lru_and_bypass(self):
+        cache = LLMCache(size=2, ttl=10, path="", max_temperature=0.6, skip={"character_agent"})
+        with mock.patch("utils.llm_cache.time.time", return_value=1000.0):
+            cache.complete(self.client, _request("a"), "memory_synthesizer")
+        with mock.patch("utils.llm_cache.time.time", return_value=1011.0):
+            cache.complete(self.client, _request("a"), "memory_synthesizer")       # expired
+        self.assertEqual(self.calls(), 2)
+
+        cache.complete(self.client, _request("b"), "memory_synthesizer")
+        cache.complete(self.client, _request("c"), "memory_synthesizer")           # evicts "a"
+        cache.complete(self.client, _request("a"), "memory_synthesizer")
+        self.assertEqual(self.calls(), 5)
+
+        cache.complete(self.client, _request("c"), "character_agent")              # opted out
+        cache.complete(self.client, _request("c", temperature=0.9), "memory_synthesizer")
+        self.assertEqual(self.calls(), 7)
+        self.assertEqual(cache.stats()["bypassed"], 2)
+
+    def test_disk_tier_survives_a_new_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            LLMCache(size=8, ttl=0, path=tmp).complete(self.client, _request("hello"), "memory_synthesizer")
+            cache = LLMCache(size=8, ttl=0, path=tmp)
+            cache.complete(self.client, _request("hello"), "memory_synthesizer")
+            cache.complete(self.client, _request("hello"), "memory_synthesizer")
+            self.assertEqual(self.calls(), 1)
+            self.assertEqual((cache.stats()["disk_hits"], cache.stats()["hits"]), (1, 1))
+
+    def test_async(self):
+        client = FakeClient(_AsyncCompletions())
+        cache = LLMCache(size=8, ttl=0, path="")
+
+        async def twice():
+            await cache.acomplete(client, _request("hello"), "memory_synthesizer")
+            return await cache.acomplete(client, _request("hello"), "memory_synthesizer")
+
+        comp = asyncio.run(twice())
+        self.assertEqual(client.chat.completions.calls, 1)
+        self.assertIn("hello", comp.choices[0].message.content)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+
+from agents.character_agent import character_agent_node
+from agents.memory_synthesizer import memory_synthesizer_node
+from lod import LODMap, _transitions, apply_far_updates, lod_of, rule_reply, tier_of
+
+
+def _state():
+    chunks = ["gate", "market", "harbor", "docks", "lighthouse"]     # a row: each next to the one either side
+    return {
+        "player_location": "gate",
+        "simulation_time": 7,
+        "world_chunks": {c: {"neighbors": [chunks[j] for j in (i - 1, i + 1) if 0 <= j < len(chunks)]}
+                         for i, c in enumerate(chunks)},
+        "npc_states": {npc_id: {"npc_id": npc_id, "personality": "a local", "emotion_state": "neutral",
+                                "inventory": ["lute"], "memory": [], "location": chunk, "faiss_index": None,
+                                "faiss_id_to_memory_text": {}, "next_faiss_id": 0}
+                       for npc_id, chunk in (("malrik", "market"), ("helena", "docks"), ("rowan", "lighthouse"))},
+    }
+
+
+class TestLOD(unittest.TestCase):
+
+    def test_tiers_follow_the_player(self):
+        state = _state()
+        with mock.patch("lod.NEAR_HOPS", 1), mock.patch("lod.MID_HOPS", 3):
+            self.assertEqual([tier_of(state, n) for n in ("malrik", "helena", "rowan")], ["near", "mid", "far"])
+            promoted, demoted = _transitions.value(direction="promote"), _transitions.value(direction="demote")
+            state["player_location"] = "lighthouse"
+            self.assertEqual([tier_of(state, n) for n in ("malrik", "helena", "rowan")], ["mid", "near", "near"])
+            self.assertEqual(_transitions.value(direction="promote") - promoted, 2)
+            self.assertEqual(_transitions.value(direction="demote") - demoted, 1)
+            self.assertNotIn("gate", lod_of(state).chunk_tier)      # far chunks are not stored
+        self.assertEqual(LODMap(state, near_hops=10, mid_hops=10).tier("gate"), "near")
+
+    def test_mid_tier_turns_skip_the_llm(self):
+        state = _state()
+        state["last_event"] = "player_chat"
+        state["event_params"] = {"npc_id": "helena", "text": "Hello there!"}
+        client = mock.Mock()
+        with mock.patch("agents.character_agent.get_client", return_value=client), \
+             mock.patch("agents.memory_synthesizer.get_client", return_value=client):
+            character_agent_node(state)
+            self.assertEqual(state["response"], "Well met.")
+            memory_synthesizer_node(state)
+        client.chat.completions.create.assert_not_called()
+        self.assertEqual(state["npc_states"]["helena"]["memory"],
+                         ["helena remembers that the player said 'Hello there!', and helena replied 'Well met.'."])
+        self.assertEqual(rule_reply({"emotion_state": "angry"}, "the weather"), "Not now.")
+
+    def test_far_updates_are_applied_in_one_pass(self):
+        state = _state()
+        turns = [{"kind": "give_item", "event": "npc_gave_item",
+                  "params": {"npc_id": "rowan", "target_npc": "helena", "item": "lute"}},
+                 {"kind": "give_item", "event": "npc_gave_item",
+                  "params": {"npc_id": "rowan", "target_npc": "helena", "item": "lute"}},      # already given
+                 {"kind": "gossip", "event": "npc_gossip", "params": {"npc_id": "rowan"},
+                  "tool_action": {"type": "gossip", "params": {"target_npc": "helena", "message": "a ship!"}}}]
+        self.assertEqual(apply_far_updates(state, turns), 2)
+        self.assertEqual(state["npc_states"]["helena"]["inventory"], ["lute", "lute"])
+        self.assertEqual(state["npc_states"]["rowan"]["inventory"], [])
+        self.assertEqual(state["npc_states"]["helena"]["memory"], ["a ship!"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import io
+import json
+import logging
+import unittest
+
+import faiss
+
+from utils.log import JsonLinesFormatter, get_logger
+from utils.print_utils import summarize_for_printing
+
+
+class TestLog(unittest.TestCase):
+
+    def setUp(self):
+        self.log = get_logger("test")
+        self.out = io.StringIO()
+        self.handler = logging.StreamHandler(self.out)
+        self.handler.setFormatter(JsonLinesFormatter())
+        root = logging.getLogger("npc")
+        root.addHandler(self.handler)
+        self.addCleanup(root.removeHandler, self.handler)
+        self.addCleanup(root.setLevel, root.level)
+        root.setLevel(logging.INFO)
+
+    def test_json_lines_and_lazy_fields(self):
+        calls = []
+        self.log.debug("skipped", summary=lambda: calls.append(1))
+        self.log.info("quest_offered", quest_id="q1", summary=lambda: {"n": 2})
+        self.assertEqual(calls, [])                         # debug is off: never built
+        line = json.loads(self.out.getvalue().splitlines()[-1])
+        self.assertEqual((line["event"], line["level"], line["logger"]), ("quest_offered", "info", "npc.test"))
+        self.assertEqual((line["quest_id"], line["summary"]), ("q1", {"n": 2}))
+
+    def test_summary_does_not_copy_indexes(self):
+        idx = faiss.IndexFlatIP(4)
+        state = {"npc_states": {"a": {"faiss_index": idx, "memory": [str(i) for i in range(100)]}}}
+        got = summarize_for_printing(state)
+        self.assertEqual(got["npc_states"]["a"], {"faiss_index": "<faiss_index (ntotal: 0)>",
+                                                  "memory": "<list (length: 100)>"})
+        self.assertEqual(len(state["npc_states"]["a"]["memory"]), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
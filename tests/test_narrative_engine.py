@@ -0,0 +1,49 @@
+import unittest
+
+from agents.narrative_director import narrative_director_node
+from narrative_engine import RuleEngine
+
+
+class TestNarrativeEngine(unittest.TestCase):
+
+    def test_first_match_is_memoized_per_dependency(self):
+        calls = []
+
+        def rule(name, cond, depends=None):
+            def when(s):
+                calls.append(name)
+                return cond(s)
+            r = {"when": when, "beat": name}
+            if depends is not None:
+                r["depends"] = depends
+            return r
+
+        engine = RuleEngine([
+            rule("night",    lambda s: s["time_of_day"] == "Night",    ("time_of_day",)),
+            rule("storm",    lambda s: s["weather"] == "storm",        ("weather",)),
+            rule("broken",   lambda s: s["missing"],                   ("missing",)),
+            rule("volatile", lambda s: s["tick"] % 2 == 0),
+            rule("fallback", lambda s: True,                           ()),
+        ])
+        state = {"time_of_day": "Day", "weather": "storm", "tick": 1}
+        self.assertEqual(engine.first_match(state)["beat"], "storm")
+        self.assertEqual(sorted(calls), ["broken", "fallback", "night", "storm"])
+
+        calls.clear()
+        self.assertEqual(engine.first_match(dict(state, tick=2))["beat"], "storm")
+        self.assertEqual(calls, [])                     # nothing it depends on changed
+
+        calls.clear()
+        self.assertEqual(engine.first_match(dict(state, weather="clear", tick=2))["beat"], "volatile")
+        self.assertEqual(calls, ["storm", "volatile"])
+        self.assertEqual(engine.first_match(dict(state, time_of_day="Night"))["beat"], "night")
+
+    def test_director_uses_default_rules(self):
+        out = narrative_director_node({"time_of_day": "Night", "player_location": "Town Square",
+                                       "current_event": "harvest_festival", "active_quests": []})
+        self.assertEqual(out["current_story_beat"], "festival_celebration")
+        self.assertEqual(out["active_quests"], ["gather_festival_supplies"])
+
+
+if __name__ == "__main__":
+    unittest.main()
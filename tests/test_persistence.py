@@ -0,0 +1,217 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import faiss
+import numpy as np
+
+import persistence
+from agents.memory_queue import MEMORY_LOCK
+from persistence import journal_state, load_state, save_state, mark_dirty, convert
+from sessions import SessionManager
+from utils.mapped_index import MappedIndex
+
+
+def _world():
+    def npc(npc_id):
+        return {"npc_id": npc_id, "personality": "test", "emotion_state": "neutral",
+                "inventory": [], "memory": [],
+                "faiss_index": faiss.IndexIDMap(faiss.IndexFlatIP(4)),
+                "faiss_id_to_memory_text": {}, "next_faiss_id": 0}
+    return {"player_location": "Market Plaza", "active_quests": [], "simulation_time": 0,
+            "npc_states": {"a": npc("a"), "b": npc("b")}}
+
+
+def _remember(npc, text, t):
+    mid = npc["next_faiss_id"]
+    vec = np.random.default_rng(mid).standard_normal((1, 4)).astype("float32")
+    npc["memory"].append(text)
+    npc["faiss_index"].add_with_ids(vec, np.array([mid], dtype="int64"))
+    npc["faiss_id_to_memory_text"][mid] = {"text": text, "npc_id": npc["npc_id"], "timestamp": t}
+    npc["next_faiss_id"] = mid + 1
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+        self.journal = os.path.join(self.dir, persistence.JOURNAL_FILE)
+
+    def _ticks(self, state, n, start=0):
+        for t in range(start, start + n):
+            state["simulation_time"] = t + 1
+            _remember(state["npc_states"]["a"], f"memory {t}", t)
+            state["npc_states"]["b"]["emotion_state"] = "happy" if t % 2 else "angry"
+            journal_state(state, self.dir)
+
+    def _assert_same(self, got, want):
+        self.assertEqual(got["simulation_time"], want["simulation_time"])
+        for npc_id, npc in want["npc_states"].items():
+            g = got["npc_states"][npc_id]
+            for f in ("memory", "faiss_id_to_memory_text", "next_faiss_id", "emotion_state"):
+                self.assertEqual(g[f], npc[f])
+            self.assertEqual(g["faiss_index"].ntotal, npc["faiss_index"].ntotal)
+            q = np.eye(4, dtype="float32")
+            self.assertTrue(np.array_equal(g["faiss_index"].search(q, 2)[1],
+                                           npc["faiss_index"].search(q, 2)[1]))
+
+    def test_ticks_append_deltas_and_replay(self):
+        state = _world()
+        journal_state(state, self.dir)            # first save: snapshot
+        snapshot_mtime = os.path.getmtime(os.path.join(self.dir, "state.json"))
+        self._ticks(state, 5)
+
+        with open(self.journal) as f:
+            self.assertEqual(len(f.readlines()), 5)
+        self.assertEqual(os.path.getmtime(os.path.join(self.dir, "state.json")), snapshot_mtime)
+        self._assert_same(load_state(self.dir), state)
+
+    def test_torn_record_is_skipped(self):
+        state = _world()
+        journal_state(state, self.dir)
+        self._ticks(state, 2)
+        with open(self.journal, "a") as f:
+            f.write('{"seq": 99, "top": {"simula')   # crash mid-append
+        got = load_state(self.dir)
+        self.assertEqual(len(got["npc_states"]["a"]["memory"]), 2)
+
+    def test_compaction_folds_journal_into_snapshot(self):
+        state = _world()
+        journal_state(state, self.dir)
+        self._ticks(state, 4)
+        persistence._journal_for(self.dir).compact()
+        self.assertFalse(os.path.exists(self.journal))
+        self._ticks(state, 2, start=4)             # appends continue after compaction
+        self._assert_same(load_state(self.dir), state)
+
+    def test_full_save_clears_journal(self):
+        state = _world()
+        journal_state(state, self.dir)
+        self._ticks(state, 3)
+        save_state(state, self.dir)
+        self.assertFalse(os.path.exists(self.journal))
+        self._assert_same(load_state(self.dir), state)
+
+
+class TestSelectiveSave(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+
+    def _mtimes(self):
+        return {f: os.stat(os.path.join(self.dir, f)).st_mtime_ns for f in os.listdir(self.dir)}
+
+    def test_only_changed_files_are_rewritten(self):
+        state = _world()
+        save_state(state, self.dir)
+        before = self._mtimes()
+
+        save_state(state, self.dir)                       # nothing changed
+        self.assertEqual(self._mtimes(), before)
+
+        _remember(state["npc_states"]["a"], "new", 1)
+        save_state(state, self.dir)
+        after = self._mtimes()
+        self.assertNotEqual(after["a.index"], before["a.index"])
+        self.assertNotEqual(after["state.json"], before["state.json"])
+        self.assertEqual(after["b.index"], before["b.index"])
+        self.assertFalse([f for f in os.listdir(self.dir) if f.endswith(".tmp")])
+
+    def test_mark_dirty_forces_rewrite(self):
+        state = _world()
+        _remember(state["npc_states"]["b"], "old", 0)
+        save_state(state, self.dir)
+        before = self._mtimes()
+
+        npc = state["npc_states"]["b"]
+        npc["memory"][0] = "rewritten"                    # same length: invisible without a mark
+        mark_dirty(npc)
+        journal_state(state, self.dir)                    # can't journal it → full snapshot
+        self.assertNotEqual(self._mtimes()["b.index"], before["b.index"])
+        self.assertEqual(load_state(self.dir)["npc_states"]["b"]["memory"], ["rewritten"])
+
+    def test_session_saves_write_outside_memory_lock(self):
+        mgr = SessionManager(self.dir, _world, load_state, save_state, journal_state)
+        sess = mgr.preload()
+        _remember(sess.state["npc_states"]["a"], "old", 0)
+        free = []
+        write = persistence._atomic_write
+
+        def probe():
+            got = MEMORY_LOCK.acquire(timeout=1)
+            if got:
+                MEMORY_LOCK.release()
+            free.append(got)
+
+        def atomic_write(path, fn):
+            # other sessions' memory jobs and recalls must be able to run meanwhile
+            t = threading.Thread(target=probe)
+            t.start()
+            t.join()
+            return write(path, fn)
+
+        with mock.patch.object(persistence, "_atomic_write", atomic_write):
+            mgr.save(sess)
+        self.assertTrue(free)
+        self.assertTrue(all(free))
+        self.assertEqual(load_state(self.dir)["npc_states"]["a"]["memory"], ["old"])
+
+
+class TestBinaryFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+
+    def _aged_world(self):
+        state = _world()
+        for t in range(6):
+            _remember(state["npc_states"]["a"], f"mémoire {t}", t)   # non-ASCII survives
+        return state
+
+    def test_round_trip_maps_vectors(self):
+        state = self._aged_world()
+        save_state(state, self.dir, fmt="binary")
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "state.bin")))
+
+        got = load_state(self.dir)
+        self.assertIsInstance(got["npc_states"]["a"]["faiss_index"], MappedIndex)
+        TestJournal._assert_same(self, got, state)
+
+        # the first write copies the mapping into an owned index; journaling keeps working
+        _remember(got["npc_states"]["a"], "new", 7)
+        journal_state(got, self.dir)
+        TestJournal._assert_same(self, load_state(self.dir), got)
+
+    def test_convert_json_save(self):
+        state = self._aged_world()
+        save_state(state, self.dir, fmt="json")
+        convert(self.dir, "binary")
+        files = set(os.listdir(self.dir))
+        self.assertIn("state.bin", files)
+        self.assertNotIn("state.json", files)
+        self.assertFalse([f for f in files if f.endswith(".index")])
+        TestJournal._assert_same(self, load_state(self.dir), state)
+
+    def test_mapped_search_matches_faiss(self):
+        rng = np.random.default_rng(0)
+        vecs = rng.standard_normal((50, 8)).astype("float32")
+        ids = np.arange(100, 150, dtype="int64")
+        idx = faiss.IndexIDMap(faiss.IndexFlatIP(8))
+        idx.add_with_ids(vecs, ids)
+        q = rng.standard_normal((3, 8)).astype("float32")
+        D1, I1 = idx.search(q, 5)
+        D2, I2 = MappedIndex(vecs, ids).search(q, 5)
+        self.assertTrue(np.array_equal(I1, I2))
+        self.assertTrue(np.allclose(D1, D2, atol=1e-5))
+
+
+if __name__ == "__main__":
+    unittest.main()
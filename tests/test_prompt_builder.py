@@ -0,0 +1,60 @@
+import unittest
+
+from agents.prompt_builder import PromptBuilder, estimate_tokens, reachable_npcs
+
+
+def _state():
+    def npc(npc_id, location=None):
+        sub = {"npc_id": npc_id, "personality": f"{npc_id} personality", "emotion_state": "neutral",
+               "inventory": ["lute"], "memory": []}
+        if location:
+            sub["location"] = location
+        return sub
+
+    return {
+        "player_location": "Market Plaza",
+        "world_chunks": {"Market Plaza": {"neighbors": ["Harbor"]},
+                         "Harbor":       {"neighbors": ["Market Plaza", "Docks"]},
+                         "Docks":        {"neighbors": ["Harbor"]}},
+        "npc_states": {"malrik": npc("malrik"), "helena": npc("helena", "Harbor"),
+                       "rowan": npc("rowan", "Docks"), "edda": npc("edda", "Market Plaza")},
+    }
+
+
+class TestPromptBuilder(unittest.TestCase):
+
+    def test_only_reachable_npcs_are_gossip_targets(self):
+        state = _state()
+        self.assertEqual(reachable_npcs(state, "malrik"), ["edda", "helena"])   # no location: with the player; own chunk first
+        self.assertEqual(reachable_npcs(state, "rowan"), ["helena"])
+        prompt = PromptBuilder().system_prompt(state, "rowan", ["rowan remembers the tide."], True)
+        self.assertIn("share gossip with: helena (helena personality).", prompt)
+        self.assertIn("Past memories:\n • rowan remembers the tide.\n", prompt)
+
+    def test_prefix_is_rebuilt_only_when_emotion_or_inventory_change(self):
+        state, builder = _state(), PromptBuilder()
+        npc = state["npc_states"]["malrik"]
+        first = builder.prefix("malrik", npc)
+        npc["memory"].append("something new")
+        self.assertIs(builder.prefix("malrik", npc), first)
+        npc["emotion_state"] = "happy"
+        self.assertIn("You feel 'happy'", builder.prefix("malrik", npc)[0])
+        npc["inventory"].append("scroll")
+        self.assertIn("Inventory: lute, scroll.", builder.prefix("malrik", npc)[0])
+
+    def test_budget_drops_memories_then_targets(self):
+        state = _state()
+        memories = [f"malrik remembers detail number {i} about the market." for i in range(50)]
+        prefix_tokens = PromptBuilder().prefix("malrik", state["npc_states"]["malrik"])[1]
+        for budget in (prefix_tokens + 40, prefix_tokens + 200, 10_000):
+            prompt = PromptBuilder(budget=budget).system_prompt(state, "malrik", memories, True)
+            self.assertLessEqual(estimate_tokens(prompt), max(budget, prefix_tokens))
+        tight = PromptBuilder(budget=prefix_tokens + 40).system_prompt(state, "malrik", memories, True)
+        self.assertIn("detail number 0 ", tight)
+        self.assertNotIn("detail number 5 ", tight)
+        self.assertIn("share gossip with: none.", tight)
+        self.assertIn("I have no specific memories", PromptBuilder().system_prompt(state, "malrik", [], False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from agents import quest_registry
+from agents.quest_registry import QuestConfigError, QuestRegistry, validate
+from agents.quest_triggers import ALTERNATION_MAX, TriggerMatcher
+
+
+def _quest(*triggers, **cfg):
+    return {"offer_text": "?", "triggers": list(triggers), **cfg}
+
+
+class TestQuestRegistry(unittest.TestCase):
+
+    def test_validation(self):
+        errors = validate({"a": {"triggers": ["ok", "bad("]}, "b": _quest(npcs="guard"), "c": []})
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(any("triggers[1] 'bad('" in e for e in errors))
+        with self.assertRaises(QuestConfigError):
+            QuestRegistry({"a": _quest("x", complete_text=3)})
+
+    def test_indexes(self):
+        reg = QuestRegistry({"a": _quest("gate[s]? closing", "thief|steal"),
+                             "b": _quest("x.y", npcs=["guard"])})
+        self.assertEqual([q for q, _ in reg.by_term[" closing"]], ["a"])
+        self.assertEqual([p.pattern for _, p in reg.unindexed], ["thief|steal", "x.y"])
+        self.assertEqual(reg.quests_for("guard"), {"a", "b"})
+        self.assertEqual(reg.quests_for("bard"), {"a"})
+
+    def test_term_index_matches_like_patterns(self):
+        quests = {f"q{n}": _quest(f"word{n:03d}", f"(?:alt{n:03d}|other)", f"pre{n:03d}[0-9]+")
+                  for n in range(ALTERNATION_MAX)}
+        quests["dragon"] = _quest("DRAGON", npcs=["guard"])
+        m = TriggerMatcher(quests)
+        self.assertTrue(m._by_gram)                                  # past ALTERNATION_MAX: term lookups
+        texts = ["nothing here", "WORD007 and pre01234", "alt100", "a Dragon", "ẞ word042"]
+        self.assertEqual(m.scan(texts), ["q7", "q12", "q42", "q100", "dragon"])
+        self.assertEqual(m.scan(texts, npc_id="bard"), ["q7", "q12", "q42", "q100"])
+
+    def test_hot_reload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "quests.json")
+            with open(path, "w") as f:
+                json.dump({"a": _quest("thief")}, f)
+            with mock.patch.multiple(quest_registry, QUESTS_PATH=path, RELOAD_INTERVAL=0.01, _registry=None):
+                first = quest_registry.get_registry()
+                self.assertEqual(list(first.quests), ["a"])
+
+                def rewrite(quests, seconds_later):
+                    with open(path, "w") as f:
+                        json.dump(quests, f)
+                    os.utime(path, ns=(time.time_ns(), first.mtime + seconds_later * 10**9))
+
+                def settle():
+                    # until the change has been seen and its background reload has finished
+                    for _ in range(200):
+                        time.sleep(0.02)
+                        quest_registry.get_registry()
+                        if quest_registry._seen_mtime == os.stat(path).st_mtime_ns and not quest_registry._reloading:
+                            return quest_registry.get_registry()
+                    self.fail("quests.json change not picked up")
+
+                rewrite({"a": _quest("bad(")}, 1)
+                self.assertIs(settle(), first)                   # invalid: previous quests kept
+                rewrite({"a": _quest("thief"), "b": _quest("curfew")}, 2)
+                self.assertEqual(list(settle().quests), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
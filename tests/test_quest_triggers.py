@@ -0,0 +1,47 @@
+import unittest
+
+from agents.quest_manager import quest_manager_node
+from agents.quest_triggers import TriggerMatcher, scan_npc
+
+QUESTS = {
+    "theft":  {"offer_text": "?", "triggers": ["thief", "steal"]},
+    "curfew": {"offer_text": "?", "triggers": ["gate[s]? closing", r"(bell)\1"]},
+    "shout":  {"offer_text": "?", "triggers": ["DRAGON"]},
+}
+
+
+class TestQuestTriggers(unittest.TestCase):
+
+    def test_scan_matches_each_pattern(self):
+        m = TriggerMatcher(QUESTS)
+        self.assertEqual(m.scan(["a quiet day", "Gates closing soon"]), ["curfew"])
+        self.assertEqual(m.scan(["the bellbell rang", "A THIEF!"]), ["theft", "curfew"])
+        self.assertEqual(m.scan(["a dragon appeared"]), ["shout"])       # upper-case pattern: IGNORECASE probe
+        self.assertEqual(m.scan(["gate", "s closing"]), [])             # no match across memories
+        self.assertEqual(m.scan(["thiefgates closing"]), ["theft", "curfew"])
+
+    def test_watermark_only_reads_new_memories(self):
+        m = TriggerMatcher(QUESTS)
+        npc = {"memory": ["bread", "a thief ran off"]}
+        self.assertEqual(scan_npc(npc, m), ["theft"])
+        self.assertEqual(npc["quest_scan"]["at"], 2)
+
+        npc["memory"][0] = "the gates closing"      # behind the watermark: not re-read
+        npc["memory"].append("more bread")
+        self.assertEqual(scan_npc(npc, m), ["theft"])
+        self.assertEqual(npc["quest_scan"]["at"], 3)
+
+        npc.pop("quest_scan")                       # e.g. after consolidation
+        self.assertEqual(scan_npc(npc, m), ["theft", "curfew"])
+        self.assertEqual(scan_npc(npc, TriggerMatcher({"shout": QUESTS["shout"]})), [])   # new trigger set
+
+    def test_manager_offers_first_triggered_quest(self):
+        state = {"active_quests": [], "pending_quest": None,
+                 "npc_states": {"a": {"memory": ["the curfew bell"]}, "b": {"memory": ["a thief!"]}}}
+        state = quest_manager_node(state)
+        self.assertEqual(state["pending_quest"], "investigate_theft")
+        self.assertEqual(state["tool_action"]["params"], {"quest_id": "investigate_theft"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import faiss
+import numpy as np
+
+from memory.retrieval import Scorer, recall
+
+
+def _npc(n, dim=16, seed=0, now=1000):
+    rng = np.random.default_rng(seed)
+    vecs = rng.standard_normal((n, dim)).astype("float32")
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    idx = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+    idx.add_with_ids(vecs, np.arange(n, dtype="int64"))
+    id2txt = {i: {"text": f"m{i}", "npc_id": "a", "timestamp": int(rng.integers(0, now)),
+                  "importance": float(rng.random())} for i in range(n)}
+    return {"npc_id": "a", "faiss_index": idx, "faiss_id_to_memory_text": id2txt}, vecs
+
+
+class TestRecall(unittest.TestCase):
+
+    def test_matches_exhaustive_ranking(self):
+        npc, vecs = _npc(2000)
+        scorer = Scorer(recency=0.5, importance=0.3, half_life=100)
+        q = vecs[:1] + 0.1
+        q /= np.linalg.norm(q)
+        entries = npc["faiss_id_to_memory_text"]
+        ages = np.array([1000 - entries[i]["timestamp"] for i in range(2000)], dtype="float32")
+        imp = np.array([entries[i]["importance"] for i in range(2000)], dtype="float32")
+        want = np.argsort(-scorer.score((vecs @ q.T)[:, 0], ages, imp))[:5].tolist()
+        got = [h["memory_id"] for h in recall(npc, q, 1000, k=5, scorer=scorer, budget_ms=1e9)]
+        self.assertEqual(got, want)
+
+    def test_old_memories_are_not_zeroed(self):
+        npc, vecs = _npc(20)
+        hits = recall(npc, vecs[3:4], 1000, k=1, scorer=Scorer(half_life=10))
+        self.assertEqual(hits[0]["memory_id"], 3)
+        self.assertGreater(hits[0]["score"], 0.9)
+
+    def test_other_owners_filtered_and_budget_respected(self):
+        npc, vecs = _npc(500)
+        npc["faiss_id_to_memory_text"][7]["npc_id"] = "b"
+        hits = recall(npc, vecs[7:8], 1000, k=3, budget_ms=0)
+        self.assertEqual(len(hits), 3)
+        self.assertNotIn(7, [h["memory_id"] for h in hits])
+
+    def test_stored_memories_carry_importance(self):
+        from agents.memory_synthesizer import importance_of
+        chat, told, gossip = (importance_of("Edda remembers the weather was fine.", s)
+                              for s in ("npc_chat", "player", "gossip"))
+        self.assertLess(chat, told)
+        self.assertLess(told, gossip)
+        self.assertGreater(importance_of("Edda remembers a thief in the market.", "npc_chat"), gossip)
+
+    def test_unknown_decay(self):
+        with self.assertRaises(ValueError):
+            Scorer(decay="cubic")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import random
+import tempfile
+import threading
+import time
+import unittest
+
+from scheduler import AutonomyScheduler, FairQueue, _dropped, _executed, plan_turn
+from sessions import SessionManager
+from utils.llm import LLMSlots
+
+
+def _state():
+    def npc(npc_id, location, inventory=()):
+        return {"npc_id": npc_id, "memory": [], "inventory": list(inventory), "location": location}
+
+    return {
+        "player_location": "Market Plaza",
+        "world_chunks": {"Market Plaza": {"neighbors": []}, "Docks": {"neighbors": []}},
+        "npc_states": {"malrik": npc("malrik", "Market Plaza", ["spice_pouch"]),
+                       "edda":   npc("edda", "Market Plaza"),
+                       "rowan":  npc("rowan", "Docks"),
+                       "tomas":  npc("tomas", "Docks")},
+    }
+
+
+class FakeGraph:
+    def __init__(self):
+        self.events = []
+
+    async def ainvoke(self, state):
+        self.events.append((state["last_event"], dict(state["event_params"])))
+        state["last_event"] = None
+        return state
+
+
+class TestFairQueue(unittest.TestCase):
+
+    def test_near_npcs_go_more_often_but_nobody_starves(self):
+        state = _state()
+        fair = FairQueue(state, near_weight=4)
+        picks = [fair.next(state) for _ in range(100)]
+        near = picks.count("malrik") + picks.count("edda")
+        self.assertGreater(near, 3 * (picks.count("rowan") + picks.count("tomas")))
+        for npc_id in state["npc_states"]:
+            turns = [k for k, p in enumerate(picks) if p == npc_id]
+            self.assertLessEqual(max(j - i for i, j in zip(turns, turns[1:])), 10, npc_id)
+
+    def test_plan_turn_picks_someone_within_reach(self):
+        state, rng = _state(), random.Random(0)
+        state["npc_states"]["malrik"]["memory"].append("malrik remembers a storm.")
+        kinds = set()
+        for _ in range(50):
+            turn = plan_turn(state, "malrik", rng)
+            kinds.add(turn["kind"])
+            self.assertIn("edda", (turn["params"].get("npc_id"), turn["params"].get("target_npc"),
+                                   (turn.get("tool_action") or {}).get("params", {}).get("target_npc")))
+        self.assertEqual(kinds, {"chat", "gossip", "give_item"})
+        del state["npc_states"]["tomas"]
+        self.assertIsNone(plan_turn(state, "rowan", rng))
+
+
+class TestAutonomyScheduler(unittest.TestCase):
+
+    def test_turns_run_through_the_graph_and_overflow_is_dropped(self):
+        async def scenario(tmp):
+            sessions = SessionManager(tmp, _state, lambda d: None, lambda s, d: None)
+            sessions.preload()
+            graph = FakeGraph()
+            scheduler = AutonomyScheduler(sessions, graph, rate=10, workers=1, queue_size=1, seed=1)
+            full_before = _dropped.value(reason="queue_full")
+            self.assertEqual(scheduler.schedule_once(), 1)
+            self.assertEqual(scheduler.schedule_once(), 0)
+            self.assertEqual(_dropped.value(reason="queue_full") - full_before, 1)
+
+            executed_before = sum(_executed.value(kind=k) for k in ("chat", "gossip", "give_item"))
+            await scheduler.run_turn(*scheduler.queue.get_nowait())
+            self.assertEqual(sum(_executed.value(kind=k) for k in ("chat", "gossip", "give_item"))
+                             - executed_before, 1)
+            self.assertEqual(len(graph.events), 1)
+            self.assertIn(graph.events[0][0], ("npc_chat", "npc_gossip", "npc_gave_item"))
+            self.assertEqual(sessions.resident()[0].state["state_version"], 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            asyncio.run(scenario(tmp))
+
+
+class TestLLMSlots(unittest.TestCase):
+
+    def test_cap_holds_for_threads_and_coroutines(self):
+        slots, peak, lock = LLMSlots(limit=2), [0], threading.Lock()
+
+        def call():
+            with slots.slot():
+                with lock:
+                    peak[0] = max(peak[0], slots.in_flight)
+                time.sleep(0.01)
+
+        async def acall():
+            async with slots.aslot():
+                with lock:
+                    peak[0] = max(peak[0], slots.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def mixed():
+            await asyncio.gather(*(asyncio.to_thread(call) for _ in range(4)), *(acall() for _ in range(4)))
+
+        asyncio.run(mixed())
+        self.assertEqual(peak[0], 2)
+        self.assertEqual((slots.in_flight, slots.waiting()), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
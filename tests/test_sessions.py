@@ -0,0 +1,89 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from sessions import SessionManager, DEFAULT_SESSION
+
+
+def _fresh():
+    return {"npc_states": {"malrik_merchant": {"memory": []}}, "ticks": 0}
+
+
+def _save(state, path):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "state.json"), "w") as f:
+        json.dump(state, f)
+
+
+def _load(path):
+    with open(os.path.join(path, "state.json")) as f:
+        return json.load(f)
+
+
+class TestSessionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _manager(self, **kwargs):
+        return SessionManager(self.tmp.name, _fresh, _load, _save, **kwargs)
+
+    def test_sessions_are_isolated_and_default_uses_root(self):
+        mgr = self._manager()
+
+        async def run():
+            async with mgr.open("alice") as sess:
+                sess.state["ticks"] += 1
+            async with mgr.open(DEFAULT_SESSION) as sess:
+                self.assertEqual(sess.state["ticks"], 0)
+                self.assertEqual(sess.save_dir, self.tmp.name)
+            async with mgr.open("alice") as sess:
+                self.assertEqual(sess.state["ticks"], 1)
+                self.assertEqual(sess.state["session_id"], "alice")
+
+        asyncio.run(run())
+
+    def test_lru_eviction_saves_and_rehydrates(self):
+        mgr = self._manager(max_sessions=2)
+
+        async def run():
+            for sid in ("a", "b", "c"):
+                async with mgr.open(sid) as sess:
+                    sess.state["ticks"] = ord(sid)
+            # "a" was least recently used → saved to disk and dropped
+            self.assertEqual(len(mgr), 2)
+            self.assertEqual(mgr.evictions, 1)
+            self.assertTrue(os.path.exists(os.path.join(self.tmp.name, "sessions", "a", "state.json")))
+            async with mgr.open("a") as sess:
+                self.assertEqual(sess.state["ticks"], ord("a"))
+
+        asyncio.run(run())
+
+    def test_ticks_in_one_session_are_serialized(self):
+        mgr = self._manager()
+        order = []
+
+        async def tick(i):
+            async with mgr.open("alice") as sess:
+                order.append(("start", i))
+                await asyncio.sleep(0.01)
+                sess.state["ticks"] += 1
+                order.append(("end", i))
+
+        async def run():
+            await asyncio.gather(*(tick(i) for i in range(3)))
+            async with mgr.open("alice") as sess:
+                self.assertEqual(sess.state["ticks"], 3)
+
+        asyncio.run(run())
+        # every tick finishes before the next one starts
+        for k in range(0, len(order), 2):
+            self.assertEqual(order[k][0], "start")
+            self.assertEqual(order[k + 1], ("end", order[k][1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
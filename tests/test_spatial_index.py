@@ -0,0 +1,67 @@
+import unittest
+
+from agents.event_nodes import gossip_node
+from spatial_index import SpatialIndex, move_npc, npcs_near_player, spatial_index_of
+
+
+def _state():
+    def npc(npc_id, location=None):
+        sub = {"npc_id": npc_id, "memory": []}
+        if location:
+            sub["location"] = location
+        return sub
+
+    return {
+        "player_location": "Market Plaza",
+        "world_chunks": {"Market Plaza": {"neighbors": ["Harbor"]},
+                         "Harbor":       {"neighbors": ["Market Plaza", "Docks"]},
+                         "Docks":        {"neighbors": ["Harbor"]}},
+        "npc_states": {"malrik": npc("malrik"), "helena": npc("helena", "Harbor"),
+                       "rowan": npc("rowan", "Docks"), "edda": npc("edda", "Market Plaza")},
+    }
+
+
+class TestSpatialIndex(unittest.TestCase):
+
+    def test_neighbourhood_queries(self):
+        state = _state()
+        index = SpatialIndex(state)
+        self.assertEqual(state["npc_states"]["malrik"]["location"], "Market Plaza")
+        self.assertEqual(index.in_chunk("Market Plaza"), ["malrik", "edda"])
+        self.assertEqual(index.near("Harbor"), ["helena", "malrik", "edda", "rowan"])
+        self.assertEqual(index.near_npc("rowan"), ["helena"])
+        self.assertEqual(npcs_near_player(state), ["malrik", "edda", "helena"])
+
+    def test_moves_update_the_index_incrementally(self):
+        state = _state()
+        index = spatial_index_of(state)
+        self.assertTrue(move_npc(state, "rowan", "Market Plaza"))
+        self.assertIs(spatial_index_of(state), index)
+        self.assertEqual(state["npc_states"]["rowan"]["location"], "Market Plaza")
+        self.assertEqual(index.near_npc("malrik"), ["edda", "rowan", "helena"])
+        self.assertEqual(index.in_chunk("Docks"), [])
+        self.assertFalse(move_npc(state, "rowan", "Nowhere"))
+        self.assertFalse(move_npc(state, "nobody", "Docks"))
+        self.assertEqual(index.chunk_of["rowan"], "Market Plaza")
+
+    def test_index_is_rebuilt_when_npcs_change(self):
+        state = _state()
+        index = spatial_index_of(state)
+        state["npc_states"]["tomas"] = {"npc_id": "tomas", "memory": [], "location": "Docks"}
+        rebuilt = spatial_index_of(state)
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(rebuilt.near_npc("helena"), ["malrik", "edda", "rowan", "tomas"])
+
+    def test_gossip_only_reaches_nearby_npcs(self):
+        state = _state()
+        state.update(event_params={"npc_id": "rowan"}, last_event="gossip")
+        state["tool_action"] = {"type": "gossip", "params": {"target_npc": "edda", "message": "psst"}}
+        gossip_node(state)
+        self.assertNotIn("memory_owner", state)
+        state["tool_action"] = {"type": "gossip", "params": {"target_npc": "helena", "message": "psst"}}
+        gossip_node(state)
+        self.assertEqual((state["memory_owner"], state["memory_update"]), ("helena", "psst"))
+
+
+if __name__ == "__main__":
+    unittest.main()
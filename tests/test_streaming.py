@@ -0,0 +1,99 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from agents.character_agent import acharacter_agent_node
+from sessions import SessionManager
+from streaming import ReplyStream, ResponseFieldStreamer, current_stream, run_streamed_tick
+from utils.llm_cache import LLMCache
+
+REPLY = json.dumps({"response": "Fresh \"saffron\", friend.\nCheap!", "emotion_state": "happy",
+                    "tool_action": {"type": "gossip", "params": {"target_npc": "edda", "message": "psst"}}})
+
+
+class _StreamingCompletions:
+    async def create(self, stream=False, **request):
+        async def chunks():
+            for i in range(0, len(REPLY), 3):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=REPLY[i:i + 3]))])
+        return chunks()
+
+
+def _state():
+    npc = {"npc_id": "malrik", "personality": "merchant", "emotion_state": "neutral", "inventory": [],
+           "memory": [], "location": "Market Plaza", "faiss_index": None}
+    return {"player_location": "Market Plaza", "world_chunks": {"Market Plaza": {"neighbors": []}},
+            "npc_states": {"malrik": npc}, "simulation_time": 0,
+            "last_event": "player_chat", "event_params": {"npc_id": "malrik", "text": "Any spices?"}}
+
+
+async def _drain(stream):
+    events = []
+    async for chunk in stream.events():
+        head, data = chunk.strip().split("\n")
+        events.append((head[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_response_field_is_decoded_as_it_arrives(self):
+        field = ResponseFieldStreamer()
+        out = [field.feed(c) for c in REPLY]
+        self.assertEqual("".join(out), json.loads(REPLY)["response"])
+        self.assertTrue(out[REPLY.index("Fresh")])                  # text comes out before the JSON ends
+        self.assertEqual(field.feed('"more"'), "")
+
+    def test_character_reply_streams_then_trailing_events(self):
+        async def scenario():
+            stream = ReplyStream()
+            client = SimpleNamespace(chat=SimpleNamespace(completions=_StreamingCompletions()))
+            with mock.patch("agents.character_agent.get_async_client", return_value=client), \
+                 mock.patch("agents.character_agent.get_llm_cache", return_value=LLMCache(size=0, path="")), \
+                 stream.attached():
+                state = await acharacter_agent_node(_state())
+            return state, await _drain(stream)
+
+        state, events = asyncio.run(scenario())
+        kinds = [k for k, _ in events]
+        self.assertGreater(kinds.count("token"), 3)
+        self.assertEqual(kinds[-3:], ["emotion", "tool_action", "end"])
+        self.assertEqual("".join(d["text"] for k, d in events if k == "token"), state["response"])
+        self.assertEqual(events[-3][1], {"emotion_state": "happy"})
+        self.assertEqual(events[-2][1]["tool_action"]["type"], "gossip")
+        self.assertLessEqual(events[-1][1]["ttft_ms"], events[-1][1]["reply_ms"])
+
+    def test_stream_ends_before_the_rest_of_the_tick(self):
+        release = None
+
+        class SlowGraph:
+            async def ainvoke(self, state):
+                current_stream().reply("Hello.", "happy", None)
+                await release.wait()            # memory summary, quests, ...
+                state["response"] = "Hello."
+                return state
+
+        async def scenario(tmp):
+            nonlocal release
+            release = asyncio.Event()
+            sessions = SessionManager(tmp, _state, lambda d: None, lambda s, d: None)
+            stream = ReplyStream()
+            task = asyncio.create_task(run_streamed_tick(SlowGraph(), sessions, "default", "player_chat",
+                                                         {"npc_id": "malrik", "text": "hi"}, stream))
+            events = await _drain(stream)
+            self.assertFalse(task.done())
+            release.set()
+            await task
+            return events, sessions.resident()[0].state
+
+        with tempfile.TemporaryDirectory() as tmp:
+            events, state = asyncio.run(scenario(tmp))
+        self.assertEqual([k for k, _ in events], ["token", "emotion", "tool_action", "end"])
+        self.assertEqual(state["state_version"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
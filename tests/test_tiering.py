@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import faiss
+import numpy as np
+
+from agents.memory_queue import MEMORY_LOCK
+from memory import tiering
+from persistence import journal_state, load_state, save_state
+from tests.test_persistence import _remember, _world
+
+
+class TestTiering(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patch = mock.patch.multiple(tiering, TIER_HNSW_AT=40, TIER_IVFPQ_AT=120)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _grow(self, npc, n):
+        for _ in range(n):
+            with MEMORY_LOCK:       # as memory_synthesizer does: the upgrade reads concurrently
+                _remember(npc, f"memory {npc['next_faiss_id']}", npc["next_faiss_id"])
+                tiering.maybe_upgrade(npc)
+        tiering.wait_for_upgrades()
+
+    def test_upgrades_in_background_and_keeps_results(self):
+        npc = _world()["npc_states"]["a"]
+        self._grow(npc, 39)
+        self.assertEqual(tiering.tier_of(npc["faiss_index"]), "flat")
+        q = np.random.default_rng(7).standard_normal((5, 4)).astype("float32")
+        before = npc["faiss_index"].search(q, 1)[1]
+
+        self._grow(npc, 1)
+        self.assertEqual(tiering.tier_of(npc["faiss_index"]), "hnsw")
+        self.assertEqual(npc.get("revision"), 1)                 # the save must rewrite the index
+        self.assertTrue(np.array_equal(npc["faiss_index"].search(q, 1)[1], before))
+
+        self._grow(npc, 80)
+        self.assertEqual(tiering.tier_of(npc["faiss_index"]), "ivfpq")
+        self.assertEqual(npc["faiss_index"].ntotal, 120)
+
+    def test_tier_survives_save_and_journal(self):
+        for fmt in ("json", "binary"):
+            with self.subTest(fmt=fmt):
+                path = os.path.join(self.tmp.name, fmt)
+                state = _world()
+                self._grow(state["npc_states"]["a"], 50)
+                save_state(state, path, fmt=fmt)
+                self._grow(state["npc_states"]["a"], 3)          # journaled as a delta
+                journal_state(state, path)
+
+                got = load_state(path)["npc_states"]["a"]
+                self.assertEqual(tiering.tier_of(got["faiss_index"]), "hnsw")
+                self.assertEqual(got["faiss_index"].ntotal, 53)
+                self.assertEqual(faiss.downcast_index(got["faiss_index"].index).hnsw.efSearch, tiering.HNSW_EF_SEARCH)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+import unittest
+from types import SimpleNamespace
+
+from utils import tracing
+from utils.tracing import span, start_trace, traced_node
+
+
+class TestTracing(unittest.TestCase):
+
+    def test_spans_nest_under_the_node_they_ran_in(self):
+        def node(state):
+            with span("faiss_search", k=3):
+                pass
+            with span("llm") as s:
+                s.llm_usage(SimpleNamespace(usage=SimpleNamespace(prompt_tokens=12, completion_tokens=5)))
+            return state
+
+        with start_trace() as trace:
+            traced_node("test_node", node)({})
+        spans = {s["name"]: s for s in trace.to_json()}
+        self.assertEqual(set(spans), {"test_node", "faiss_search", "llm"})
+        self.assertIsNone(spans["test_node"]["parent"])
+        self.assertEqual(spans["faiss_search"]["parent"], spans["test_node"]["id"])
+        self.assertEqual(spans["faiss_search"]["k"], 3)
+        self.assertEqual((spans["llm"]["prompt_tokens"], spans["llm"]["completion_tokens"]), (12, 5))
+
+    def test_nodes_are_timed_without_a_trace(self):
+        async def anode(state):
+            await asyncio.to_thread(lambda: None)
+            return state
+
+        def failing(state):
+            raise RuntimeError("boom")
+
+        before = tracing._node_seconds.snapshot(node="test_async")[1]
+        asyncio.run(traced_node("test_async", anode)({}))
+        self.assertEqual(tracing._node_seconds.snapshot(node="test_async")[1], before + 1)
+
+        errors = tracing._node_errors.value(node="test_failing")
+        with self.assertRaises(RuntimeError):
+            traced_node("test_failing", failing)({})
+        self.assertEqual(tracing._node_errors.value(node="test_failing"), errors + 1)
+
+    def test_trace_is_local_to_its_context(self):
+        seen = []
+        with start_trace() as trace:
+            t = threading.Thread(target=lambda: seen.append(tracing._trace.get()))
+            t.start()
+            t.join()
+            with span("save_state"):
+                pass
+        self.assertEqual(seen, [None])          # a plain thread doesn't inherit the context
+        self.assertEqual([s["name"] for s in trace.to_json()], ["save_state"])
+        self.assertIsNone(tracing._trace.get())
+
+
+if __name__ == "__main__":
+    unittest.main()
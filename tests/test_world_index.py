@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import faiss
+import numpy as np
+
+from memory import world_index
+from memory.world_index import OwnerIndexView, WorldMemoryIndex, attach_world_index
+from persistence import journal_state, load_state, save_state
+from tests.test_persistence import _remember, _world
+
+
+class TestWorldMemoryIndex(unittest.TestCase):
+
+    def test_owner_search_matches_per_npc_index(self):
+        rng = np.random.default_rng(0)
+        world = WorldMemoryIndex(8, capacity=2)          # forces two rebuilds
+        own = {}
+        for n in range(5):
+            npc = {"npc_id": f"npc{n}", "faiss_id_to_memory_text": {}}
+            vecs = rng.standard_normal((10 + n, 8)).astype("float32")
+            OwnerIndexView(world, npc).add_with_ids(vecs, np.arange(len(vecs)))
+            own[npc["npc_id"]] = faiss.IndexIDMap(faiss.IndexFlatIP(8))
+            own[npc["npc_id"]].add_with_ids(vecs, np.arange(len(vecs)))
+
+        q = rng.standard_normal((3, 8)).astype("float32")
+        for npc_id, idx in own.items():
+            D1, I1 = idx.search(q, 5)
+            D2, I2 = world.search_owner(npc_id, q, 5)
+            self.assertTrue(np.array_equal(I1, I2))      # always a full top-k of its own memories
+            self.assertTrue(np.allclose(D1, D2, atol=1e-5))
+
+    def test_who_knows_filters_by_time_and_owner(self):
+        world = WorldMemoryIndex(4)
+        x = np.eye(4, dtype="float32")
+        world.add("a", x[:2], [0, 1], timestamps=[1, 5])
+        world.add("b", x[:1], [0], timestamps=[9])
+        hits = world.who_knows(x[:1], k=5)
+        self.assertEqual({(h["npc_id"], h["memory_id"]) for h in hits[:2]}, {("a", 0), ("b", 0)})
+        self.assertEqual([h["npc_id"] for h in world.who_knows(x[:1], k=5, since=6)], ["b"])
+        self.assertEqual([h["npc_id"] for h in world.who_knows(x[:1], k=1, exclude=["b"])], ["a"])
+
+    def test_per_npc_who_knows_widens_past_filtered_hits(self):
+        state = _world()
+        npc = state["npc_states"]["a"]
+        x = np.eye(4, dtype="float32")
+        for mid in range(8):                    # the 4 closest to the query are too old
+            npc["faiss_index"].add_with_ids(x[:1] * (8 - mid) / 8, np.array([mid], dtype="int64"))
+            npc["faiss_id_to_memory_text"][mid] = {"text": f"m{mid}", "timestamp": 0 if mid < 4 else 9}
+        embedder = mock.Mock(available=True, encode=lambda text: x[:1])
+        with mock.patch("utils.embedding_service.get_embedding_service", return_value=embedder):
+            hits = world_index.who_knows(state, "query", k=3, since=5)
+        self.assertEqual([h["memory_id"] for h in hits], [4, 5, 6])
+
+
+class TestWorldIndexPersistence(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+
+    def test_saves_stay_per_npc(self):
+        for fmt in ("json", "binary"):
+            with self.subTest(fmt=fmt), mock.patch.object(world_index, "MEMORY_INDEX_MODE", "world"):
+                state = _world()
+                _remember(state["npc_states"]["a"], "old", 0)
+                attach_world_index(state)
+                save_state(state, os.path.join(self.dir, fmt), fmt=fmt)
+                _remember(state["npc_states"]["a"], "new", 1)    # journaled as a delta
+                journal_state(state, os.path.join(self.dir, fmt))
+
+                got = load_state(os.path.join(self.dir, fmt))
+                idx = got["npc_states"]["a"]["faiss_index"]
+                self.assertIsInstance(idx, OwnerIndexView)
+                self.assertEqual(idx.ntotal, 2)
+                q = np.eye(4, dtype="float32")
+                self.assertTrue(np.array_equal(idx.search(q, 2)[1],
+                                               state["npc_states"]["a"]["faiss_index"].search(q, 2)[1]))
+
+            # the same save opens in per-NPC mode
+            self.assertNotIsInstance(load_state(os.path.join(self.dir, fmt))["npc_states"]["a"]["faiss_index"],
+                                     OwnerIndexView)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+# utils/embedding_service.py
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils import metrics
+from utils.tracing import span
+
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_DIMENSION  = 384  # all-MiniLM-L6-v2 output size
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "4096"))
+
+
+def _text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingService:
+    """
+    One sentence embedder shared by every node in the process.
+     - the SentenceTransformer is loaded once, on first use (not at import)
+     - vectors come back L2-normalized float32 with shape (n, dim)
+     - a bounded LRU cache keyed by text hash skips re-encoding repeated text
+       (gossip, scripted player lines, fallback summaries)
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME,
+                 cache_size: int = EMBEDDING_CACHE_SIZE, model=None):
+        self.model_name   = model_name
+        self.cache_size   = cache_size
+        self._model       = model
+        self._load_failed = False
+        self._load_lock   = threading.Lock()
+        self._cache_lock  = threading.Lock()
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.hits   = 0
+        self.misses = 0
+
+    # ── model ────────────────────────────────────────────────
+    def _get_model(self):
+        if self._model is None and not self._load_failed:
+            with self._load_lock:
+                if self._model is None and not self._load_failed:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                        self._model = SentenceTransformer(self.model_name)
+                    except Exception as e:
+                        print(f"Warning: could not load SentenceTransformer: {e}")
+                        self._load_failed = True
+        return self._model
+
+    @property
+    def available(self) -> bool:
+        """True once the model is loaded (loads it on first call)."""
+        return self._get_model() is not None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    # ── encoding ─────────────────────────────────────────────
+    def encode(self, text: str) -> Optional[np.ndarray]:
+        """Embed a single text. Returns a (1, dim) float32 array, or None if no model."""
+        return self.encode_many([text])
+
+    def encode_many(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        Embed a list of texts in one model call.
+        Cached texts are served from the LRU; only the misses hit the model.
+        """
+        if not texts:
+            return np.zeros((0, EMBEDDING_DIMENSION), dtype="float32")
+
+        keys = [_text_key(t) for t in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        missing: Dict[bytes, str] = {}
+
+        # 1) Serve what we can from the cache
+        with self._cache_lock:
+            for key, text in zip(keys, texts):
+                vec = self._cache.get(key)
+                if vec is not None:
+                    self._cache.move_to_end(key)
+                    found[key] = vec
+                    self.hits += 1
+                elif key not in missing:
+                    missing[key] = text
+                    self.misses += 1
+                else:
+                    # same text twice in one call: encoded once, count as a hit
+                    self.hits += 1
+
+        # 2) Encode the misses in a single batch
+        if missing:
+            model = self._get_model()
+            if model is None:
+                return None
+            with span("embed", texts=len(missing)):
+                raw = model.encode(list(missing.values()), convert_to_numpy=True)
+            emb = np.asarray(raw, dtype="float32").reshape(len(missing), -1)
+            norms = np.linalg.norm(emb, axis=1, keepdims=True).clip(min=1e-12)
+            emb = emb / norms
+
+            with self._cache_lock:
+                for key, vec in zip(missing, emb):
+                    vec.setflags(write=False)
+                    found[key] = vec
+                    self._cache[key] = vec
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return np.stack([found[k] for k in keys]).astype("float32", copy=False)
+
+    # ── bookkeeping ──────────────────────────────────────────
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "loaded":     self.loaded,
+            "cache_size": len(self._cache),
+            "cache_cap":  self.cache_size,
+            "hits":       self.hits,
+            "misses":     self.misses,
+            "hit_rate":   (self.hits / total) if total else 0.0,
+        }
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+
+_service: Optional[EmbeddingService] = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Return the process-wide EmbeddingService (created on first call)."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = EmbeddingService()
+    return _service
+
+
+def set_embedding_service(service: EmbeddingService) -> None:
+    """Swap the process-wide service (benchmarks / tests inject stub models)."""
+    global _service
+    with _service_lock:
+        _service = service
+
+
+metrics.counter("npc_embedding_cache_hits_total", "Embedding lookups served from the LRU cache",
+                fn=lambda: get_embedding_service().hits)
+metrics.counter("npc_embedding_cache_misses_total", "Embedding lookups that ran the model",
+                fn=lambda: get_embedding_service().misses)
@@ -0,0 +1,168 @@
+# utils/llm.py
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable
+
+from utils import metrics
+
+# Shared Groq client, built on first use rather than at import time so that
+# importing the agents (and therefore api.py) doesn't pay for the SDK import
+# and client construction before the server is listening.
+_client = None
+_client_failed = False
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide Groq client, or None if it can't be built
+    (e.g. GROQ_API_KEY is not set). The failure is reported once.
+    """
+    global _client, _client_failed
+    if _client is None and not _client_failed:
+        with _client_lock:
+            if _client is None and not _client_failed:
+                try:
+                    from groq import Groq
+                    _client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+                except Exception as e:
+                    print(f"Warning: Groq init failed: {e}")
+                    _client_failed = True
+    return _client
+
+
+_async_client = None
+_async_client_failed = False
+
+
+def get_async_client():
+    """
+    Return the process-wide AsyncGroq client (same lazy/once semantics as
+    get_client), used by the async node variants on the /tick path.
+    """
+    global _async_client, _async_client_failed
+    if _async_client is None and not _async_client_failed:
+        with _client_lock:
+            if _async_client is None and not _async_client_failed:
+                try:
+                    from groq import AsyncGroq
+                    _async_client = AsyncGroq(api_key=os.environ.get("GROQ_API_KEY"))
+                except Exception as e:
+                    print(f"Warning: AsyncGroq init failed: {e}")
+                    _async_client_failed = True
+    return _async_client
+
+
+def set_clients(client=None, async_client=None) -> None:
+    """ Replace the shared clients (benchmarks install in-process stubs this way). """
+    global _client, _client_failed, _async_client, _async_client_failed
+    with _client_lock:
+        _client, _client_failed = client, False
+        _async_client, _async_client_failed = async_client, False
+
+
+# Most LLM requests in flight at once across every caller: /tick, deferred
+# memory jobs and autonomous NPC turns (scheduler.py). 0 = no cap.
+LLM_CONCURRENCY = int(os.environ.get("NPC_LLM_CONCURRENCY", "8"))
+
+
+class LLMSlots:
+    """
+    A counting semaphore usable from threads and coroutines alike. Waiters
+    are served first come, first served; a freed slot is handed straight to
+    the oldest waiter, so a burst of autonomous turns cannot overtake a
+    player's request that was already waiting.
+    """
+
+    def __init__(self, limit: int = LLM_CONCURRENCY):
+        self.limit     = limit
+        self.in_flight = 0
+        self._lock     = threading.Lock()
+        self._waiters: "deque[Callable[[], None]]" = deque()
+
+    def _try_take(self) -> bool:
+        if self.limit <= 0 or (self.in_flight < self.limit and not self._waiters):
+            self.in_flight += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._try_take():
+                return
+            ready = threading.Event()
+            self._waiters.append(ready.set)
+        t0 = time.perf_counter()
+        ready.wait()
+        _slot_wait.observe(time.perf_counter() - t0)
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._try_take():
+                return
+            fut = loop.create_future()
+
+            def hand_over():
+                if fut.cancelled():
+                    self.release()      # the waiter gave up; pass the slot on
+                else:
+                    fut.set_result(None)
+            self._waiters.append(lambda: loop.call_soon_threadsafe(hand_over))
+        t0 = time.perf_counter()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()          # handed over, but we were cancelled first
+            raise
+        _slot_wait.observe(time.perf_counter() - t0)
+
+    def release(self) -> None:
+        with self._lock:
+            if not self._waiters:
+                self.in_flight -= 1
+                return
+            wake = self._waiters.popleft()    # the slot moves on; in_flight unchanged
+        wake()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+
+_slots = LLMSlots()
+
+
+def get_llm_slots() -> LLMSlots:
+    return _slots
+
+
+def set_llm_slots(slots: LLMSlots) -> None:
+    global _slots
+    _slots = slots
+
+
+_slot_wait = metrics.histogram("npc_llm_slot_wait_seconds", "Time LLM requests waited for an NPC_LLM_CONCURRENCY slot")
+metrics.gauge("npc_llm_in_flight", "LLM requests currently in flight", fn=lambda: _slots.in_flight)
+metrics.gauge("npc_llm_waiting", "LLM requests waiting for a concurrency slot", fn=lambda: _slots.waiting())
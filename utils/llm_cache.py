@@ -0,0 +1,248 @@
+# utils/llm_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils import metrics
+from utils.llm import get_llm_slots
+from utils.tracing import span
+
+# Completions kept in memory (0 turns the cache off)
+LLM_CACHE_SIZE = int(os.environ.get("NPC_LLM_CACHE_SIZE", "1024"))
+# Seconds a cached completion may be reused (0 = until evicted)
+LLM_CACHE_TTL = float(os.environ.get("NPC_LLM_CACHE_TTL", "600"))
+# Directory for the on-disk tier (llm_cache.sqlite), shared across restarts; "" = memory only
+LLM_CACHE_DIR = os.environ.get("NPC_LLM_CACHE_DIR", "")
+# Calls sampled hotter than this always go to the LLM
+LLM_CACHE_MAX_TEMPERATURE = float(os.environ.get("NPC_LLM_CACHE_MAX_TEMPERATURE", "1.0"))
+# Comma-separated callers that never use the cache, e.g. "character_agent"
+LLM_CACHE_SKIP = frozenset(n.strip() for n in os.environ.get("NPC_LLM_CACHE_SKIP", "").split(",") if n.strip())
+
+_lookups = metrics.counter("npc_llm_cache_total", "LLM completion cache lookups by result "
+                           "(hit, disk_hit, miss, bypass)", ("node", "result"))
+_saved   = metrics.counter("npc_llm_cache_saved_seconds_total",
+                           "LLM latency avoided by serving completions from the cache", ("node",))
+
+Entry = Tuple[str, float, float]        # (content, created at, seconds the original call took)
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """ Hash of everything sent: model, sampling parameters and the prompt messages. """
+    blob = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class CachedCompletion:
+    """ A chat completion served from the cache (callers only read choices[0].message.content). """
+
+    usage = None        # no tokens were spent
+
+    def __init__(self, content: str):
+        self.choices = [SimpleNamespace(index=0, finish_reason="stop",
+                                        message=SimpleNamespace(role="assistant", content=content))]
+
+
+class LLMCache:
+    """
+    Reuses the completion of a byte-identical request (same model, parameters
+    and prompts) made within the TTL: scripted player lines, idle chatter and
+    repeated summaries skip the Groq round trip.
+     - an in-memory LRU of `size` completions, backed by an optional SQLite
+       file in `path` that survives restarts
+     - only non-empty completions are stored; errors are never cached
+     - callers in `skip`, or sampling above `max_temperature`, bypass it
+    """
+
+    def __init__(self, size: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL,
+                 path: str = LLM_CACHE_DIR, max_temperature: float = LLM_CACHE_MAX_TEMPERATURE,
+                 skip=LLM_CACHE_SKIP):
+        self.size = size
+        self.ttl  = ttl
+        self.max_temperature = max_temperature
+        self.skip = frozenset(skip)
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, Entry]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if path and size > 0:
+            os.makedirs(path, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(path, "llm_cache.sqlite"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS completions "
+                             "(key TEXT PRIMARY KEY, content TEXT, created REAL, latency REAL)")
+            if ttl > 0:
+                self._db.execute("DELETE FROM completions WHERE created < ?", (time.time() - ttl,))
+            self._db.commit()
+        self.hits = self.disk_hits = self.misses = self.bypassed = 0
+        self.saved_seconds = 0.0
+
+    # ── lookup / store ───────────────────────────────────────
+    def cacheable(self, request: Dict[str, Any], node: str) -> bool:
+        return (self.size > 0 and node not in self.skip and not request.get("stream")
+                and float(request.get("temperature", 1.0)) <= self.max_temperature)
+
+    def _fresh(self, entry: Entry) -> bool:
+        return self.ttl <= 0 or time.time() - entry[1] <= self.ttl
+
+    def get(self, key: str, node: str = "") -> Optional[str]:
+        """ The cached content for `key`, or None (counted as a miss). """
+        with self._lock:
+            entry, result = self._mem.get(key), "hit"
+            if entry is not None and not self._fresh(entry):
+                del self._mem[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT content, created, latency FROM completions WHERE key = ?",
+                                       (key,)).fetchone()
+                if row is not None and self._fresh(row):
+                    entry, result = tuple(row), "disk_hit"
+                    self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                _lookups.inc(node=node, result="miss")
+                return None
+            self._mem.move_to_end(key)
+            if result == "hit":
+                self.hits += 1
+            else:
+                self.disk_hits += 1
+            self.saved_seconds += entry[2]
+        _lookups.inc(node=node, result=result)
+        _saved.inc(entry[2], node=node)
+        return entry[0]
+
+    def put(self, key: str, content: str, latency: float) -> None:
+        if not isinstance(content, str) or not content.strip():
+            return
+        entry = (content, time.time(), latency)
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)", (key, *entry))
+                self._db.commit()
+
+    def _remember(self, key: str, entry: Entry) -> None:
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.size:
+            self._mem.popitem(last=False)
+
+    # ── completions ──────────────────────────────────────────
+    def complete(self, client, request: Dict[str, Any], node: str):
+        """
+        client.chat.completions.create(**request), through the cache. Timed as an
+        "llm" span; a miss waits for an NPC_LLM_CONCURRENCY slot (utils.llm).
+        """
+        with span("llm", caller=node) as s:
+            key = self._lookup_key(request, node)
+            content = self.get(key, node) if key else None
+            if content is not None:
+                s.set(cached=True)
+                return CachedCompletion(content)
+            with get_llm_slots().slot():
+                t0 = time.perf_counter()
+                comp = client.chat.completions.create(**request)
+            s.llm_usage(comp)
+            if key:
+                self.put(key, comp.choices[0].message.content, time.perf_counter() - t0)
+            return comp
+
+    async def acomplete(self, client, request: Dict[str, Any], node: str):
+        """ Async twin of complete() for the AsyncGroq client. """
+        with span("llm", caller=node) as s:
+            key = self._lookup_key(request, node)
+            content = self.get(key, node) if key else None
+            if content is not None:
+                s.set(cached=True)
+                return CachedCompletion(content)
+            async with get_llm_slots().aslot():
+                t0 = time.perf_counter()
+                comp = await client.chat.completions.create(**request)
+            s.llm_usage(comp)
+            if key:
+                self.put(key, comp.choices[0].message.content, time.perf_counter() - t0)
+            return comp
+
+    async def astream(self, client, request: Dict[str, Any], node: str, on_delta: Callable[[str], None]) -> str:
+        """
+        acomplete() with stream=True: `on_delta` gets each piece of the reply as
+        Groq produces it (a cached reply arrives as one piece). Returns the
+        whole reply, which is cached like any other.
+        """
+        with span("llm", caller=node, stream=True) as s:
+            key = self._lookup_key(request, node)
+            content = self.get(key, node) if key else None
+            if content is not None:
+                s.set(cached=True)
+                on_delta(content)
+                return content
+            pieces = []
+            async with get_llm_slots().aslot():
+                t0 = time.perf_counter()
+                async for chunk in await client.chat.completions.create(**request, stream=True):
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        pieces.append(delta)
+                        on_delta(delta)
+                    s.llm_usage(getattr(chunk, "x_groq", None))     # usage rides on the last chunk
+            content = "".join(pieces)
+            if key:
+                self.put(key, content, time.perf_counter() - t0)
+            return content
+
+    def _lookup_key(self, request: Dict[str, Any], node: str) -> Optional[str]:
+        if self.cacheable(request, node):
+            return request_key(request)
+        with self._lock:
+            self.bypassed += 1
+        _lookups.inc(node=node, result="bypass")
+        return None
+
+    # ── bookkeeping ──────────────────────────────────────────
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "cache_size":    len(self._mem),
+            "cache_cap":     self.size,
+            "hits":          self.hits,
+            "disk_hits":     self.disk_hits,
+            "misses":        self.misses,
+            "bypassed":      self.bypassed,
+            "hit_rate":      ((self.hits + self.disk_hits) / lookups) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM completions")
+                self._db.commit()
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """ Return the process-wide LLMCache (created on first call). """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
+
+
+def set_llm_cache(cache: LLMCache) -> None:
+    """ Swap the process-wide cache (benchmarks / tests use their own). """
+    global _cache
+    with _cache_lock:
+        _cache = cache
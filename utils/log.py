@@ -0,0 +1,79 @@
+# utils/log.py
+
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Any
+
+# Structured logging for the simulation: one JSON object per line on stdout,
+#   {"ts": 1718000000.123, "level": "info", "logger": "npc.quest_manager",
+#    "event": "quest_offered", "quest_id": "investigate_theft"}
+# Field values may be zero-argument callables; they are only called when the
+# record's level is enabled, so expensive summaries cost nothing otherwise.
+LOG_LEVEL = os.environ.get("NPC_LOG_LEVEL", "INFO").upper()
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {"ts":     round(record.created, 3),
+               "level":  record.levelname.lower(),
+               "logger": record.name,
+               "event":  record.getMessage()}
+        out.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+def _configure() -> None:
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        root = logging.getLogger("npc")
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonLinesFormatter())
+        root.addHandler(handler)
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        root.propagate = False
+        _configured = True
+
+
+class Logger:
+    """ log.info("event_name", field=value, summary=lambda: expensive()) """
+
+    def __init__(self, name: str):
+        self._log = logging.getLogger(f"npc.{name}")
+
+    def enabled(self, level: int) -> bool:
+        return self._log.isEnabledFor(level)
+
+    def _emit(self, level: int, event: str, fields: dict, exc_info: Any = None) -> None:
+        if not self._log.isEnabledFor(level):
+            return
+        fields = {k: (v() if callable(v) else v) for k, v in fields.items()}
+        self._log.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+    def debug(self, event: str, **fields) -> None:
+        self._emit(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields) -> None:
+        self._emit(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields) -> None:
+        self._emit(logging.WARNING, event, fields)
+
+    def error(self, event: str, exc_info: Any = None, **fields) -> None:
+        self._emit(logging.ERROR, event, fields, exc_info)
+
+
+def get_logger(name: str) -> Logger:
+    """ Logger "npc.<name>"; the JSON-lines handler is installed on first use. """
+    if not _configured:
+        _configure()
+    return Logger(name)
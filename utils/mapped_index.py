@@ -0,0 +1,91 @@
+# utils/mapped_index.py
+
+import copy
+import threading
+from typing import Tuple
+
+import numpy as np
+
+
+class MappedIndex:
+    """
+    Read-only stand-in for an NPC's IndexIDMap(IndexFlatIP) backed by
+    memory-mapped .npy files (see persistence's binary save format).
+
+    Loading one is O(1): nothing is read until a search touches the pages.
+    Searches run straight off the mapping with the same inner-product
+    scoring as IndexFlatIP. The first operation that needs a real index
+    (add_with_ids, remove_ids, .index / .id_map, ...) copies the vectors into
+    an owned IndexIDMap(IndexFlatIP) and every call is delegated to it from
+    then on.
+    """
+
+    def __init__(self, vectors: np.ndarray, ids: np.ndarray):
+        self._vectors = vectors
+        self._ids     = ids
+        self._index   = None
+        self._lock    = threading.Lock()
+
+    @property
+    def ntotal(self) -> int:
+        return self._index.ntotal if self._index is not None else len(self._ids)
+
+    @property
+    def d(self) -> int:
+        return self._index.d if self._index is not None else self._vectors.shape[1]
+
+    @property
+    def materialized(self) -> bool:
+        return self._index is not None
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ (ids, vectors) while still mapped; None once materialized. """
+        if self._index is not None:
+            return None
+        return self._ids, self._vectors
+
+    def search(self, x, k: int):
+        if self._index is not None:
+            return self._index.search(x, k)
+        x = np.asarray(x, dtype="float32").reshape(-1, self.d)
+        D = np.full((len(x), k), -np.finfo("float32").max, dtype="float32")
+        I = np.full((len(x), k), -1, dtype="int64")
+        kk = min(k, len(self._ids))
+        if kk:
+            scores = x @ self._vectors.T
+            top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            D[:, :kk] = np.take_along_axis(top_scores, order, axis=1)
+            I[:, :kk] = self._ids[np.take_along_axis(top, order, axis=1)]
+        return D, I
+
+    def materialize(self):
+        """ The owned faiss index (built from the mapping on first call). """
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    import faiss
+                    idx = faiss.IndexIDMap(faiss.IndexFlatIP(self._vectors.shape[1]))
+                    if len(self._ids):
+                        idx.add_with_ids(np.ascontiguousarray(self._vectors, dtype="float32"),
+                                         np.asarray(self._ids, dtype="int64"))
+                    self._index = idx
+                    self._vectors = self._ids = None
+        return self._index
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+    def __deepcopy__(self, memo):
+        if self._index is not None:
+            return copy.deepcopy(self._index, memo)
+        # the mapped files are never modified in place (saves rename over them)
+        return MappedIndex(self._vectors, self._ids)
+
+
+def unwrap_index(idx):
+    """ A real faiss index for `idx` (materializing a MappedIndex). """
+    return idx.materialize() if isinstance(idx, MappedIndex) else idx
@@ -0,0 +1,161 @@
+# utils/metrics.py
+
+import threading
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+# Minimal in-process metrics registry rendered in the Prometheus text format
+# (served by api.py at /metrics). Counters/gauges can also be backed by a
+# callback that is read at scrape time, for values that already live
+# somewhere else (queue depths, cache counters).
+
+LabelKey = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), fn: Optional[Callable] = None):
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self._fn        = fn
+        self._lock      = threading.Lock()
+        self._values: Dict[LabelKey, float] = {}
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _samples(self) -> Iterable[Tuple[str, LabelKey, float]]:
+        if self._fn is not None:
+            got = self._fn()
+            items = got.items() if isinstance(got, dict) else [((), got)]
+            for key, v in items:
+                key = key if isinstance(key, tuple) else (key,)
+                yield self.name, key, v
+            return
+        with self._lock:
+            items = list(self._values.items())
+        for key, v in items:
+            yield self.name, key, v
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, v in self._samples():
+            lines.append(f"{name}{_fmt_labels(self.labelnames, key)} {_fmt_value(v)}")
+        return "\n".join(lines)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label key: [bucket counts..., sum, count]
+        self._hist: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            h = self._hist.get(key)
+            if h is None:
+                h = self._hist[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(k, list(h)) for k, h in self._hist.items()]
+        for key, h in items:
+            for b, c in zip(self.buckets, h):
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, ('le', _fmt_value(b)))} {c}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, ('le', '+Inf'))} {h[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(h[-2])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {h[-1]}")
+        return "\n".join(lines)
+
+    def snapshot(self, **labels) -> Tuple[float, int]:
+        """ (sum, count) for one label set. """
+        with self._lock:
+            h = self._hist.get(self._key(labels))
+            return (h[-2], h[-1]) if h else (0.0, 0)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, *args, **kwargs)
+            return m
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = (), fn: Optional[Callable] = None) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames, fn=fn)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (), fn: Optional[Callable] = None) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames, fn=fn)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+counter   = REGISTRY.counter
+gauge     = REGISTRY.gauge
+histogram = REGISTRY.histogram
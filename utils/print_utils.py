@@ -1,15 +1,18 @@
-import copy
+# Containers longer than this are summarized by their length instead of listed
+# (an old NPC's memory list / id map would otherwise be logged in full)
+MAX_ITEMS = 20
 
 def summarize_for_printing(data_to_summarize, keys_to_redact=None):
     """
     Recursively creates a summarized version of complex data structures
     for printing, redacting specified keys, long embeddings, and summarizing shared_memory.
-    Makes a deepcopy of the data before summarizing to avoid side effects.
+    Builds new containers and never modifies or copies the input, so FAISS
+    indexes and memory lists are only looked at, not duplicated.
     """
     if keys_to_redact is None:
         keys_to_redact = []
-    
-    data = copy.deepcopy(data_to_summarize)
+
+    data = data_to_summarize
 
     if not isinstance(data, dict):
         # For non-dict types, summarize if it looks like a long list of numbers
@@ -38,10 +41,16 @@ def summarize_for_printing(data_to_summarize, keys_to_redact=None):
         elif k == "faiss_index" and v is not None: # Specific handling for faiss_index if not in keys_to_redact
              summary[k] = f"<faiss_index (ntotal: {v.ntotal if hasattr(v, 'ntotal') else 'N/A'})>"
         elif isinstance(v, dict):
-            summary[k] = summarize_for_printing(v, keys_to_redact=keys_to_redact)  # Pass keys_to_redact recursively
+            if len(v) > MAX_ITEMS:
+                summary[k] = f"<dict (length: {len(v)})>"
+            else:
+                summary[k] = summarize_for_printing(v, keys_to_redact=keys_to_redact)  # Pass keys_to_redact recursively
         elif isinstance(v, list):
+            if len(v) > MAX_ITEMS:
+                summary[k] = (f"<list_of_numbers (length: {len(v)})>" if all(isinstance(i, (float, int)) for i in v)
+                              else f"<list (length: {len(v)})>")
             # Summarize lists if they contain dicts that need further summarization
-            if any(isinstance(item, dict) for item in v):
+            elif any(isinstance(item, dict) for item in v):
                 summary[k] = [summarize_for_printing(item, keys_to_redact=keys_to_redact) for item in v] # Pass keys_to_redact
             # Or if they look like embeddings themselves (list of floats/ints)
             elif len(v) > 3 and all(isinstance(i, (float, int)) for i in v):
@@ -50,4 +59,4 @@ def summarize_for_printing(data_to_summarize, keys_to_redact=None):
                 summary[k] = v # Keep other lists (e.g., short lists, lists of strings) as is
         else:
             summary[k] = v
-    return summary 
\ No newline at end of file
+    return summary
@@ -0,0 +1,126 @@
+# utils/tracing.py
+
+import asyncio
+import functools
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from utils import metrics
+
+# Where a tick's time goes, exported on /metrics:
+#   npc_node_seconds{node}      one LangGraph node (wrapped by traced_node in build_graph)
+#   npc_span_seconds{span}      work inside a node: "llm", "embed", "faiss_search",
+#                               "faiss_add", "save_state"
+#   npc_llm_tokens_total{kind}  prompt / completion tokens reported by the LLM
+# With a Trace started (/tick with "debug": true) every span of the tick is
+# also recorded, nested under the span it ran in.
+
+_node_seconds = metrics.histogram("npc_node_seconds", "Time spent in each graph node", ("node",),
+                                  buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                                           0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+_node_errors  = metrics.counter("npc_node_errors_total", "Graph nodes that raised", ("node",))
+_span_seconds = metrics.histogram("npc_span_seconds", "Time spent in instrumented work inside a tick", ("span",),
+                                  buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                                           0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+_llm_tokens   = metrics.counter("npc_llm_tokens_total", "LLM tokens used", ("kind",))
+
+_trace:  ContextVar[Optional["Trace"]] = ContextVar("tick_trace", default=None)
+_parent: ContextVar[Optional[int]]     = ContextVar("trace_parent", default=None)
+
+
+class Trace:
+    """ The spans of one tick, in the order they finished. """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.ids = itertools.count(1)
+
+    def to_json(self) -> List[Dict[str, Any]]:
+        return sorted(self.spans, key=lambda s: s["start_ms"])
+
+
+class Span:
+    """ Handle for the span being timed; attributes set on it end up in the trace. """
+
+    __slots__ = ("name", "attrs", "id")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], span_id: int):
+        self.name  = name
+        self.attrs = attrs
+        self.id    = span_id
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def llm_usage(self, completion) -> None:
+        """ Count the prompt / completion tokens of an OpenAI-style chat completion. """
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return
+        prompt     = getattr(usage, "prompt_tokens", None) or 0
+        completion = getattr(usage, "completion_tokens", None) or 0
+        _llm_tokens.inc(prompt, kind="prompt")
+        _llm_tokens.inc(completion, kind="completion")
+        self.attrs.update(prompt_tokens=prompt, completion_tokens=completion)
+
+
+@contextmanager
+def _timed(name: str, hist: metrics.Histogram, label: str, attrs: Dict[str, Any]):
+    trace = _trace.get()
+    s = Span(name, attrs, next(trace.ids) if trace is not None else 0)
+    token = _parent.set(s.id) if trace is not None else None
+    t0 = time.perf_counter()
+    try:
+        yield s
+    finally:
+        dt = time.perf_counter() - t0
+        hist.observe(dt, **{label: name})
+        if trace is not None:
+            _parent.reset(token)
+            trace.spans.append({"name": name, "kind": label, "id": s.id, "parent": _parent.get(),
+                                "start_ms": round(1000 * (t0 - trace.t0), 3),
+                                "ms": round(1000 * dt, 3), **s.attrs})
+
+
+def span(name: str, **attrs):
+    """ with span("faiss_search", k=10): ...  (times the block into npc_span_seconds) """
+    return _timed(name, _span_seconds, "span", attrs)
+
+
+@contextmanager
+def start_trace():
+    """ Record every span run in this context (and tasks / threads started from it). """
+    trace = Trace()
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def traced_node(name: str, fn: Callable) -> Callable:
+    """ Wrap a graph node (sync or async) so each run is timed into npc_node_seconds. """
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def run_async(*args, **kwargs):
+            with _timed(name, _node_seconds, "node", {}):
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    _node_errors.inc(node=name)
+                    raise
+        return run_async
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        with _timed(name, _node_seconds, "node", {}):
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                _node_errors.inc(node=name)
+                raise
+    return run
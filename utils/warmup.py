@@ -0,0 +1,66 @@
+# utils/warmup.py
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class Warmup:
+    """
+    Runs the expensive start-up steps (heavy imports, model loading, reading
+    the save) either inline or on a background thread, and records how long
+    each step took so the breakdown can be logged and served from /healthz.
+
+    status: "warming" → "ready" (or "failed" if a step raised)
+    """
+
+    def __init__(self):
+        self.status = "warming"
+        self.phases: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - t0, 4)
+
+    def run(self, steps: List[Tuple[str, Callable[[], None]]]) -> None:
+        try:
+            for name, fn in steps:
+                with self.phase(name):
+                    fn()
+            self.status = "ready"
+        except Exception as e:
+            self.status = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"❌ Warm-up failed: {self.error}")
+        finally:
+            total = round(time.perf_counter() - self._t0, 4)
+            self.phases["total"] = total
+            breakdown = ", ".join(f"{k}={v:.3f}s" for k, v in self.phases.items())
+            print(f"⏱  Startup ({self.status}): {breakdown}")
+            self._done.set()
+
+    def start_background(self, steps: List[Tuple[str, Callable[[], None]]]) -> None:
+        threading.Thread(target=self.run, args=(steps,), name="warmup", daemon=True).start()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until warm-up finished; True if it finished successfully."""
+        self._done.wait(timeout)
+        return self.ready
+
+    def report(self) -> Dict[str, object]:
+        out: Dict[str, object] = {"status": self.status, "phases": dict(self.phases)}
+        if self.error:
+            out["error"] = self.error
+        return out
@@ -1,14 +1,15 @@
 # workflows/npc_simulation_graph.py
 
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableLambda
 from typing import TypedDict, List, Optional, Any, Dict
 import numpy as np
 
 # Import agent nodes
 from agents.player_simulator import player_simulator_node
 from agents.dialogue_manager import dialogue_manager_node
-from agents.character_agent import character_agent_node
-from agents.memory_synthesizer import memory_synthesizer_node
+from agents.character_agent import character_agent_node, acharacter_agent_node
+from agents.memory_synthesizer import memory_synthesizer_node, amemory_synthesizer_node
 from agents.world_state import world_state_node
 from agents.narrative_director import narrative_director_node
 from agents.event_nodes import gossip_node, player_state_node
@@ -16,18 +17,25 @@ from agents.quest_manager import quest_manager_node
 from agents.quest_offer import quest_offer_node
 from agents.quest_response import quest_response_node
 from agents.quest_completion import quest_completion_node
+from utils.tracing import traced_node
 
 class NPCSubState(TypedDict):
     npc_id: str
     personality: str
     emotion_state: str
     inventory: List[str]
+    location: Optional[str]       # world chunk (spatial_index.py)
     memory: List[str]
     faiss_index: Any
     faiss_id_to_memory_text: Dict[int, str]
     next_faiss_id: int
 
 class SimulationState(TypedDict):
+    # Which hosted world this is (sessions.py); keys deferred memory jobs
+    session_id: Optional[str]
+    # Bumped once per /tick or /tick_batch
+    state_version: int
+
     # Player State
     player_location: str
     player_inventory: List[str]
@@ -35,6 +43,10 @@ class SimulationState(TypedDict):
 
     # World Model (just Market Plaza)
     world_chunks: Dict[str, Dict[str, Any]]
+    # chunk → NPC index over npc_states[*]["location"]; rebuilt on load, never saved
+    spatial_index: Any
+    # level-of-detail tier of every chunk around the player (lod.py); never saved
+    lod: Any
 
     # Per-NPC states
     npc_states: Dict[str, NPCSubState]
@@ -90,11 +102,12 @@ def decide_next_node(state: SimulationState) -> str:
         return "quest_completion"
 
     # 4) …then fall back into your normal flow
-    if evt in ("player_chat","player_near_npc"):
+    #    (npc_* events are NPC-initiated turns from scheduler.py)
+    if evt in ("player_chat","player_near_npc","npc_chat"):
         return "character_agent"
     if ta.get("type") == "gossip":
         return "gossip_node"
-    if evt == "player_moved" or ta.get("type") in (
+    if evt in ("player_moved", "npc_moved", "npc_gave_item") or ta.get("type") in (
         "give_item", "give_gold", "open_gate", "repair_item"
     ):
         return "player_state"
@@ -104,22 +117,31 @@ def build_graph():
     workflow = StateGraph(SimulationState)
 
     # 1) Entry point router
-    workflow.add_node("event_router",    event_router_node)
-    workflow.add_node("clear_event",     clear_event_node)
+    workflow.add_node("event_router",    traced_node("event_router", event_router_node))
+    workflow.add_node("clear_event",     traced_node("clear_event", clear_event_node))
     # 2) Core agents
-    workflow.add_node("dialogue_manager",   dialogue_manager_node)
-    workflow.add_node("character_agent",    character_agent_node)
-    workflow.add_node("memory_synthesizer", memory_synthesizer_node)
-    workflow.add_node("world_state",        world_state_node)
-    workflow.add_node("narrative_director", narrative_director_node)
-    workflow.add_node("quest_manager",      quest_manager_node)
-    workflow.add_node("quest_offer",        quest_offer_node)
-    workflow.add_node("quest_response",     quest_response_node)
-    workflow.add_node("quest_completion",   quest_completion_node)
+    #    The two LLM-calling nodes carry an async twin: graph.invoke runs the
+    #    sync function, graph.ainvoke awaits the AsyncGroq version.
+    #    Every node is wrapped by traced_node (npc_node_seconds on /metrics).
+    workflow.add_node("dialogue_manager",   traced_node("dialogue_manager", dialogue_manager_node))
+    workflow.add_node("character_agent",
+                      RunnableLambda(traced_node("character_agent", character_agent_node),
+                                     afunc=traced_node("character_agent", acharacter_agent_node),
+                                     name="character_agent"))
+    workflow.add_node("memory_synthesizer",
+                      RunnableLambda(traced_node("memory_synthesizer", memory_synthesizer_node),
+                                     afunc=traced_node("memory_synthesizer", amemory_synthesizer_node),
+                                     name="memory_synthesizer"))
+    workflow.add_node("world_state",        traced_node("world_state", world_state_node))
+    workflow.add_node("narrative_director", traced_node("narrative_director", narrative_director_node))
+    workflow.add_node("quest_manager",      traced_node("quest_manager", quest_manager_node))
+    workflow.add_node("quest_offer",        traced_node("quest_offer", quest_offer_node))
+    workflow.add_node("quest_response",     traced_node("quest_response", quest_response_node))
+    workflow.add_node("quest_completion",   traced_node("quest_completion", quest_completion_node))
 
     # 3) New nodes for gossip & player updates
-    workflow.add_node("gossip_node",    gossip_node)
-    workflow.add_node("player_state",   player_state_node)
+    workflow.add_node("gossip_node",    traced_node("gossip_node", gossip_node))
+    workflow.add_node("player_state",   traced_node("player_state", player_state_node))
 
     # 4) Conditional routing off the router
     workflow.add_conditional_edges(
@@ -186,7 +208,7 @@ def build_graph():
     # 8) Quest flow
     workflow.add_edge("quest_offer",     "clear_event")
     workflow.add_edge("quest_response",  "clear_event")
-    workflow.add_edge("quest_completion","clear_event")
+    #    (quest_completion reaches clear_event through dialogue_manager, see 5)
 
     # 9) Set the entry point to the router
     workflow.set_entry_point("event_router")